@@ -1,60 +1,136 @@
 import json
-import os
 from typing import Dict, List
-import google.generativeai as genai
-from google.cloud import language_v1
 import asyncio
-from datetime import datetime
+from classification_result import ClassificationResult
+from classifier_weights import load_weights, HIGH_VALUE_PATTERNS, MEDIUM_VALUE_PATTERNS
 from language_utils import LanguageHandler
 from regex_check import RegexCheck
+from metrics import metrics
+from provider_cassette import ProviderCassette, cassette as default_cassette
+from tracing import tracer
+from structured_logging import get_logger
+
+log = get_logger('ai_classifier')
+
+# The Gemini and Natural Language SDKs take seconds to import, so they are
+# loaded when a classifier is constructed rather than when this module is imported.
+# Every provider call goes through a ProviderCassette (see provider_cassette),
+# which can record responses, replay them offline, or inject latency and errors.
+# The SDK calls block, so they run in worker threads to keep the event loop
+# free and let concurrent classifications overlap.
 
 class AIClassifier:
-    def __init__(self, violation_threshold=50, high_confidence_threshold=85):
-        with open('../config/tokens.json') as f:
-            tokens = json.load(f)
-        
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '../config/google-credentials.json'
-        
-        genai.configure(api_key=tokens['gemini'])
-        self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        self.violation_threshold = violation_threshold
-        self.high_confidence_threshold = high_confidence_threshold
+    GEMINI_MODEL = 'gemini-1.5-flash'
+    # Recorded Gemini responses are keyed by this; bump it whenever the prompt changes
+    PROMPT_VERSION = 1
+
+    def __init__(self, violation_threshold=None, high_confidence_threshold=None,
+                 credentials_path='../config/google-credentials.json', regex_check: RegexCheck = None,
+                 cassette: ProviderCassette = None, weights_path='../config/classifier_weights.json'):
+        self.cassette = cassette or default_cassette
+        # Fusion, threat-score and cut-off constants, refit offline by tests/fusion_optimizer.py
+        self.weights = load_weights(weights_path)
+        self.violation_threshold = (self.weights['thresholds']['violation']
+                                    if violation_threshold is None else violation_threshold)
+        self.high_confidence_threshold = (self.weights['thresholds']['high_confidence']
+                                          if high_confidence_threshold is None else high_confidence_threshold)
+
+        if self.cassette.offline:
+            # Replaying recorded responses needs no SDKs or credentials
+            self.gemini_model = None
+            self.language_client = None
+        else:
+            with open('../config/tokens.json') as f:
+                tokens = json.load(f)
+            
+            import google.generativeai as genai
+            from google.cloud import language_v1
+            
+            genai.configure(api_key=tokens['gemini'])
+            self.gemini_model = genai.GenerativeModel(self.GEMINI_MODEL)
 
-        self.language_client = language_v1.LanguageServiceClient()
+            # Credentials are passed explicitly rather than through GOOGLE_APPLICATION_CREDENTIALS,
+            # so this can be constructed alongside DatabaseManager without racing on the env var
+            self.language_client = language_v1.LanguageServiceClient.from_service_account_file(credentials_path)
         
-        self.language_handler = LanguageHandler()
+        self.language_handler = LanguageHandler(self.cassette)
         
-        self.regex_check = RegexCheck()
+        self.regex_check = regex_check or RegexCheck()
         
-        print("AI Classifier initialized with Gemini and Natural Language APIs")
+        log.info("classifier initialized", providers="gemini,natural_language")
     
-    async def classify_message(self, message_content: str) -> Dict:
-        print(f"Analyzing message: '{message_content[:50]}...'")
+    async def warm_up(self):
+        """Load regex rules and run the local scoring path once, so the first real message doesn't pay for it"""
+        await self.classify_message_local("warm up")
+    
+    @tracer.traced('classify_message')
+    async def classify_message(self, message_content: str, conversation_context: str = None) -> Dict:
+        log.debug("analyzing message", content=message_content)
         
-        lang_result = self.language_handler.process_message(message_content)
+        lang_result = await asyncio.to_thread(self.language_handler.process_message, message_content)
         analysis_text = lang_result['analysis_text']
         
         if lang_result['language_info']['language_code'] != 'en':
-            print(f"Detected {lang_result['language_info']['language_name']}, using translation")
+            log.debug("translating message", language=lang_result['language_info']['language_code'])
         
         # Run both analyses
-        gemini_result = await self._classify_with_gemini(analysis_text)
+        gemini_result = await self._classify_with_gemini(analysis_text, conversation_context)
         nl_result = await self._enhanced_natural_language_analysis(analysis_text)
         
         # Combine results
         combined_result = self._combine_classifications(gemini_result, nl_result, message_content)
         
-        combined_result['language_info'] = lang_result['language_info']
-        combined_result['translation_info'] = lang_result['translation_info']
-        combined_result['analysis_text'] = analysis_text
+        combined_result.language_info = lang_result['language_info']
+        combined_result.translation_info = lang_result['translation_info']
+        combined_result.analysis_text = analysis_text
         
-        print(f"Analysis complete. Combined score: {combined_result['ai_scores']['combined_score']}%")
+        log.info("classification complete", score=combined_result['ai_scores']['combined_score'])
         return combined_result
     
-    async def _classify_with_gemini(self, message: str) -> Dict:
+    @tracer.traced('classify_message_local')
+    async def classify_message_local(self, message_content: str) -> Dict:
+        """Degraded path used under overload: local threat patterns and regex rules, no provider calls"""
+        threat_patterns = self._analyze_threat_patterns(message_content)
+        local_score = self._calculate_enhanced_threat_score({
+            'syntax': {'threat_patterns': threat_patterns}
+        })
+        regex_result = await self.regex_check.apply_regex_rules(message_content)
+        regex_bonus = regex_result['total_regex_score'] * 100
+        
+        # Without Gemini the local score stands on its own instead of being weighted at 20%
+        combined_score = round(min(100, local_score * 100 + regex_bonus), 2)
+        
+        result = ClassificationResult(
+            message_content=message_content,
+            ai_scores={
+                'gemini_confidence': 0,
+                'gemini_classification': 'skipped_overload',
+                'natural_language_threat_score': local_score,
+                'natural_language_confidence': local_score * 100,
+                'combined_score': combined_score,
+                'regex_bonus': regex_bonus
+            },
+            final_classification=self._determine_final_classification(combined_score),
+            is_violation=combined_score > self.violation_threshold,
+            confidence_level=self._get_confidence_level(combined_score),
+            nl_result={'syntax': {'threat_patterns': threat_patterns}}
+        )
+        result['regex_patterns_matched'] = regex_result['patterns_matched']
+        result['local_only'] = True
+        return result
+    
+    @metrics.timed('gemini')
+    async def _classify_with_gemini(self, message: str, conversation_context: str = None) -> Dict:
         """Use Gemini to classify sexual extortion content"""
         try:
+            # Only a compact summary of earlier messages is sent, never the history itself
+            context_section = ""
+            if conversation_context:
+                context_section = f"""
+            Conversation so far (summary of earlier messages in this channel): {conversation_context}
+            Sextortion often escalates over several messages, so weigh the new message in this context.
+"""
+            
             prompt = f"""
             You are an expert content moderator specializing in sexual extortion and sextortion detection.
 
@@ -94,6 +170,7 @@ class AIClassifier:
             - Leverage language: "unless", "or else", "prevent", "comply"
             - Victim targeting: "friends and family", "reputation", "ruin you"
 
+            {context_section}
             Analyze this message: "{message}"
 
             Be more sensitive to implicit threats and coercion involving intimate content.
@@ -111,10 +188,13 @@ class AIClassifier:
             IMPORTANT: Respond with ONLY the JSON object, no additional text or code blocks.
             """
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(
+                self.cassette.call, 'gemini', (self.GEMINI_MODEL, self.PROMPT_VERSION, message, conversation_context),
+                lambda: {'text': self.gemini_model.generate_content(prompt).text}
+            )
             
             try:
-                response_text = response.text.strip()
+                response_text = response['text'].strip()
                 
                 # Handle multiple code block formats
                 if '```json' in response_text:
@@ -149,22 +229,21 @@ class AIClassifier:
                 }
                 
             except json.JSONDecodeError as e:
-                print(f"Gemini JSON parsing failed. Error: {e}")
-                print(f"Cleaned text: {response_text}")
-                print(f"Original response: {response.text}")
+                log.warning("gemini json parsing failed", error=str(e), text=response['text'])
+                metrics.error('gemini')
                 
                 # Fallback: try to extract key values manually
                 try:
                     import re
-                    confidence_match = re.search(r'"confidence_score":\s*(\d+)', response.text)
-                    classification_match = re.search(r'"classification":\s*"([^"]+)"', response.text)
-                    is_violation_match = re.search(r'"is_sexual_extortion":\s*(true|false)', response.text)
+                    confidence_match = re.search(r'"confidence_score":\s*(\d+)', response['text'])
+                    classification_match = re.search(r'"classification":\s*"([^"]+)"', response['text'])
+                    is_violation_match = re.search(r'"is_sexual_extortion":\s*(true|false)', response['text'])
                     
                     confidence = int(confidence_match.group(1)) if confidence_match else 0
                     classification = classification_match.group(1) if classification_match else 'unknown'
                     is_violation = is_violation_match.group(1) == 'true' if is_violation_match else False
                     
-                    print(f"Fallback parsing successful: confidence={confidence}, classification={classification}")
+                    log.info("gemini fallback parsing succeeded", confidence=confidence, classification=classification)
                     
                     return {
                         'gemini_confidence': confidence,
@@ -174,7 +253,7 @@ class AIClassifier:
                         'gemini_is_violation': is_violation
                     }
                 except Exception as fallback_error:
-                    print(f"Fallback parsing also failed: {fallback_error}")
+                    log.warning("gemini fallback parsing failed", error=str(fallback_error))
                     return {
                         'gemini_confidence': 0,
                         'gemini_classification': 'json_parse_error',
@@ -184,7 +263,8 @@ class AIClassifier:
                     }
 
             except Exception as e:
-                print(f"Unexpected error in Gemini classification: {e}")
+                log.exception("unexpected error in gemini classification")
+                metrics.error('gemini')
                 return {
                     'gemini_confidence': 0,
                     'gemini_classification': 'error',
@@ -194,7 +274,8 @@ class AIClassifier:
                 }
                 
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log.error("gemini api error", error=str(e))
+            metrics.error('gemini')
             return {
                 'gemini_confidence': 0,
                 'gemini_classification': 'error',
@@ -204,15 +285,15 @@ class AIClassifier:
             }
     
     async def _enhanced_natural_language_analysis(self, message: str) -> Dict:
-        document = language_v1.Document(content=message, type_=language_v1.Document.Type.PLAIN_TEXT)
-        
         analysis_results = {}
         
         # Sentiment Analysis
         try:
-            sentiment_response = self.language_client.analyze_sentiment(request={'document': document})
-            sentiment_score = sentiment_response.document_sentiment.score
-            sentiment_magnitude = sentiment_response.document_sentiment.magnitude
+            with metrics.timer('nl_sentiment'):
+                sentiment_response = await asyncio.to_thread(self.cassette.call, 'nl_sentiment', (message,),
+                                                             lambda: self._fetch_sentiment(message))
+            sentiment_score = sentiment_response['score']
+            sentiment_magnitude = sentiment_response['magnitude']
             
             analysis_results['sentiment'] = {
                 'score': sentiment_score,
@@ -220,20 +301,14 @@ class AIClassifier:
                 'interpretation': self._interpret_sentiment(sentiment_score, sentiment_magnitude)
             }
         except Exception as e:
-            print(f"Sentiment analysis failed: {e}")
+            log.error("sentiment analysis failed", error=str(e))
             analysis_results['sentiment'] = {'score': 0, 'magnitude': 0, 'interpretation': 'neutral'}
         
         # Entity Analysis
         try:
-            entities_response = self.language_client.analyze_entities(request={'document': document})
-            entities = []
-            
-            for entity in entities_response.entities:
-                entities.append({
-                    'name': entity.name,
-                    'type': entity.type_.name,
-                    'salience': entity.salience
-                })
+            with metrics.timer('nl_entities'):
+                entities = (await asyncio.to_thread(self.cassette.call, 'nl_entities', (message,),
+                                                    lambda: self._fetch_entities(message)))['entities']
             
             analysis_results['entities'] = {
                 'count': len(entities),
@@ -246,20 +321,22 @@ class AIClassifier:
                                 any(word in e['name'].lower() for word in ['dollar', 'hundred', 'thousand'])]
             }
         except Exception as e:
-            print(f"Entity analysis failed: {e}")
+            log.error("entity analysis failed", error=str(e))
             analysis_results['entities'] = {'count': 0, 'entities': [], 'has_person_entities': False, 'has_money_entities': False}
         
         try:
-            syntax_response = self.language_client.analyze_syntax(request={'document': document})
+            with metrics.timer('nl_syntax'):
+                syntax_response = await asyncio.to_thread(self.cassette.call, 'nl_syntax', (message,),
+                                                          lambda: self._fetch_syntax(message))
             threat_patterns = self._analyze_threat_patterns(message)
             
             analysis_results['syntax'] = {
-                'token_count': len(syntax_response.tokens),
+                'token_count': syntax_response['token_count'],
                 'threat_patterns': threat_patterns,
                 'pattern_count': len(threat_patterns)
             }
         except Exception as e:
-            print(f"Syntax analysis failed: {e}")
+            log.error("syntax analysis failed", error=str(e))
             analysis_results['syntax'] = {'token_count': 0, 'threat_patterns': [], 'pattern_count': 0}
         
         threat_score = self._calculate_enhanced_threat_score(analysis_results)
@@ -273,6 +350,26 @@ class AIClassifier:
         
         return analysis_results
     
+    # Live Natural Language calls, reduced to the plain data the analysis uses
+
+    @staticmethod
+    def _nl_document(message: str):
+        from google.cloud import language_v1
+        return language_v1.Document(content=message, type_=language_v1.Document.Type.PLAIN_TEXT)
+
+    def _fetch_sentiment(self, message: str) -> Dict:
+        response = self.language_client.analyze_sentiment(request={'document': self._nl_document(message)})
+        return {'score': response.document_sentiment.score, 'magnitude': response.document_sentiment.magnitude}
+
+    def _fetch_entities(self, message: str) -> Dict:
+        response = self.language_client.analyze_entities(request={'document': self._nl_document(message)})
+        return {'entities': [{'name': entity.name, 'type': entity.type_.name, 'salience': entity.salience}
+                             for entity in response.entities]}
+
+    def _fetch_syntax(self, message: str) -> Dict:
+        response = self.language_client.analyze_syntax(request={'document': self._nl_document(message)})
+        return {'token_count': len(response.tokens)}
+    
     def _interpret_sentiment(self, score: float, magnitude: float) -> str:
         if score > 0.3:
             return "positive"
@@ -336,46 +433,33 @@ class AIClassifier:
         return patterns
     
     def _calculate_enhanced_threat_score(self, analysis: Dict) -> float:
+        weights = self.weights['threat']
         score = 0.0
         
         # Sentiment Analysis
         sentiment = analysis.get('sentiment', {})
         if sentiment.get('interpretation') == 'very_negative':
-            score += 0.15
+            score += weights['sentiment_very_negative']
         elif sentiment.get('interpretation') == 'negative':
-            score += 0.08
+            score += weights['sentiment_negative']
         
         # Entity Analysis
         entities = analysis.get('entities', {})
         threat_patterns = analysis.get('syntax', {}).get('threat_patterns', [])
         
         if entities.get('has_money_entities', False) and len(threat_patterns) > 0:
-            score += 0.15
+            score += weights['money_with_patterns']
         
         # Pattern Analysis
-        high_value_patterns = {
-            'sexual_content_payment_combo': 0.25,
-            'possessive_intimate_content': 0.20,
-            'intimate_distribution_threat': 0.18,
-            'platform_intimate_threat': 0.15
-        }
-        
-        medium_value_patterns = {
-            'payment_conditional': 0.10,
-            'urgent_payment_demand': 0.08
-        }
-        
         for pattern in threat_patterns:
-            if pattern in high_value_patterns:
-                score += high_value_patterns[pattern]
-            elif pattern in medium_value_patterns:
-                score += medium_value_patterns[pattern]
+            if pattern in HIGH_VALUE_PATTERNS or pattern in MEDIUM_VALUE_PATTERNS:
+                score += weights[pattern]
         
-        high_value_count = sum(1 for p in threat_patterns if p in high_value_patterns)
+        high_value_count = sum(1 for p in threat_patterns if p in HIGH_VALUE_PATTERNS)
         if high_value_count >= 2:
-            score += 0.15
+            score += weights['multiple_high_value']
         elif high_value_count >= 1 and len(threat_patterns) >= 3:
-            score += 0.08
+            score += weights['high_value_with_others']
         
         return min(score, 1.0)
     
@@ -391,8 +475,10 @@ class AIClassifier:
         else:
             return "minimal"
 
-    async def classify_message_with_user_context(self, message_content: str, user_stats: Dict = None) -> Dict:
-        base_result = await self.classify_message(message_content)
+    @tracer.traced('classify_message_with_user_context')
+    async def classify_message_with_user_context(self, message_content: str, user_stats: Dict = None,
+                                                 conversation_context: str = None) -> Dict:
+        base_result = await self.classify_message(message_content, conversation_context)
 
         if not user_stats:
             return base_result
@@ -415,23 +501,24 @@ class AIClassifier:
         false_positive_rate = false_positives / max(flagged_messages, 1) if flagged_messages > 0 else 0
         
         # Risk score calculation
+        weights = self.weights['user_context']
         risk_score = 0.0
         
         # High flagged rate, increases risk
-        if flagged_rate > 0.1:
-            risk_score += 0.3
-        elif flagged_rate > 0.05:
-            risk_score += 0.15
+        if flagged_rate > weights['flagged_rate_high']:
+            risk_score += weights['flagged_rate_high_risk']
+        elif flagged_rate > weights['flagged_rate_elevated']:
+            risk_score += weights['flagged_rate_elevated_risk']
         
         # High violation confirmation rate, increases risk
-        if violation_rate > 0.7:
-            risk_score += 0.4
-        elif violation_rate > 0.5:
-            risk_score += 0.2
+        if violation_rate > weights['violation_rate_high']:
+            risk_score += weights['violation_rate_high_risk']
+        elif violation_rate > weights['violation_rate_elevated']:
+            risk_score += weights['violation_rate_elevated_risk']
         
         # High false positive rate, decreases risk
-        if false_positive_rate > 0.5:
-            risk_score -= 0.2
+        if false_positive_rate > weights['false_positive_rate_high']:
+            risk_score += weights['false_positive_rate_high_risk']
                 
         return max(0.0, min(1.0, risk_score))  # Limit between 0 and 1
     
@@ -440,20 +527,10 @@ class AIClassifier:
         
         original_score = base_result['ai_scores']['combined_score']
         
-        risk_adjustment = 0
-        
-        # High-risk users, increase sensitivity, lower threshold for flagging
-        if user_risk_score > 0.6:
-            risk_adjustment = 3
-        elif user_risk_score > 0.3:
-            risk_adjustment = 1
-        
-        # Low-risk users with high false positive rate, decrease sensitivity
+        risk_adjustment = self._user_risk_adjustment(user_risk_score, user_stats)
         false_positive_rate = user_stats.get('stats', {}).get('false_positives', 0) / max(user_stats.get('stats', {}).get('flagged_messages', 1), 1)
-        if false_positive_rate > 0.6 and user_risk_score < 0.2:
-            risk_adjustment = -5
         
-        adjusted_score = min(100, max(0, original_score + risk_adjustment))
+        adjusted_score = self.user_adjusted_score(original_score, risk_adjustment)
         
         # Update scores
         enhanced_result['ai_scores']['combined_score'] = adjusted_score
@@ -474,11 +551,39 @@ class AIClassifier:
         
         if adjusted_score > self.high_confidence_threshold:
             enhanced_result['final_classification'] = 'high_confidence_violation_with_user_context'
-        elif adjusted_score > 75:
+        elif adjusted_score > self.weights['classification']['likely_violation']:
             enhanced_result['final_classification'] = 'likely_violation_with_user_context'
         
         return enhanced_result
     
+    @staticmethod
+    def user_adjusted_score(score: float, risk_adjustment: float) -> float:
+        """The combined score after a user's risk adjustment"""
+        return min(100, max(0, score + risk_adjustment))
+
+    @staticmethod
+    def regex_adjusted_score(score: float, total_regex_score: float) -> float:
+        """The combined score with the regex rules' score added on top, as the bot applies it with user context"""
+        return min(100, score + total_regex_score * 100)
+
+    def _user_risk_adjustment(self, user_risk_score: float, user_stats: Dict) -> int:
+        """Points added to (or taken off) the combined score for a user's history"""
+        weights = self.weights['user_context']
+        risk_adjustment = 0
+        
+        # High-risk users, increase sensitivity, lower threshold for flagging
+        if user_risk_score > weights['high_risk']:
+            risk_adjustment = weights['high_risk_adjustment']
+        elif user_risk_score > weights['elevated_risk']:
+            risk_adjustment = weights['elevated_risk_adjustment']
+        
+        # Low-risk users with high false positive rate, decrease sensitivity
+        false_positive_rate = user_stats.get('stats', {}).get('false_positives', 0) / max(user_stats.get('stats', {}).get('flagged_messages', 1), 1)
+        if false_positive_rate > weights['trusted_false_positive_rate'] and user_risk_score < weights['trusted_max_risk']:
+            risk_adjustment = weights['trusted_adjustment']
+        
+        return risk_adjustment
+    
     def _get_user_risk_level(self, risk_score: float) -> str:
         if risk_score > 0.7:
             return "high_risk_user"
@@ -489,15 +594,15 @@ class AIClassifier:
         else:
             return "minimal_risk_user"
     
-    def _combine_classifications(self, gemini_result: Dict, nl_result: Dict, message: str) -> Dict:        
+    def _combine_classifications(self, gemini_result: Dict, nl_result: Dict, message: str) -> ClassificationResult:        
         # Extract scores
         gemini_confidence = gemini_result.get('gemini_confidence', 0)
         nl_threat_score = nl_result.get('enhanced_threat_assessment', {}).get('threat_score', 0)
         nl_confidence = nl_threat_score * 100
         
         # Weighted combination
-        gemini_weight = 0.80
-        nl_weight = 0.20
+        gemini_weight = self.weights['fusion']['gemini']
+        nl_weight = self.weights['fusion']['natural_language']
         
         # Calculate combined score
         combined_score = (gemini_confidence * gemini_weight) + (nl_confidence * nl_weight)
@@ -506,89 +611,57 @@ class AIClassifier:
         # Determine final classification
         final_classification = self._determine_final_classification(combined_score)
         
-        # Enhanced result structure
-        return {
-            'message_content': message,
-            'timestamp': datetime.now(),
-            
-            # AI Scores
-            'ai_scores': {
+        return ClassificationResult(
+            message_content=message,
+            ai_scores={
                 'gemini_confidence': gemini_confidence,
                 'gemini_classification': gemini_result.get('gemini_classification', 'unknown'),
                 'natural_language_threat_score': nl_threat_score,
                 'natural_language_confidence': nl_confidence,
                 'combined_score': combined_score
             },
-            
-            # Final Decision
-            'final_classification': final_classification,
-            'is_violation': combined_score > self.violation_threshold,
-            'confidence_level': self._get_confidence_level(combined_score),
-            
-            # Detailed Analysis
-            'analysis_details': {
-                'gemini_reasoning': gemini_result.get('gemini_reasoning', ''),
-                'gemini_risk_indicators': gemini_result.get('gemini_risk_indicators', []),
-                'nl_threat_patterns': nl_result.get('syntax', {}).get('threat_patterns', []),
-                'nl_sentiment': nl_result.get('sentiment', {}).get('interpretation', 'neutral'),
-                'nl_entities': nl_result.get('entities', {}).get('entities', []),
-                'nl_threat_level': nl_result.get('enhanced_threat_assessment', {}).get('threat_level', 'minimal')
-            },
-            
-            # Enhanced Metadata
-            'processing_timestamp': datetime.now(),
-            'model_versions': {
-                'gemini_model': 'gemini-1.5-flash',
-                'natural_language_api': 'v1_enhanced'
-            },
-            
-            # Research Data
-            'research_data': {
-                'individual_scores': {
-                    'gemini_only': gemini_confidence,
-                    'nl_only': nl_confidence
-                },
-                'pattern_analysis': nl_result.get('syntax', {}),
-                'entity_analysis': nl_result.get('entities', {}),
-                'sentiment_analysis': nl_result.get('sentiment', {})
-            }
-        }
+            final_classification=final_classification,
+            is_violation=combined_score > self.violation_threshold,
+            confidence_level=self._get_confidence_level(combined_score),
+            # Detail sections are built lazily from the raw provider results
+            gemini_result=gemini_result,
+            nl_result=nl_result
+        )
     
     def _determine_final_classification(self, combined_score: float) -> str:
+        cutoffs = self.weights['classification']
         if combined_score > self.high_confidence_threshold:
             return 'high_confidence_violation'
-        elif combined_score > 75:
+        elif combined_score > cutoffs['likely_violation']:
             return 'likely_violation'
-        elif combined_score > 50:
+        elif combined_score > cutoffs['possible_violation']:
             return 'possible_violation'
-        elif combined_score > 30:
+        elif combined_score > cutoffs['low_risk']:
             return 'low_risk'
         else:
             return 'safe'
     
     def _get_confidence_level(self, score: float) -> str:
-        if score > 90:
+        cutoffs = self.weights['classification']
+        if score > cutoffs['confidence_very_high']:
             return 'very_high'
-        elif score > 75:
+        elif score > cutoffs['confidence_high']:
             return 'high'
-        elif score > 60:
+        elif score > cutoffs['confidence_medium']:
             return 'medium'
-        elif score > 40:
+        elif score > cutoffs['confidence_low']:
             return 'low'
         else:
             return 'very_low'
     
-    async def classify_message_with_regex(self, message_content: str) -> Dict:
-        print(f"Analyzing message with regex: '{message_content[:50]}...'")
-        
-        base_result = await self.classify_message(message_content)
+    @tracer.traced('classify_message_with_regex')
+    async def classify_message_with_regex(self, message_content: str, conversation_context: str = None) -> Dict:
+        base_result = await self.classify_message(message_content, conversation_context)
         
         regex_result = await self.regex_check.apply_regex_rules(message_content)
         
         base_score = base_result['ai_scores']['combined_score']
-        regex_bonus = regex_result['total_regex_score'] * 100
-        
-        regex_bonus = min(regex_bonus, 10)
+        regex_bonus = self._regex_bonus(regex_result)
         
         enhanced_result = base_result.copy()
         enhanced_result['ai_scores']['combined_score'] = min(100, base_score + regex_bonus)
@@ -597,11 +670,16 @@ class AIClassifier:
         enhanced_result['regex_patterns_matched'] = regex_result['patterns_matched']
         enhanced_result['regex_rules_applied'] = regex_result['rules_applied']
         
-        enhanced_result['is_violation'] = enhanced_result['ai_scores']['combined_score'] > 50
+        enhanced_result['is_violation'] = enhanced_result['ai_scores']['combined_score'] > self.violation_threshold
         
         enhanced_result['final_classification'] = self._determine_final_classification(
             enhanced_result['ai_scores']['combined_score']
         )
         
-        print(f"Analysis complete. Base: {base_score}%, Regex: +{regex_bonus}%, Total: {enhanced_result['ai_scores']['combined_score']}%")
-        return enhanced_result
\ No newline at end of file
+        log.debug("regex bonus applied", base_score=base_score, regex_bonus=regex_bonus,
+                  score=enhanced_result['ai_scores']['combined_score'])
+        return enhanced_result
+    
+    def _regex_bonus(self, regex_result: Dict) -> float:
+        """Points the regex rules add on top of the AI score, capped at 10"""
+        return min(regex_result['total_regex_score'] * 100, 10)
@@ -0,0 +1,217 @@
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List
+from structured_logging import get_logger
+
+log = get_logger('archiver')
+
+# Archive layout:
+#   <archive_dir>/<collection>/<YYYY-MM-DD>.jsonl.gz   one segment per day
+#   <archive_dir>/index.sqlite                          lookup index
+#
+# Each archival run appends one gzip member per segment. The index stores the
+# byte offset of that member plus the line inside it, so a lookup only has to
+# decompress the member that holds the record.
+
+RESOLVED_STATUSES = ['confirmed_violation', 'false_positive']
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class FlagArchiver:
+    # Which timestamp field decides the segment date for each collection
+    COLLECTIONS = {
+        'flagged_messages': 'flagged_at',
+        'moderation_actions': 'timestamp'
+    }
+
+    def __init__(self, database, archive_dir: str = '../data/archive',
+                 max_age_days: int = 30, batch_size: int = 500):
+        self.database = database
+        self.archive_dir = archive_dir
+        self.max_age_days = max_age_days
+        self.batch_size = batch_size
+        self._task = None
+
+        os.makedirs(archive_dir, exist_ok=True)
+        # Shared by the event loop, archival worker threads and the dashboard's request
+        # threads; every use holds the lock
+        self._index = sqlite3.connect(os.path.join(archive_dir, 'index.sqlite'), check_same_thread=False)
+        self._index_lock = threading.Lock()
+        self._index.execute("""
+            CREATE TABLE IF NOT EXISTS archived (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                message_id TEXT,
+                user_id TEXT,
+                segment TEXT NOT NULL,
+                member_offset INTEGER NOT NULL,
+                line INTEGER NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            )""")
+        self._index.execute("CREATE INDEX IF NOT EXISTS idx_message ON archived (message_id)")
+        self._index.execute("CREATE INDEX IF NOT EXISTS idx_user ON archived (user_id)")
+        self._index.commit()
+
+    async def run_once(self) -> Dict[str, int]:
+        """Archive everything older than max_age_days. Returns counts per collection."""
+        cutoff = datetime.now() - timedelta(days=self.max_age_days)
+        counts = {collection: 0 for collection in self.COLLECTIONS}
+
+        for collection, date_field in self.COLLECTIONS.items():
+            while True:
+                records = await self.database.get_archivable_records(
+                    collection, date_field, cutoff, self.batch_size,
+                    statuses=RESOLVED_STATUSES if collection == 'flagged_messages' else None
+                )
+                if not records:
+                    break
+
+                # Left over from a run whose delete failed: already on disk, only delete them
+                archived = await asyncio.to_thread(self._archived_doc_ids, collection,
+                                                   [r['doc_id'] for r in records])
+                new_records = [r for r in records if r['doc_id'] not in archived]
+                if new_records:
+                    # Compression and fsync are blocking file I/O
+                    await asyncio.to_thread(self._write_segments, collection, date_field, new_records)
+                if not await self.database.delete_documents(collection, [r['doc_id'] for r in records]):
+                    # The same batch would come back on the next read; try again next run
+                    log.error("stopping archival run, delete failed", collection=collection,
+                              batch=len(records))
+                    return counts
+                counts[collection] += len(new_records)
+
+                if len(records) < self.batch_size:
+                    break
+
+        log.info("archival run complete", cutoff=f"{cutoff:%Y-%m-%d}", **counts)
+        return counts
+
+    def _archived_doc_ids(self, collection: str, doc_ids: List[str]) -> set:
+        archived = set()
+        with self._index_lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                rows = self._index.execute(
+                    f"SELECT doc_id FROM archived WHERE collection = ? AND doc_id IN ({','.join('?' * len(chunk))})",
+                    [collection] + chunk
+                ).fetchall()
+                archived.update(doc_id for doc_id, in rows)
+        return archived
+
+    def _write_segments(self, collection: str, date_field: str, records: List[Dict]):
+        by_day = {}
+        for record in records:
+            stamp = record.get(date_field)
+            day = stamp.strftime('%Y-%m-%d') if isinstance(stamp, datetime) else 'undated'
+            by_day.setdefault(day, []).append(record)
+
+        folder = os.path.join(self.archive_dir, collection)
+        os.makedirs(folder, exist_ok=True)
+
+        rows = []
+        for day, day_records in by_day.items():
+            segment = os.path.join(collection, f'{day}.jsonl.gz')
+            payload = ''.join(json.dumps(r, default=_json_default) + '\n' for r in day_records)
+
+            with open(os.path.join(self.archive_dir, segment), 'ab') as f:
+                member_offset = f.tell()
+                f.write(gzip.compress(payload.encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+
+            for line, record in enumerate(day_records):
+                rows.append((collection, record['doc_id'], record.get('message_id'),
+                             record.get('user_id') or record.get('moderator_id'),
+                             segment, member_offset, line))
+
+        # Index is only committed once the segment data is on disk, and the
+        # Firestore documents are only deleted after that
+        with self._index_lock:
+            self._index.executemany("INSERT OR REPLACE INTO archived VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._index.commit()
+
+    def lookup(self, message_id: str = None, user_id: str = None,
+               collection: str = None, limit: int = 100) -> List[Dict]:
+        """Find archived records by message_id and/or user_id"""
+        clauses, params = [], []
+        if message_id:
+            clauses.append('message_id = ?')
+            params.append(message_id)
+        if user_id:
+            clauses.append('user_id = ?')
+            params.append(user_id)
+        if collection:
+            clauses.append('collection = ?')
+            params.append(collection)
+        if not clauses:
+            return []
+
+        with self._index_lock:
+            rows = self._index.execute(
+                f"SELECT segment, member_offset, line FROM archived WHERE {' AND '.join(clauses)} "
+                "ORDER BY segment, member_offset, line LIMIT ?", params + [limit]
+            ).fetchall()
+
+        # Decompress each gzip member at most once
+        results = []
+        members = {}
+        for segment, member_offset, line in rows:
+            key = (segment, member_offset)
+            if key not in members:
+                members[key] = self._read_member(segment, member_offset)
+            results.append(json.loads(members[key][line]))
+        return results
+
+    def _read_member(self, segment: str, member_offset: int) -> List[str]:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = []
+        with open(os.path.join(self.archive_dir, segment), 'rb') as f:
+            f.seek(member_offset)
+            while not decompressor.eof:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                chunks.append(decompressor.decompress(block))
+        return b''.join(chunks).decode('utf-8').splitlines()
+
+    def start(self, interval_hours: float = 24):
+        """Run the archival job in the background every interval_hours"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever(interval_hours))
+        return self._task
+
+    async def _run_forever(self, interval_hours: float):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("error running archival job")
+            await asyncio.sleep(interval_hours * 3600)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+if __name__ == "__main__":
+    import sys
+    from database import DatabaseManager
+    from structured_logging import configure_logging
+
+    configure_logging(log_file=None)
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    archiver = FlagArchiver(DatabaseManager(), max_age_days=days)
+    asyncio.run(archiver.run_once())
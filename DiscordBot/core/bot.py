@@ -1,73 +1,188 @@
 import discord
-from discord.ext import commands
+import asyncio
 import os
+import time
 import json
-import logging
 import re
-import requests
 from ai_classifier import AIClassifier
+from archiver import FlagArchiver
+from classification_result import ClassificationResult
 from database import DatabaseManager
+from regex_check import RegexCheck
+from decision_store import DecisionStore
+from written_report_index import WrittenReportIndex
+from work_queue import FairWorkQueue, QueueFull
+from overload_policy import OverloadPolicy, LOCAL
+from burst_coalescer import BurstCoalescer
+from conversation_window import ConversationTracker
+from mod_dispatcher import ModChannelDispatcher, HIGH, NORMAL
+from shared_state import ModChannelRegistry
+from metrics import metrics, MetricsServer
+from tracing import tracer
+from profiler import SamplingProfiler, MessageProfiler
+from memory_report import MemoryMonitor, parse_limits
 from report import Report
-import pdb
-
-# Set up logging to the console
-logger = logging.getLogger('discord')
-logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler(filename='discord.log', encoding='utf-8', mode='w')
-handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-logger.addHandler(handler)
-
-# There should be a file called 'tokens.json' inside the same folder as this file
-token_path = '../config/tokens.json'
-if not os.path.isfile(token_path):
-    raise Exception(f"{token_path} not found!")
-with open(token_path) as f:
-    # If you get an error here, it means your token is formatted incorrectly. Did you put it in quotes?
-    tokens = json.load(f)
-    discord_token = tokens['discord']
-
-
-class ModBot(discord.Client):
-    def __init__(self): 
+from structured_logging import configure_logging, get_logger
+
+log = get_logger('bot')
+
+
+def load_discord_token(token_path='../config/tokens.json'):
+    # There should be a file called 'tokens.json' inside the config folder
+    if not os.path.isfile(token_path):
+        raise Exception(f"{token_path} not found!")
+    with open(token_path) as f:
+        # If you get an error here, it means your token is formatted incorrectly. Did you put it in quotes?
+        tokens = json.load(f)
+        return tokens['discord']
+
+
+def _truncate(text, limit):
+    """Keep text within Discord's embed field limits"""
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+class ModBot(discord.AutoShardedClient):
+    PROFILE_KEYWORD = "profile" # Mod-only DM command, see _handle_profile_command
+    MAX_PROFILE_SECONDS = 300
+    MEMORY_KEYWORD = "memory" # Mod-only DM command, see _handle_memory_command
+
+    def __init__(self, classification_workers=4, queue_size=500, queue_size_per_guild=200,
+                 shard_ids=None, shard_count=None, state_dir='../data', metrics_port=9108,
+                 profile_seconds=0, profile_message_rate=0.0, memory_limits=None, trace_malloc=False,
+                 queue_wait_budget=10.0): 
         intents = discord.Intents.default()
         intents.message_content = True
         intents.reactions = True # Enable reaction intents
-        super().__init__(intents=intents)
+        # With shard_ids set this process runs only that shard group; otherwise Discord picks the shard count
+        super().__init__(intents=intents, shard_ids=shard_ids, shard_count=shard_count)
+        # Several processes share decision state when each runs its own shard group
+        multi_process = shard_ids is not None
         self.group_num = None
         self.mod_channels = {} # Map from guild to the mod channel id for that guild
+        self.mod_channel_ids = set()
         self.reports = {} # Map from user IDs to the state of their report
         self.ai_classifier = None
         self.database = None
-        self.pending_decisions = {}
+        self.archiver = None
+        self.pending_decisions = DecisionStore(os.path.join(state_dir, 'decisions.sqlite'), shared=multi_process) # Map from mod message IDs to decision state, persisted across restarts
+        self.shared_mod_channels = ModChannelRegistry(os.path.join(state_dir, 'shared_state.sqlite'))
+        self.written_report_requests = WrittenReportIndex.from_decisions(
+            self.pending_decisions, reply_max_age=self.pending_decisions.ttl_seconds)
+        self.classification_workers = classification_workers
+        self.message_queue = FairWorkQueue(max_size=queue_size, max_per_guild=queue_size_per_guild)
+        # Low-risk work is degraded once messages wait longer than this many seconds
+        self.overload_policy = OverloadPolicy(self.message_queue, wait_budget=queue_wait_budget)
+        # Rapid consecutive messages from one author are classified together
+        self.burst_coalescer = BurstCoalescer(self._enqueue_burst, start_trace=self._start_burst_trace)
+        self.conversations = ConversationTracker(window=10, max_conversations=5000, idle_seconds=3600)
+        self.mod_dispatcher = ModChannelDispatcher() # All mod channel output goes through here
+        # Traffic is refused until clients are built and the first on_ready has run
+        self.ready = False
+        self._thresholds = None
+        self._thresholds_loaded_at = 0.0
+        self._started_at = time.monotonic()
+        self.startup_timings = {} # Seconds per startup phase, plus time to first classification
+        # Prometheus text endpoint on localhost; component stats are read at scrape time
+        self.metrics_server = MetricsServer(port=metrics_port) if metrics_port else None
+        metrics.register_collector('queue', self.message_queue.stats)
+        metrics.register_collector('overload', self.overload_policy.stats)
+        metrics.register_collector('dispatcher', self.mod_dispatcher.stats)
+        metrics.register_collector('bursts', self.burst_coalescer.stats)
+        metrics.register_collector('conversations', self.conversations.stats)
+        metrics.register_collector('decisions', self.pending_decisions.stats)
+        metrics.register_collector('tracing', tracer.stats)
+        # Opt-in profiling; both are idle unless enabled by env var or the profile DM command
+        self.profile_seconds = profile_seconds
+        self.sampling_profiler = SamplingProfiler(os.path.join(state_dir, 'profiles'))
+        self.message_profiler = MessageProfiler(profile_message_rate,
+                                                os.path.join(state_dir, 'profiles', 'messages.pstats'))
+        # Sizes of the long-lived in-memory structures, checked against limits every few minutes
+        self.trace_malloc = trace_malloc
+        self.memory_monitor = MemoryMonitor(memory_limits, exclude=[self])
+        self.memory_monitor.track('reports', lambda: self.reports)
+        self.memory_monitor.track('pending_decisions', lambda: self.pending_decisions,
+                                  count=DecisionStore.cached_count)
+        self.memory_monitor.track('written_report_requests', lambda: self.written_report_requests)
+        self.memory_monitor.track('regex_rules',
+                                  lambda: self.ai_classifier.regex_check.cached_rules if self.ai_classifier else None)
+        self.memory_monitor.track('conversations', lambda: self.conversations)
+        self.memory_monitor.track('open_bursts', lambda: self.burst_coalescer,
+                                  count=lambda coalescer: coalescer.stats()['open_bursts'])
+        self.memory_monitor.track_instances('classification_results', ClassificationResult)
+        metrics.register_collector('memory', self.memory_monitor.stats)
+
+    async def setup_hook(self):
+        """Called once after login and before connecting to the gateway"""
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                log.error("could not start metrics endpoint", port=self.metrics_server.port, error=str(e))
+        if self.profile_seconds:
+            self.sampling_profiler.start(self.profile_seconds)
+        if self.trace_malloc:
+            self.memory_monitor.snapshot('startup')
+        await self._initialize_ai_and_database()
+        self.memory_monitor.start()
 
     async def on_ready(self):
-        """Called when bot connects to Discord"""
-        print(f'{self.user.name} has connected to Discord! It is these guilds:')
-        for guild in self.guilds:
-            print(f' - {guild.name}')
-        print('Press Ctrl-C to quit.')
+        """Called when bot connects to Discord, and again after every reconnect"""
+        log.info("connected to discord", bot=self.user.name, guilds=', '.join(guild.name for guild in self.guilds))
 
         # Parse the group number out of the bot's name
         self._parse_group_number()
         
-        # Find mod channels for each guild
+        # Find mod channels for each guild (guilds may have changed while disconnected)
         self._find_mod_channels()
         
-        # Initialize AI and database
-        await self._initialize_ai_and_database()
+        if not self.ready:
+            # Start draining the classification queue
+            self.message_queue.start(self._process_queued, workers=self.classification_workers)
+            self.startup_timings['ready'] = round(time.monotonic() - self._started_at, 3)
+            self.ready = True
+            log.info("accepting messages", seconds_since_start=self.startup_timings['ready'])
 
     async def _initialize_ai_and_database(self):
+        """Build the classifier and database clients in parallel and warm their caches.
+
+        Failures propagate: raised from setup_hook they abort login, so the bot never
+        reaches on_ready and never accepts traffic it has no classifier for.
+        """
         try:
-            print("Initializing classifier")
-            self.ai_classifier = AIClassifier()
+            phase_start = time.monotonic()
+            # Client constructors do blocking I/O (credentials, gRPC channels), so each gets a thread
+            regex_check = RegexCheck()
+            self.database, self.ai_classifier = await asyncio.gather(
+                asyncio.to_thread(DatabaseManager),
+                asyncio.to_thread(AIClassifier, regex_check=regex_check)
+            )
+            regex_check.database = self.database
+            self.startup_timings['clients'] = round(time.monotonic() - phase_start, 3)
             
-            print("Initializing database connection")
-            self.database = DatabaseManager()
+            # Load regex rules and thresholds now rather than on the first message
+            phase_start = time.monotonic()
+            await asyncio.gather(self.ai_classifier.warm_up(), self._get_thresholds())
+            self.startup_timings['warm_up'] = round(time.monotonic() - phase_start, 3)
             
-            print("Classifier and database systems ready")
+            # Move resolved flags older than 30 days to compressed archive segments
+            self.archiver = FlagArchiver(self.database, max_age_days=30)
+            self.archiver.start(interval_hours=24)
             
-        except Exception as e:
-            print(f"Error initializing Classifier/Database: {e}")
+            log.info("classifier and database ready", **self.startup_timings)
+            
+        except Exception:
+            log.exception("error initializing classifier/database")
+            raise
+
+    async def _get_thresholds(self):
+        """Violation thresholds, re-read from the database at most once a minute"""
+        stale = self._thresholds is None or time.monotonic() - self._thresholds_loaded_at > 60
+        metrics.cache('thresholds', hit=not stale)
+        if stale:
+            self._thresholds = await self.database.get_guild_thresholds()
+            self._thresholds_loaded_at = time.monotonic()
+        return self._thresholds
 
     def _parse_group_number(self):
         """Extract group number from bot's name"""
@@ -83,34 +198,68 @@ class ModBot(discord.Client):
             for channel in guild.text_channels:
                 if channel.name == f'group-{self.group_num}-mod':
                     self.mod_channels[guild.id] = channel
+                    self.shared_mod_channels.register(guild.id, channel.id, guild.shard_id)
+        self.mod_channel_ids = {channel.id for channel in self.mod_channels.values()}
+
+    def get_mod_channel(self, guild_id):
+        """Mod channel for a guild, including guilds on shards run by other processes"""
+        channel = self.mod_channels.get(guild_id)
+        if channel is None:
+            channel_id = self.shared_mod_channels.channel_id(guild_id)
+            if channel_id:
+                # Sends over REST without needing the guild in this process's cache
+                channel = self.get_partial_messageable(channel_id, guild_id=guild_id)
+        return channel
 
     async def on_message(self, message):
         '''
         This function is called whenever a message is sent in a channel that the bot can see (including DMs). 
         Currently the bot is configured to only handle messages that are sent over DMs or in your group's "group-#" channel. 
         '''
-        print(f"Message from {message.author.name}: {message.content} (Guild: {message.guild})")
-
         # Ignore messages from the bot 
         if message.author.id == self.user.id:
             return
 
+        if not self.ready:
+            log.warning("not ready yet, ignoring message", message_id=message.id)
+            return
+
+        # Sampled, and content is redacted unless BOT_LOG_CONTENT=1
+        log.debug("message received", message_id=message.id, author_id=message.author.id,
+                  guild_id=message.guild.id if message.guild else None, content=message.content)
+
         # Check if this message was sent in a server ("guild") or if it's a DM
         if message.guild:
             # Check if this is a response to a written report request
-            if await self._check_written_report_response(message):
-                await self._handle_written_report(message)
+            request_id = self._check_written_report_response(message)
+            if request_id:
+                await self._handle_written_report(message, request_id)
                 return
-                
-            await self.handle_channel_message(message)
+            
+            # Classification runs on the worker pool so the gateway handler returns right away
+            if message.channel.name == f'group-{self.group_num}':
+                self.burst_coalescer.add(message)
         else:
             await self.handle_dm(message)
 
+    def _start_burst_trace(self, message):
+        """The sampling decision is made once per burst, on its first message"""
+        return tracer.start_trace('channel_message', message_id=str(message.id), guild_id=str(message.guild.id))
+
+    def _enqueue_burst(self, burst):
+        """Hand a coalesced burst of messages to the classification workers"""
+        if burst.trace:
+            burst.trace.mark('enqueued')
+        try:
+            self.message_queue.put_nowait(burst.guild.id, burst)
+        except QueueFull as e:
+            log.warning("dropping burst", messages=len(burst), first_message_id=burst.id, error=str(e))
+
     async def on_reaction_add(self, reaction, user):
         """
         Handle reactions on messages in the mod channel
         """
-        if user.id == self.user.id:
+        if user.id == self.user.id or not self.ready:
             return
 
         guild_id = reaction.message.guild.id
@@ -120,70 +269,101 @@ class ModBot(discord.Client):
         if not mod_channel or reaction.message.channel.id != mod_channel.id:
             return
 
-        await self._handle_mod_reaction(reaction, user)
+        await self._handle_mod_reaction(str(reaction.emoji), reaction.message.channel, str(reaction.message.id), user)
 
-    async def _handle_mod_reaction(self, reaction, user):
+    async def on_raw_reaction_add(self, payload):
+        """
+        on_reaction_add only fires for messages in the client cache, so reactions to
+        mod messages posted before a restart arrive here instead
+        """
+        if payload.guild_id is None or payload.user_id == self.user.id or not self.ready:
+            return
+        # Straight to the state's message cache; cached_messages would build a proxy on every reaction
+        if self._connection._get_message(payload.message_id):
+            return
+
+        mod_channel = self.mod_channels.get(payload.guild_id)
+        if not mod_channel or payload.channel_id != mod_channel.id:
+            return
+
+        # Only decision prompts we know about; other old messages are ignored
+        if str(payload.message_id) not in self.pending_decisions:
+            return
+
+        await self._handle_mod_reaction(str(payload.emoji), mod_channel, str(payload.message_id), payload.member)
+
+    async def _handle_mod_reaction(self, emoji, channel, message_id, user):
         """Process moderator reactions and take appropriate actions"""
-        emoji = str(reaction.emoji)
-        channel = reaction.message.channel
         mod_name = user.name
-        message_id = str(reaction.message.id)
 
         # Initial violation assessment
         if emoji == "🟢":
-            await channel.send(f"Moderator {mod_name} has confirmed this is a violation.")
-            
-            # Written report
-            report_msg = await channel.send("Please write a report explaining how the content violates the platform's community standards.")
+            # Confirmation and written report request in one message
+            report_msg = await self.mod_dispatcher.send(
+                channel,
+                f"Moderator {mod_name} has confirmed this is a violation.\n"
+                f"{mod_name}, please write a report explaining how the content violates the platform's community standards "
+                "(reply to this message)."
+            )
             
             # Store the message ID
-            if message_id in self.pending_decisions:
-                self.pending_decisions[message_id]['awaiting_written_report'] = True
+            decision_data = self.pending_decisions.get(message_id)
+            if decision_data:
+                self.pending_decisions.update(message_id, awaiting_written_report=True)
                 
+                requested_at = time.time()
                 self.pending_decisions[str(report_msg.id)] = {
                     'awaiting_written_report': True,
                     'is_report_request': True,
                     'original_decision_id': message_id,
-                    'user_id': self.pending_decisions[message_id].get('user_id', ''),
-                    'guild_id': self.pending_decisions[message_id].get('guild_id', ''),
-                    'username': self.pending_decisions[message_id].get('username', ''),
-                    'flagged_msg_id': self.pending_decisions[message_id].get('flagged_msg_id', '')
+                    'channel_id': str(channel.id),
+                    'moderator_id': str(user.id),
+                    'requested_at': requested_at,
+                    'user_id': decision_data.get('user_id', ''),
+                    'guild_id': decision_data.get('guild_id', ''),
+                    'username': decision_data.get('username', ''),
+                    'flagged_msg_id': decision_data.get('flagged_msg_id', ''),
+                    'flagged_msg_ids': decision_data.get('flagged_msg_ids', [])
                 }
+                self.written_report_requests.add(report_msg.id, channel.id, user.id, requested_at)
             
             # Update database with confirmation
             await self._handle_violation_confirmation(message_id, mod_name)
 
         elif emoji == "🔴":
-            await channel.send(f"Moderator {mod_name} has determined this is not a violation.")
-            await channel.send("The user who submitted the message will be notified.")
+            await self.mod_dispatcher.send(
+                channel,
+                f"Moderator {mod_name} has determined this is not a violation.\n"
+                "The user who submitted the message will be notified."
+            )
             await self._handle_false_positive(message_id, mod_name)
 
         elif emoji == "🟡":
-            second_review_msg = await channel.send(
+            second_review_msg = await self.mod_dispatcher.send(
+                channel,
                 f"Moderator {mod_name} is not sure if this report is a violation. Given the high level of concern, the content will be escalated for a second-level review.\n"
                 "Does this content violate the Community Standards on 'Coercion involving intimate content'?\n"
-                "React 🟢 (Yes) or 🔴 (No)."
+                "React 🟢 (Yes) or 🔴 (No).",
+                reactions=["🟢", "🔴"]
             )
             
         # Written report handling
-            if message_id in self.pending_decisions:
-                original_data = self.pending_decisions[message_id]
+            original_data = self.pending_decisions.get(message_id)
+            if original_data:
                 self.pending_decisions[str(second_review_msg.id)] = {
                     'user_id': original_data.get('user_id', ''),
                     'guild_id': original_data.get('guild_id', ''),
                     'username': original_data.get('username', ''),
                     'message_content': original_data.get('message_content', ''),
                     'flagged_msg_id': original_data.get('flagged_msg_id', ''),
+                    'flagged_msg_ids': original_data.get('flagged_msg_ids', []),
                     'is_second_review': True
                 }
-                
-            # Add reactions to the new message
-            await second_review_msg.add_reaction("🟢")
-            await second_review_msg.add_reaction("🔴")
 
         # Escalation decisions
         elif emoji == "✅":
-            await channel.send(
+            await self.mod_dispatcher.send(
+                channel,
                 "Escalating to Trust & Safety or Legal Team for further investigation and potential law enforcement referral."
             )
 
@@ -205,12 +385,12 @@ class ModBot(discord.Client):
                 }
                 await self.database.log_moderation_action(action_data)
             except Exception as e:
-                print(f"Error logging moderation action: {e}")
+                log.error("error logging moderation action", error=str(e))
 
     async def _handle_violation_confirmation(self, mod_message_id, mod_name):
         """Handle when moderator confirms a violation"""
-        if mod_message_id in self.pending_decisions:
-            decision_data = self.pending_decisions[mod_message_id]
+        decision_data = self.pending_decisions.get(mod_message_id)
+        if decision_data:
             
             if self.database:
                 await self.database.update_user_stats(
@@ -220,18 +400,18 @@ class ModBot(discord.Client):
                     violation=True
                 )
                 
-                # Update the flagged message record
-                if decision_data.get('flagged_msg_id'):
+                # Update the flagged message record(s)
+                for flagged_msg_id in self._flagged_msg_ids(decision_data):
                     await self.database.update_flagged_message_status(
-                        decision_data['flagged_msg_id'], 
+                        flagged_msg_id, 
                         'confirmed_violation',
                         mod_name
                     )
 
     async def _handle_false_positive(self, mod_message_id, mod_name):
         """Handle when moderator determines it's not a violation (false positive)"""
-        if mod_message_id in self.pending_decisions:
-            decision_data = self.pending_decisions[mod_message_id]
+        decision_data = self.pending_decisions.get(mod_message_id)
+        if decision_data:
             
             if self.database:
                 await self.database.update_user_stats(
@@ -241,23 +421,29 @@ class ModBot(discord.Client):
                     false_positive=True
                 )
                 
-                # Update the flagged message record
-                if decision_data.get('flagged_msg_id'):
+                # Update the flagged message record(s)
+                for flagged_msg_id in self._flagged_msg_ids(decision_data):
                     await self.database.update_flagged_message_status(
-                        decision_data['flagged_msg_id'], 
+                        flagged_msg_id, 
                         'false_positive',
                         mod_name
                     )
 
+    def _flagged_msg_ids(self, decision_data):
+        """Flagged message records a decision applies to (several for a coalesced burst)"""
+        flagged_msg_ids = decision_data.get('flagged_msg_ids')
+        if flagged_msg_ids:
+            return flagged_msg_ids
+        return [decision_data['flagged_msg_id']] if decision_data.get('flagged_msg_id') else []
+
     async def _add_escalation_reactions(self, message):
         """Add escalation decision reactions"""
-        msg = await message.channel.send(
+        return await self.mod_dispatcher.send(
+            message.channel,
             "Does this content require escalation due to severity or legal concerns?\n"
-            "React ✅ (Yes) or ❌ (No)."
+            "React ✅ (Yes) or ❌ (No).",
+            reactions=["✅", "❌"]
         )
-        await msg.add_reaction("✅")
-        await msg.add_reaction("❌")
-        return msg
 
     async def _show_action_options(self, channel):
         """Display moderation action options"""
@@ -272,12 +458,9 @@ class ModBot(discord.Client):
             "  📚 — Send Educational Warning\n"
             "⛔ — Disable account → Content deleted and user notified of account suspension"
         )
-        message = await channel.send(action_prompt)
-        
-        # Add all action reactions
+        # All action reactions are added concurrently by the dispatcher
         actions = ["🗑️", "⚠️", "🫥", "⛔", "🫣", "📵", "📚"]
-        for action in actions:
-            await message.add_reaction(action)
+        await self.mod_dispatcher.send(channel, action_prompt, reactions=actions)
 
     async def _handle_mod_action(self, emoji, channel):
         """Handle specific moderation actions"""
@@ -291,16 +474,16 @@ class ModBot(discord.Client):
         }
 
         if emoji == "🫥":
-            await channel.send(
+            await self.mod_dispatcher.send(
+                channel,
                 "Soft intervention selected. Please choose:\n"
                 "🫣 — Content blur\n"
                 "📵 — Temporary Messaging Block\n"
-                "📚 — Send Educational Warning"
+                "📚 — Send Educational Warning",
+                reactions=["🫣", "📵", "📚"]
             )
-            for soft_action in ["🫣", "📵", "📚"]:
-                await channel.add_reaction(soft_action)
         else:
-            await channel.send(actions.get(emoji, "Action taken."))
+            await self.mod_dispatcher.send(channel, actions.get(emoji, "Action taken."))
 
     async def handle_dm(self, message):
         """Handle direct messages (reporting flow)"""
@@ -313,6 +496,14 @@ class ModBot(discord.Client):
 
         author_id = message.author.id
 
+        if author_id not in self.reports and message.content.startswith(self.PROFILE_KEYWORD):
+            await self._handle_profile_command(message)
+            return
+
+        if author_id not in self.reports and message.content.startswith(self.MEMORY_KEYWORD):
+            await self._handle_memory_command(message)
+            return
+
         # Only respond to messages if they're part of a reporting flow
         if author_id not in self.reports and not message.content.startswith(Report.START_KEYWORD):
             return
@@ -322,7 +513,10 @@ class ModBot(discord.Client):
             self.reports[author_id] = Report(self)
 
         # Let the report class handle this message; forward all the messages it returns to us
-        responses = await self.reports[author_id].handle_message(message)
+        trace = tracer.start_trace('report_dm', user_id=str(author_id))
+        with tracer.activate(trace), metrics.path('report'), metrics.timer('total'):
+            responses = await self.reports[author_id].handle_message(message)
+        tracer.finish(trace)
         for response in responses:
             await message.channel.send(response)
 
@@ -330,55 +524,153 @@ class ModBot(discord.Client):
         if self.reports[author_id].report_complete():
             self.reports.pop(author_id)
 
+    async def _process_queued(self, message):
+        """Queue worker entry point: one channel message or burst, timed end to end"""
+        trace = getattr(message, 'trace', None)
+        if trace:
+            # The async gaps before a worker picked this up: debounce, then queueing
+            now = time.perf_counter()
+            enqueued = trace.marks.get('enqueued', now)
+            trace.add_span('burst_wait', trace.start, enqueued, messages=len(message))
+            trace.add_span('queue_wait', enqueued, now)
+        
+        with tracer.activate(trace), metrics.path('eval_text'), metrics.timer('total'), \
+                self.message_profiler.profile_message():
+            await self.handle_channel_message(message)
+        tracer.finish(trace)
+
+    async def _is_moderator(self, user):
+        """Whether the user can read any of our mod channels"""
+        for channel in self.mod_channels.values():
+            member = channel.guild.get_member(user.id)
+            if member is None:
+                try:
+                    member = await channel.guild.fetch_member(user.id)
+                except discord.HTTPException:
+                    continue
+            if channel.permissions_for(member).read_messages:
+                return True
+        return False
+
+    async def _handle_profile_command(self, message):
+        """
+        Mod-only DM commands:
+          profile [seconds]         sample all threads, reply with the collapsed-stacks file
+          profile messages <rate>   cProfile this fraction of queued messages (0 turns it off)
+          profile top               most expensive functions across profiled messages
+        """
+        if not await self._is_moderator(message.author):
+            return
+        args = message.content.split()[1:]
+
+        if args and args[0] == 'messages':
+            try:
+                rate = float(args[1])
+            except (IndexError, ValueError):
+                await message.channel.send("Usage: `profile messages <rate>`, e.g. `profile messages 0.05`")
+                return
+            self.message_profiler.rate = min(max(rate, 0.0), 1.0)
+            path = self.message_profiler.dump() if rate <= 0 else None
+            await message.channel.send(f"Profiling {self.message_profiler.rate:.0%} of messages."
+                                       + (f" Profile written to `{path}`." if path else ""))
+            return
+
+        if args and args[0] == 'top':
+            await message.channel.send(f"```{_truncate(self.message_profiler.top(), 1990)}```")
+            return
+
+        seconds = min(int(args[0]), self.MAX_PROFILE_SECONDS) if args and args[0].isdigit() else 30
+        loop = asyncio.get_running_loop()
+
+        def on_done(path):
+            # Called from the sampling thread
+            asyncio.run_coroutine_threadsafe(
+                message.channel.send(f"Profile finished: `{path}` (collapsed stacks, open with speedscope or flamegraph.pl)"),
+                loop
+            )
+
+        path = self.sampling_profiler.start(seconds, on_done)
+        if path is None:
+            await message.channel.send("A profile is already running.")
+        else:
+            await message.channel.send(f"Sampling for {seconds}s...")
+
+    async def _handle_memory_command(self, message):
+        """
+        Mod-only DM commands:
+          memory                    entry counts and approximate sizes of in-memory structures
+          memory snapshot [label]   take a tracemalloc snapshot (starts tracing if needed)
+          memory diff [old new]     largest allocation changes between two snapshots (default: last two)
+
+        Only the newest few snapshots are kept (MemoryMonitor.max_snapshots).
+        """
+        if not await self._is_moderator(message.author):
+            return
+        args = message.content.split()[1:]
+
+        if args and args[0] == 'snapshot':
+            label = self.memory_monitor.snapshot(args[1] if len(args) > 1 else None)
+            await message.channel.send(f"Snapshot `{label}` taken.")
+            return
+
+        if args and args[0] == 'diff':
+            if len(args) not in (1, 3):
+                await message.channel.send("Usage: `memory diff` (last two snapshots) or `memory diff <old> <new>`.")
+                return
+            try:
+                lines = self.memory_monitor.diff(*args[1:3])
+            except KeyError as e:
+                await message.channel.send(f"No snapshot named {e}.")
+                return
+            await message.channel.send(f"```{_truncate(chr(10).join(lines), 1990)}```")
+            return
+
+        report = self.memory_monitor.format_report()
+        await message.channel.send(f"```{_truncate(report, 1990)}```")
+
     async def handle_channel_message(self, message):
-        """Handle messages in guild channels"""
+        """Handle messages in guild channels (a single message or a MessageBurst)"""
         # Only handle messages sent in the "group-#" channel
         if not message.channel.name == f'group-{self.group_num}':
             return
 
+        message_count = len(getattr(message, 'messages', [message]))
+
         # Update user statistics for total messages
         if self.database:
             await self.database.update_user_stats(
                 str(message.author.id), 
                 str(message.guild.id), 
-                message.author.name
+                message.author.name,
+                message_count=message_count
             )
 
         # Evaluate message content (placeholder for AI integration)
         evaluation = await self.eval_text(message.content, message)
         
         # Only send to mod channel if flagged for review
-        if isinstance(evaluation, dict) and evaluation.get('is_violation', False):
+        if isinstance(evaluation, ClassificationResult) and evaluation.is_violation:
             # Update user stats for flagged message
             if self.database:
                 await self.database.update_user_stats(
                     str(message.author.id), 
                     str(message.guild.id), 
                     message.author.name,
-                    flagged=True
+                    flagged=True,
+                    message_count=message_count
                 )
             
             mod_channel = self.mod_channels.get(message.guild.id)
             if mod_channel:
-                await mod_channel.send(f'**Flagged Message** from {message.author.name}:\n"{message.content}"')
-                await mod_channel.send(self.code_format(evaluation))
-                
-                if 'regex_patterns_matched' in evaluation and evaluation['regex_patterns_matched']:
-                    regex_info = "**Regex Rules Matched:**\n"
-                    for pattern in evaluation['regex_patterns_matched']:
-                        regex_info += f"- {pattern['description'] or pattern['pattern']} (Weight: +{pattern['weight']*100:.1f}%)\n"
-                    await mod_channel.send(regex_info)
-                
-                # Add reaction options for flagged messages
-                sent_message = await mod_channel.send(
-                    "**Moderator Actions:** Does this content violate Community Standards?\n"
-                    "-React 🟢 if this is a violation\n"
-                    "-React 🔴 if this is not a violation\n"
-                    "-React 🟡 if you are unsure"
+                # One embed with the reactions on it, instead of four messages
+                high_confidence = evaluation.final_classification == 'high_confidence_violation'
+                sent_message = await self.mod_dispatcher.send(
+                    mod_channel,
+                    embeds=[self._build_flag_embed(message, evaluation, message_count)],
+                    reactions=["🟢", "🔴", "🟡"],
+                    priority=HIGH if high_confidence else NORMAL,
+                    tag=str(message.id)
                 )
-                await sent_message.add_reaction("🟢")
-                await sent_message.add_reaction("🔴")
-                await sent_message.add_reaction("🟡")
                 
                 # Store decision tracking data
                 flagged_msg_id = evaluation.get('db_record_id')
@@ -387,51 +679,80 @@ class ModBot(discord.Client):
                     'guild_id': str(message.guild.id),
                     'username': message.author.name,
                     'message_content': message.content,
-                    'flagged_msg_id': flagged_msg_id
+                    'flagged_msg_id': flagged_msg_id,
+                    'flagged_msg_ids': evaluation.get('db_record_ids', [])
                 }
 
-    async def _check_written_report_response(self, message):
-        """Check if this message is a written report response"""
-        if message.channel.id not in [c.id for c in self.mod_channels.values()]:
-            return False
-            
-        report_request_found = False
-        async for msg in message.channel.history(limit=10):
-            if (msg.author.id == self.user.id and 
-                "Please write a report explaining" in msg.content):
-                report_request_found = True
-                print(f"Found report request before message: {message.content[:30]}...")
-                break
+    def _build_flag_embed(self, message, evaluation, message_count=1):
+        """Render a flagged message, its analysis and the moderator prompt as one embed"""
+        if message_count > 1:
+            title = f"Flagged Messages ({message_count} in a row) from {message.author.name}"
+        else:
+            title = f"Flagged Message from {message.author.name}"
         
-        if report_request_found:
-            if message.author.id != self.user.id:
-                print(f"Processing written report: {message.content[:30]}...")
-                return True
-        return False
+        embed = discord.Embed(
+            title=title,
+            description=_truncate(self.code_format(evaluation), 4096),
+            color=discord.Color.red() if evaluation.final_classification == 'high_confidence_violation' else discord.Color.orange()
+        )
+        embed.add_field(name="Message", value=_truncate(f'"{message.content}"', 1024), inline=False)
+        
+        if evaluation.get('regex_patterns_matched'):
+            regex_info = ""
+            for pattern in evaluation['regex_patterns_matched']:
+                regex_info += f"- {pattern['description'] or pattern['pattern']} (Weight: +{pattern['weight']*100:.1f}%)\n"
+            embed.add_field(name="Regex Rules Matched", value=_truncate(regex_info, 1024), inline=False)
+        
+        embed.add_field(
+            name="Moderator Actions",
+            value="Does this content violate Community Standards?\n"
+                  "-React 🟢 if this is a violation\n"
+                  "-React 🔴 if this is not a violation\n"
+                  "-React 🟡 if you are unsure",
+            inline=False
+        )
+        return embed
+
+    def _check_written_report_response(self, message):
+        """Return the written report request this message answers, if any"""
+        if message.channel.id not in self.mod_channel_ids:
+            return None
+        
+        reply_to_id = message.reference.message_id if message.reference else None
+        request_id = self.written_report_requests.match(message.channel.id, message.author.id, reply_to_id)
+        if request_id:
+            log.info("processing written report", request_id=request_id, content=message.content)
+        return request_id
     
-    async def _handle_written_report(self, message):
+    async def _handle_written_report(self, message, request_id):
         """Process the written report from a moderator"""
-        for decision_id, decision_data in list(self.pending_decisions.items()):
-            if decision_data.get('awaiting_written_report'):
-                # Store the written report
-                written_report = message.content
-                self.pending_decisions[decision_id]['written_report'] = written_report
-                self.pending_decisions[decision_id]['awaiting_written_report'] = False
-                
-                # Update database with written report
-                if self.database and 'flagged_msg_id' in decision_data:
-                    try:
-                        await self.database.update_flagged_message_notes(
-                            decision_data['flagged_msg_id'],
-                            written_report
-                        )
-                        print(f"Updated database with written report for message {decision_data['flagged_msg_id']}")
-                    except Exception as e:
-                        print(f"Error updating database with written report: {e}")
-                
-                # Ask about escalation
-                await self._add_escalation_reactions(message)
-                return
+        self.written_report_requests.remove(request_id)
+        
+        request_data = self.pending_decisions.get(request_id)
+        if not request_data:
+            return
+        
+        # Store the written report on both the request and the original decision
+        written_report = message.content
+        self.pending_decisions.update(request_id, written_report=written_report,
+                                      awaiting_written_report=False)
+        original_id = request_data.get('original_decision_id')
+        if original_id:
+            self.pending_decisions.update(original_id, written_report=written_report,
+                                          awaiting_written_report=False)
+        
+        # Update database with written report
+        if self.database:
+            for flagged_msg_id in self._flagged_msg_ids(request_data):
+                try:
+                    await self.database.update_flagged_message_notes(flagged_msg_id, written_report)
+                except Exception as e:
+                    log.error("error updating database with written report", doc_id=flagged_msg_id, error=str(e))
+        
+        # Ask about escalation
+        await self._add_escalation_reactions(message)
+
+    @tracer.traced('eval_text')
     async def eval_text(self, message_content, message_obj=None):
         ''''
         TODO: Once you know how you want to evaluate messages in your channel, 
@@ -439,7 +760,7 @@ class ModBot(discord.Client):
         '''
         if self.ai_classifier:
             try:
-                thresholds = await self.database.get_guild_thresholds()
+                thresholds = await self._get_thresholds()
                 violation_threshold = thresholds['violation_threshold']
                 high_confidence_threshold = thresholds['high_confidence_threshold']
                 
@@ -451,32 +772,52 @@ class ModBot(discord.Client):
                         str(message_obj.guild.id)
                     )
                 
+                # Compact summary of the conversation so far, for the Gemini prompt
+                conversation_context = self.conversations.summary_for(message_obj) if message_obj else None
+                
+                # Under overload, low-risk users get the local-only path (no provider calls)
+                user_risk_score = self.ai_classifier._calculate_user_risk_score(user_stats) if user_stats else 0.0
+                mode = self.overload_policy.admit(user_risk_score)
+                
+                if mode == LOCAL:
+                    ai_result = await self.ai_classifier.classify_message_local(message_content)
                 # Use enhanced classification with user context and regex rules
-                if user_stats and hasattr(self.ai_classifier, 'classify_message_with_user_context'):
+                elif user_stats and hasattr(self.ai_classifier, 'classify_message_with_user_context'):
                     ai_result = await self.ai_classifier.classify_message_with_user_context(
-                        message_content, user_stats
+                        message_content, user_stats, conversation_context
                     )
                     if hasattr(self.ai_classifier, 'classify_message_with_regex'):
                         base_score = ai_result['ai_scores']['combined_score']
                         
-                        # Apply regex rules
-                        from regex_check import RegexCheck
-                        regex_check = RegexCheck()
-                        regex_result = await regex_check.apply_regex_rules(message_content)
+                        # Apply regex rules (the classifier's checker keeps the rules cached)
+                        regex_result = await self.ai_classifier.regex_check.apply_regex_rules(message_content)
                         regex_bonus = regex_result['total_regex_score'] * 100
                         
                         # Update the result with regex enhancement
-                        ai_result['ai_scores']['combined_score'] = min(100, base_score + regex_bonus)
+                        ai_result['ai_scores']['combined_score'] = self.ai_classifier.regex_adjusted_score(
+                            base_score, regex_result['total_regex_score'])
                         ai_result['ai_scores']['base_score_with_user_context'] = base_score
                         ai_result['ai_scores']['regex_bonus'] = regex_bonus
                         ai_result['regex_patterns_matched'] = regex_result['patterns_matched']
                 else:
                     # Fallback to basic classification WITH regex
-                    ai_result = await self.ai_classifier.classify_message_with_regex(message_content)
+                    ai_result = await self.ai_classifier.classify_message_with_regex(message_content, conversation_context)
+                
+                if mode != LOCAL:
+                    self.overload_policy.record_provider_result(
+                        ai_result['ai_scores']['gemini_classification'] != 'error'
+                    )
                 
                 combined_score = ai_result['ai_scores']['combined_score']
                 ai_result['is_violation'] = combined_score > violation_threshold
                 
+                # Fold this message into the conversation's rolling state
+                if message_obj:
+                    conversation = self.conversations.update(
+                        message_obj, combined_score, ai_result['analysis_details']['nl_threat_patterns']
+                    )
+                    ai_result['conversation_trend'] = conversation.trend
+                
                 ai_result['thresholds_used'] = {
                     'violation_threshold': violation_threshold,
                     'high_confidence_threshold': high_confidence_threshold,
@@ -490,31 +831,44 @@ class ModBot(discord.Client):
                 else:
                     ai_result['final_classification'] = 'below_threshold'
                 
-                # Log to database if flagged
+                # Log to database if flagged; a burst's verdict is attributed to each of its messages
                 if ai_result['is_violation'] and self.database and message_obj:
-                    message_data = {
-                        'message_id': str(message_obj.id),
-                        'guild_id': str(message_obj.guild.id),
-                        'channel_id': str(message_obj.channel.id),
-                        'user_id': str(message_obj.author.id),
-                        'username': message_obj.author.name,
-                        'content': message_content,
-                        'timestamp': message_obj.created_at,
-                        'source': 'ai_detection',
-                        'ai_scores': ai_result['ai_scores'],
-                        'final_classification': ai_result['final_classification'],
-                        'moderation_status': 'pending',
-                        'user_context_used': user_stats is not None,
-                        'thresholds_used': ai_result['thresholds_used'],
-                        'regex_patterns_matched': ai_result.get('regex_patterns_matched', [])  # Include regex info
-                    }
-                    # Store the database record ID in the result
-                    db_record_id = await self.database.log_flagged_message(message_data)
-                    ai_result['db_record_id'] = db_record_id
+                    constituents = getattr(message_obj, 'messages', [message_obj])
+                    flag_document = ai_result.to_flag_document()
+                    db_record_ids = []
+                    for constituent in constituents:
+                        message_data = {
+                            'message_id': str(constituent.id),
+                            'guild_id': str(constituent.guild.id),
+                            'channel_id': str(constituent.channel.id),
+                            'user_id': str(constituent.author.id),
+                            'username': constituent.author.name,
+                            'content': constituent.content,
+                            'timestamp': constituent.created_at,
+                            'source': 'ai_detection',
+                            'moderation_status': 'pending',
+                            'user_context_used': user_stats is not None
+                        }
+                        if len(constituents) > 1:
+                            message_data['burst_message_ids'] = [str(m.id) for m in constituents]
+                        # Only the fields we query or show; verbose output goes to the cold store
+                        message_data.update(flag_document)
+                        db_record_id = await self.database.log_flagged_message(message_data)
+                        if db_record_id:
+                            db_record_ids.append(db_record_id)
+                    
+                    # Store the database record IDs in the result
+                    ai_result['db_record_ids'] = db_record_ids
+                    ai_result['db_record_id'] = db_record_ids[0] if db_record_ids else None
+                    await self.database.log_flag_research(ai_result['db_record_id'], ai_result.to_research_document())
+                
+                if 'first_classification' not in self.startup_timings:
+                    self.startup_timings['first_classification'] = round(time.monotonic() - self._started_at, 3)
+                    log.info("first classification", seconds_since_start=self.startup_timings['first_classification'])
                 
                 return ai_result
-            except Exception as e:
-                print(f"Classifier evaluation failed: {e}")
+            except Exception:
+                log.exception("classifier evaluation failed")
                 return message_content
         return message_content
 
@@ -524,7 +878,7 @@ class ModBot(discord.Client):
         evaluated, insert your code here for formatting the string to be 
         shown in the mod channel. 
         '''
-        if isinstance(text, dict) and 'ai_scores' in text:
+        if isinstance(text, ClassificationResult):
             ai_scores = text['ai_scores']
             details = text['analysis_details']
             
@@ -546,6 +900,10 @@ class ModBot(discord.Client):
                 formatted_output += f"\n"
                 
             formatted_output += f"-Classification: {text['final_classification']}\n"
+            if text.get('conversation_trend') in ('escalating', 'de-escalating'):
+                formatted_output += f"-Conversation: {text['conversation_trend']}\n"
+            if text.get('local_only'):
+                formatted_output += "-Mode: local-only (bot under load, Gemini/NL skipped)\n"
             formatted_output += f"-Confidence Level: {text['confidence_level']}\n"
             
             # Show user context if available
@@ -582,9 +940,35 @@ class ModBot(discord.Client):
 
 
 def main():
-    """Main function to run the bot"""
-    client = ModBot()
-    client.run(discord_token)
+    """Main function to run the bot
+
+    Sharding is configured with environment variables:
+      BOT_SHARD_COUNT=4 BOT_SHARD_IDS=0,1  runs shards 0 and 1 of 4 in this process
+      BOT_SHARD_COUNT=4                    runs all 4 shards in this process
+    Without them Discord's recommended shard count is used in a single process.
+    Log levels and content redaction are configured in structured_logging.
+    Metrics are served at http://127.0.0.1:$BOT_METRICS_PORT/metrics (default 9108, plus the first shard ID).
+    Profiling: BOT_PROFILE_SECONDS=30 samples the first 30s, BOT_PROFILE_MESSAGE_RATE=0.01 cProfiles 1% of messages.
+    Memory: BOT_MEMORY_LIMITS="reports=200" overrides structure limits, BOT_TRACEMALLOC=1 traces allocations from startup.
+    Overload: BOT_QUEUE_WAIT_BUDGET=10 is the queue wait (seconds) past which low-risk messages are degraded.
+    """
+    configure_logging()
+    shard_count = int(os.environ['BOT_SHARD_COUNT']) if os.environ.get('BOT_SHARD_COUNT') else None
+    shard_ids = [int(i) for i in os.environ['BOT_SHARD_IDS'].split(',')] if os.environ.get('BOT_SHARD_IDS') else None
+    if shard_ids is not None and shard_count is None:
+        raise Exception("BOT_SHARD_IDS requires BOT_SHARD_COUNT")
+    
+    # Each process in a sharded deployment gets its own metrics port
+    metrics_port = int(os.environ.get('BOT_METRICS_PORT', 9108)) + (shard_ids[0] if shard_ids else 0)
+    
+    client = ModBot(shard_ids=shard_ids, shard_count=shard_count, metrics_port=metrics_port,
+                    profile_seconds=int(os.environ.get('BOT_PROFILE_SECONDS', 0)),
+                    profile_message_rate=float(os.environ.get('BOT_PROFILE_MESSAGE_RATE', 0)),
+                    memory_limits=parse_limits(os.environ.get('BOT_MEMORY_LIMITS', '')),
+                    trace_malloc=os.environ.get('BOT_TRACEMALLOC') == '1',
+                    queue_wait_budget=float(os.environ.get('BOT_QUEUE_WAIT_BUDGET', 10)))
+    # log_handler=None: discord.py would otherwise attach its own blocking handler
+    client.run(load_discord_token(), log_handler=None)
 
 
 if __name__ == "__main__":
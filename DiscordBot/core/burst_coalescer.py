@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Callable, Dict, List
+
+
+class MessageBurst:
+    """Consecutive messages from one author in one channel, classified as one unit.
+
+    Exposes the same attributes eval_text and handle_channel_message read from a
+    discord.Message (id, author, guild, channel, created_at, content), so a
+    burst of one behaves exactly like the message itself.
+    """
+
+    __slots__ = ('messages', 'started_at', 'trace')
+
+    def __init__(self, message):
+        self.messages = [message]
+        self.started_at = time.monotonic()
+        self.trace = None  # tracing.Trace when this burst was sampled
+
+    @property
+    def first(self):
+        return self.messages[0]
+
+    @property
+    def id(self):
+        return self.first.id
+
+    @property
+    def author(self):
+        return self.first.author
+
+    @property
+    def guild(self):
+        return self.first.guild
+
+    @property
+    def channel(self):
+        return self.first.channel
+
+    @property
+    def created_at(self):
+        return self.first.created_at
+
+    @property
+    def content(self) -> str:
+        return '\n'.join(message.content for message in self.messages)
+
+    @property
+    def message_ids(self) -> List[str]:
+        return [str(message.id) for message in self.messages]
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class BurstCoalescer:
+    """Per-author, per-channel debounce in front of the classification queue.
+
+    A burst is flushed when the author has been quiet for idle_seconds, when
+    max_delay seconds have passed since its first message, or as soon as it
+    reaches max_messages or max_chars.
+
+    start_trace(message), if given, is called with the first message of each
+    new burst and its result stored as burst.trace. It runs before any flush,
+    so a burst flushed by its very first message is traced too.
+    """
+
+    def __init__(self, flush: Callable[[MessageBurst], None], idle_seconds: float = 2.0,
+                 max_delay: float = 6.0, max_messages: int = 8, max_chars: int = 2000,
+                 start_trace: Callable = None):
+        self.flush = flush
+        self.start_trace = start_trace
+        self.idle_seconds = idle_seconds
+        self.max_delay = max_delay
+        self.max_messages = max_messages
+        self.max_chars = max_chars
+        self._bursts = {}  # (guild_id, channel_id, author_id) -> MessageBurst
+        self._timers = {}
+
+        self.messages_in = 0
+        self.bursts_out = 0
+
+    def add(self, message) -> MessageBurst:
+        """Add a message to its author's open burst (or a new one) and return the burst"""
+        key = (message.guild.id, message.channel.id, message.author.id)
+        self.messages_in += 1
+
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = MessageBurst(message)
+            if self.start_trace:
+                burst.trace = self.start_trace(message)
+        else:
+            burst.messages.append(message)
+
+        if len(burst) >= self.max_messages or sum(len(m.content) for m in burst.messages) >= self.max_chars:
+            self._flush_key(key)
+            return burst
+
+        # Restart the idle timer, but never past max_delay from the first message
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        remaining = self.max_delay - (time.monotonic() - burst.started_at)
+        delay = max(0.0, min(self.idle_seconds, remaining))
+        self._timers[key] = asyncio.get_running_loop().call_later(delay, self._flush_key, key)
+        return burst
+
+    def _flush_key(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        burst = self._bursts.pop(key, None)
+        if burst is not None:
+            self.bursts_out += 1
+            self.flush(burst)
+
+    def flush_all(self):
+        for key in list(self._bursts):
+            self._flush_key(key)
+
+    def stats(self) -> Dict:
+        return {
+            'open_bursts': len(self._bursts),
+            'messages_in': self.messages_in,
+            'bursts_out': self.bursts_out,
+            'messages_per_burst': round(self.messages_in / self.bursts_out, 2) if self.bursts_out else 0.0
+        }
@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Dict
+
+
+class ClassificationResult:
+    """Compact result of a single classification.
+
+    Supports the same item access as the dict it replaces, so callers can keep
+    using result['ai_scores']['combined_score'] and friends. The raw provider
+    outputs are kept once; the verbose 'analysis_details' and 'research_data'
+    sections are only built the first time somebody asks for them.
+    """
+
+    __slots__ = (
+        'message_content', 'timestamp', 'ai_scores', 'final_classification',
+        'is_violation', 'confidence_level', 'language_info', 'translation_info',
+        'analysis_text', '_gemini_result', '_nl_result', '_analysis_details',
+        '_extra'
+    )
+
+    MODEL_VERSIONS = {
+        'gemini_model': 'gemini-1.5-flash',
+        'natural_language_api': 'v1_enhanced'
+    }
+
+    # Fields written to flagged_messages. Everything else goes to the cold store.
+    STORED_SCORE_FIELDS = (
+        'combined_score', 'gemini_confidence', 'gemini_classification',
+        'natural_language_confidence', 'user_risk_adjustment',
+        'original_combined_score', 'regex_bonus'
+    )
+
+    _FIELDS = ('message_content', 'timestamp', 'ai_scores', 'final_classification',
+               'is_violation', 'confidence_level', 'language_info',
+               'translation_info', 'analysis_text')
+
+    def __init__(self, message_content: str, ai_scores: Dict, final_classification: str,
+                 is_violation: bool, confidence_level: str, gemini_result: Dict = None,
+                 nl_result: Dict = None, timestamp: datetime = None):
+        self.message_content = message_content
+        self.timestamp = timestamp or datetime.now()
+        self.ai_scores = ai_scores
+        self.final_classification = final_classification
+        self.is_violation = is_violation
+        self.confidence_level = confidence_level
+        self.language_info = None
+        self.translation_info = None
+        self.analysis_text = message_content
+        self._gemini_result = gemini_result or {}
+        self._nl_result = nl_result or {}
+        self._analysis_details = None
+        self._extra = {}
+
+    @property
+    def analysis_details(self) -> Dict:
+        if self._analysis_details is None:
+            gemini = self._gemini_result
+            nl = self._nl_result
+            self._analysis_details = {
+                'gemini_reasoning': gemini.get('gemini_reasoning', ''),
+                'gemini_risk_indicators': gemini.get('gemini_risk_indicators', []),
+                'nl_threat_patterns': nl.get('syntax', {}).get('threat_patterns', []),
+                'nl_sentiment': nl.get('sentiment', {}).get('interpretation', 'neutral'),
+                'nl_entities': nl.get('entities', {}).get('entities', []),
+                'nl_threat_level': nl.get('enhanced_threat_assessment', {}).get('threat_level', 'minimal')
+            }
+        return self._analysis_details
+
+    @property
+    def research_data(self) -> Dict:
+        """Verbose provider output, built on demand and never cached"""
+        nl = self._nl_result
+        return {
+            'individual_scores': {
+                'gemini_only': self.ai_scores.get('gemini_confidence', 0),
+                'nl_only': self.ai_scores.get('natural_language_confidence', 0)
+            },
+            'pattern_analysis': nl.get('syntax', {}),
+            'entity_analysis': nl.get('entities', {}),
+            'sentiment_analysis': nl.get('sentiment', {})
+        }
+
+    # Dict-style access, kept for the existing callers
+    def __getitem__(self, key):
+        if key in self._FIELDS:
+            return getattr(self, key)
+        if key == 'analysis_details':
+            return self.analysis_details
+        if key == 'research_data':
+            return self.research_data
+        if key == 'processing_timestamp':
+            return self.timestamp
+        if key == 'model_versions':
+            return self.MODEL_VERSIONS
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._FIELDS:
+            setattr(self, key, value)
+        elif key == 'analysis_details':
+            self._analysis_details = value
+        else:
+            self._extra[key] = value
+
+    def __contains__(self, key) -> bool:
+        return (key in self._FIELDS or key in self._extra or
+                key in ('analysis_details', 'research_data', 'processing_timestamp', 'model_versions'))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def copy(self) -> 'ClassificationResult':
+        """Shallow copy, same semantics as dict.copy()"""
+        clone = ClassificationResult.__new__(ClassificationResult)
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        clone._extra = dict(self._extra)
+        return clone
+
+    def to_flag_document(self) -> Dict:
+        """Slim fields for the flagged_messages collection (what we query or show)"""
+        scores = {key: self.ai_scores[key] for key in self.STORED_SCORE_FIELDS
+                  if key in self.ai_scores}
+        document = {
+            'ai_scores': scores,
+            'final_classification': self.final_classification,
+            'confidence_level': self.confidence_level
+        }
+
+        patterns = self._extra.get('regex_patterns_matched')
+        if patterns:
+            document['regex_patterns_matched'] = [p['description'] or p['pattern'] for p in patterns]
+
+        thresholds = self._extra.get('thresholds_used')
+        if thresholds:
+            document['violation_threshold'] = thresholds['violation_threshold']
+
+        if self.language_info and self.language_info.get('language_code') != 'en':
+            document['language_code'] = self.language_info['language_code']
+
+        return document
+
+    def to_research_document(self) -> Dict:
+        """Verbose fields for the optional cold store"""
+        return {
+            'analysis_details': self.analysis_details,
+            'research_data': self.research_data,
+            'model_versions': self.MODEL_VERSIONS,
+            'language_info': self.language_info,
+            'translation_info': self.translation_info,
+            'analysis_text': self.analysis_text,
+            'processing_timestamp': self.timestamp
+        }
+
+    @classmethod
+    def from_flag_document(cls, document: Dict) -> 'ClassificationResult':
+        """Rebuild a result from a stored flag so it can be reused without reclassifying"""
+        scores = dict(document.get('ai_scores', {}))
+        result = cls(
+            message_content=document.get('content', ''),
+            ai_scores=scores,
+            final_classification=document.get('final_classification', 'unknown'),
+            is_violation=True,
+            confidence_level=document.get('confidence_level', 'unknown'),
+            timestamp=document.get('flagged_at')
+        )
+        result['db_record_id'] = document.get('doc_id')
+        return result
+
+    def __repr__(self):
+        return (f"ClassificationResult(score={self.ai_scores.get('combined_score')}, "
+                f"classification={self.final_classification!r})")
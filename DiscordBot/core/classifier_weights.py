@@ -0,0 +1,98 @@
+import copy
+import json
+import os
+from typing import Dict
+
+from structured_logging import get_logger
+
+log = get_logger('classifier_weights')
+
+# Tunable constants for combining provider outputs into a score. The defaults
+# are the hand-set values; tests/fusion_optimizer.py refits them offline from
+# the evaluation feature store and writes a file in the same shape, which
+# AIClassifier loads at startup. Keys missing from the file keep their default.
+
+DEFAULT_WEIGHTS = {
+    # Share of the combined score from each provider
+    'fusion': {
+        'gemini': 0.80,
+        'natural_language': 0.20,
+    },
+    # Points (out of 1.0) each indicator adds to the Natural Language threat score
+    'threat': {
+        'sentiment_very_negative': 0.15,
+        'sentiment_negative': 0.08,
+        'money_with_patterns': 0.15,
+        'sexual_content_payment_combo': 0.25,
+        'possessive_intimate_content': 0.20,
+        'intimate_distribution_threat': 0.18,
+        'platform_intimate_threat': 0.15,
+        'payment_conditional': 0.10,
+        'urgent_payment_demand': 0.08,
+        'multiple_high_value': 0.15,
+        'high_value_with_others': 0.08,
+    },
+    # Classifier defaults. The bot flags with the guild thresholds set from the
+    # dashboard, so fusion_optimizer.py fits the weights at those and writes them here.
+    'thresholds': {
+        'violation': 50,
+        'high_confidence': 85,
+    },
+    # Score cut-offs for the final_classification and confidence_level labels
+    'classification': {
+        'likely_violation': 75,
+        'possible_violation': 50,
+        'low_risk': 30,
+        'confidence_very_high': 90,
+        'confidence_high': 75,
+        'confidence_medium': 60,
+        'confidence_low': 40,
+    },
+    # User history. Not refit by fusion_optimizer.py: the evaluation set's user
+    # stats are synthetic, so these stay hand-set until real histories are labeled.
+    'user_context': {
+        # Rate cut-offs and the risk (out of 1.0) each adds to the user's risk score
+        'flagged_rate_high': 0.10,
+        'flagged_rate_high_risk': 0.30,
+        'flagged_rate_elevated': 0.05,
+        'flagged_rate_elevated_risk': 0.15,
+        'violation_rate_high': 0.70,
+        'violation_rate_high_risk': 0.40,
+        'violation_rate_elevated': 0.50,
+        'violation_rate_elevated_risk': 0.20,
+        'false_positive_rate_high': 0.50,
+        'false_positive_rate_high_risk': -0.20,
+        # Risk score cut-offs and the points they add to the combined score
+        'high_risk': 0.60,
+        'high_risk_adjustment': 3,
+        'elevated_risk': 0.30,
+        'elevated_risk_adjustment': 1,
+        # Users whose flags are mostly false positives get points taken off instead
+        'trusted_false_positive_rate': 0.60,
+        'trusted_max_risk': 0.20,
+        'trusted_adjustment': -5,
+    },
+}
+
+HIGH_VALUE_PATTERNS = ('sexual_content_payment_combo', 'possessive_intimate_content',
+                       'intimate_distribution_threat', 'platform_intimate_threat')
+MEDIUM_VALUE_PATTERNS = ('payment_conditional', 'urgent_payment_demand')
+
+
+def load_weights(path: str = '../config/classifier_weights.json') -> Dict:
+    """Defaults overlaid with the fitted file at path, if there is one"""
+    weights = copy.deepcopy(DEFAULT_WEIGHTS)
+    if not path or not os.path.exists(path):
+        return weights
+    try:
+        with open(path, encoding='utf-8') as f:
+            fitted = json.load(f)
+    except (OSError, ValueError) as e:
+        log.error("could not read classifier weights, using defaults", path=path, error=str(e))
+        return weights
+    for section, values in weights.items():
+        for key in values:
+            if key in fitted.get(section, {}):
+                values[key] = fitted[section][key]
+    log.info("classifier weights loaded", path=path, fitted_at=fitted.get('fitted_at'))
+    return weights
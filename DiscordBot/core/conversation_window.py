@@ -0,0 +1,121 @@
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+
+class ConversationState:
+    """Rolling features for one conversation, updated in O(1) per message"""
+
+    __slots__ = ('message_count', 'last_active', 'recent_scores', 'pattern_counts',
+                 'short_average', 'long_average', 'peak_score')
+
+    SHORT_ALPHA = 0.5   # weight of the newest score in the short moving average
+    LONG_ALPHA = 0.15   # ... and in the long one
+
+    def __init__(self, window: int):
+        self.message_count = 0
+        self.last_active = time.monotonic()
+        self.recent_scores = deque(maxlen=window)
+        self.pattern_counts = {}
+        self.short_average = 0.0
+        self.long_average = 0.0
+        self.peak_score = 0.0
+
+    def update(self, score: float, patterns: List[str]):
+        self.message_count += 1
+        self.last_active = time.monotonic()
+        self.recent_scores.append(score)
+        self.peak_score = max(self.peak_score, score)
+        for pattern in patterns:
+            self.pattern_counts[pattern] = self.pattern_counts.get(pattern, 0) + 1
+
+        if self.message_count == 1:
+            self.short_average = self.long_average = score
+        else:
+            self.short_average += self.SHORT_ALPHA * (score - self.short_average)
+            self.long_average += self.LONG_ALPHA * (score - self.long_average)
+
+    @property
+    def trend(self) -> str:
+        """Escalation trend: short-term average compared to the long-term one"""
+        if self.message_count < 3:
+            return 'new'
+        difference = self.short_average - self.long_average
+        if difference > 10:
+            return 'escalating'
+        if difference < -10:
+            return 'de-escalating'
+        return 'steady'
+
+    def summary(self) -> str:
+        """Compact text for the Gemini prompt, independent of conversation length"""
+        parts = [f"{self.message_count} earlier messages, escalation trend: {self.trend}"]
+        if self.recent_scores:
+            parts.append("recent risk scores: " + ", ".join(f"{s:.0f}" for s in self.recent_scores))
+            parts.append(f"peak score: {self.peak_score:.0f}")
+        if self.pattern_counts:
+            parts.append("threat patterns seen: " + ", ".join(
+                f"{name} x{count}" for name, count in sorted(self.pattern_counts.items())))
+        return "; ".join(parts)
+
+
+class ConversationTracker:
+    """Per-conversation sliding-window state for guild channels and DM pairs.
+
+    Holds at most max_conversations states (least recently active are dropped
+    first) and evicts any conversation idle for longer than idle_seconds.
+    """
+
+    def __init__(self, window: int = 10, max_conversations: int = 5000, idle_seconds: float = 3600):
+        self.window = window
+        self.max_conversations = max_conversations
+        self.idle_seconds = idle_seconds
+        self._states = OrderedDict()  # key -> ConversationState, least recently active first
+        self.evicted = 0
+
+    @staticmethod
+    def conversation_key(message):
+        if message.guild:
+            return ('channel', message.guild.id, message.channel.id)
+        # DM: key by the pair of participants so either side maps to the same state
+        recipient = getattr(message.channel, 'recipient', None)
+        other_id = recipient.id if recipient else message.channel.id
+        return ('dm',) + tuple(sorted((message.author.id, other_id)))
+
+    def get(self, message) -> Optional[ConversationState]:
+        self._evict_idle()
+        return self._states.get(self.conversation_key(message))
+
+    def summary_for(self, message) -> Optional[str]:
+        state = self.get(message)
+        if state is None or state.message_count == 0:
+            return None
+        return state.summary()
+
+    def update(self, message, score: float, patterns: List[str]) -> ConversationState:
+        key = self.conversation_key(message)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = ConversationState(self.window)
+        state.update(score, patterns)
+        self._states.move_to_end(key)
+
+        while len(self._states) > self.max_conversations:
+            self._states.popitem(last=False)
+            self.evicted += 1
+        return state
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if state.last_active >= cutoff:
+                break
+            del self._states[key]
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._states)
+
+    def stats(self) -> Dict:
+        return {'conversations': len(self._states), 'evicted': self.evicted}
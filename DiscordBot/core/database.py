@@ -1,40 +1,114 @@
-import os
-from google.cloud import firestore
 from datetime import datetime
 from typing import Dict, List, Optional
 import asyncio
 from pathlib import Path
+from metrics import metrics
+from provider_cassette import ProviderCassette
+from structured_logging import get_logger
+
+log = get_logger('database')
 
 # Database Structure
 # Collections:
 #   flagged_messages
 #   user_statistics
 #   moderation_actions
+#   flag_research (optional cold store, see store_research_data)
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, store_research_data: bool = False, credentials_path: str = 'google-credentials.json',
+                 cassette: ProviderCassette = None):
         """Initialize Firestore client"""
+        self.store_research_data = store_research_data
+        # Only the reads evaluation depends on (rules, thresholds) go through the cassette.
+        # It is off unless an evaluation script passes one: the bot and dashboard must
+        # always read live rules and thresholds, whatever BOT_CASSETTE says.
+        self.cassette = cassette or ProviderCassette()
+        if self.cassette.offline:
+            self.db = None
+            log.info("database offline, replaying recorded reads")
+            return
         
-        # Set environment variable for Google credentials
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'google-credentials.json'
+        # Imported here so importing this module (e.g. for regex validation) doesn't load the SDK
+        from google.cloud import firestore
        
-        # Initialize Firestore client
-        self.db = firestore.Client()
-        print("Database connection initialized")
+        # Initialize Firestore client; credentials are passed explicitly so other
+        # Google clients can be created concurrently without sharing an env var
+        self.db = firestore.Client.from_service_account_json(credentials_path)
+        log.info("database connection initialized")
+    
+    @staticmethod
+    def flagged_message_doc_id(guild_id: str, message_id: str) -> str:
+        """Deterministic document ID so the same Discord message is only stored once"""
+        return f"{guild_id}_{message_id}"
     
+    @metrics.timed('flag_log')
     async def log_flagged_message(self, message_data: Dict) -> Optional[str]:
+        """Log a flagged message, merging sources and reporters if it was already logged"""
         try:
+            doc_id = self.flagged_message_doc_id(message_data['guild_id'], message_data['message_id'])
+            doc_ref = self.db.collection('flagged_messages').document(doc_id)
+            from google.api_core.exceptions import AlreadyExists
+            from google.cloud import firestore
+            
+            source = message_data.get('source')
+            reporter_id = message_data.pop('reporter_id', None)
+            reporter_username = message_data.pop('reporter_username', None)
+            
             if 'flagged_at' not in message_data:
                 message_data['flagged_at'] = datetime.now()
+            message_data['sources'] = [source] if source else []
+            message_data['reporter_ids'] = [reporter_id] if reporter_id else []
+            message_data['reporter_usernames'] = [reporter_username] if reporter_username else []
             
-            # Add to collection
-            doc_ref = self.db.collection('flagged_messages').add(message_data)
-            print(f"Logged flagged message with ID: {doc_ref[1].id}")
-            return doc_ref[1].id
+            try:
+                # Single write in the common case; fails if the message was already logged
+                doc_ref.create(message_data)
+                log.info("flagged message logged", doc_id=doc_id, source=source)
+            except AlreadyExists:
+                # Keep the original scores and moderation status, only merge who flagged it
+                merge = {'last_logged_at': datetime.now()}
+                if source:
+                    merge['sources'] = firestore.ArrayUnion([source])
+                if reporter_id:
+                    merge['reporter_ids'] = firestore.ArrayUnion([reporter_id])
+                if reporter_username:
+                    merge['reporter_usernames'] = firestore.ArrayUnion([reporter_username])
+                doc_ref.update(merge)
+                log.info("flagged message merged", doc_id=doc_id, source=source)
+            
+            return doc_id
             
         except Exception as e:
-            print(f"Error logging flagged message: {e}")
+            log.error("error logging flagged message", error=str(e))
+            metrics.error('flag_log')
+            return None
+    
+    @metrics.timed('flag_read')
+    async def get_flagged_message(self, guild_id: str, message_id: str) -> Optional[Dict]:
+        """Point read of a flagged message by its Discord IDs"""
+        try:
+            doc_id = self.flagged_message_doc_id(guild_id, message_id)
+            doc = self.db.collection('flagged_messages').document(doc_id).get()
+            if doc.exists:
+                data = doc.to_dict()
+                data['doc_id'] = doc.id
+                return data
             return None
+            
+        except Exception as e:
+            log.error("error getting flagged message", error=str(e))
+            metrics.error('flag_read')
+            return None
+
+    async def log_flag_research(self, doc_id: str, research_data: Dict):
+        """Write verbose classifier output for a flag to the cold store, if enabled"""
+        if not self.store_research_data or not doc_id:
+            return
+        try:
+            self.db.collection('flag_research').document(doc_id).set(research_data)
+        except Exception as e:
+            log.error("error logging flag research data", error=str(e))
 
     async def update_flagged_message_status(self, doc_id: str, status: str, moderator: str):
         """Update the status of a flagged message after moderator decision"""
@@ -45,10 +119,10 @@ class DatabaseManager:
                 'moderator_decision': moderator,
                 'decision_timestamp': datetime.now()
             })
-            print(f"Updated flagged message {doc_id} status to {status}")
+            log.info("flagged message status updated", doc_id=doc_id, status=status)
             
         except Exception as e:
-            print(f"Error updating flagged message status: {e}")
+            log.error("error updating flagged message status", error=str(e))
     
     async def update_flagged_message_notes(self, doc_id: str, notes: str):
         """Update the notes/written report for a flagged message"""
@@ -58,13 +132,15 @@ class DatabaseManager:
                 'moderator_notes': notes,
                 'notes_updated_at': datetime.now()
             })
-            print(f"Updated notes for flagged message {doc_id}")
+            log.info("flagged message notes updated", doc_id=doc_id)
             
         except Exception as e:
-            print(f"Error updating flagged message notes: {e}")
+            log.error("error updating flagged message notes", error=str(e))
     
+    @metrics.timed('user_stats_write')
     async def update_user_stats(self, user_id: str, guild_id: str, username: str = "",
-                               flagged: bool = False, violation: bool = False, false_positive: bool = False):
+                               flagged: bool = False, violation: bool = False, false_positive: bool = False,
+                               message_count: int = 1):
         try:
             doc_id = f"{user_id}_{guild_id}"
             doc_ref = self.db.collection('user_statistics').document(doc_id)
@@ -76,10 +152,10 @@ class DatabaseManager:
                 stats = data.get('stats', {})
                 
                 if not violation and not false_positive:
-                    stats['total_messages'] = stats.get('total_messages', 0) + 1
+                    stats['total_messages'] = stats.get('total_messages', 0) + message_count
                     
                 if flagged:
-                    stats['flagged_messages'] = stats.get('flagged_messages', 0) + 1
+                    stats['flagged_messages'] = stats.get('flagged_messages', 0) + message_count
                     
                 if violation:
                     stats['violation_count'] = stats.get('violation_count', 0) + 1
@@ -93,7 +169,7 @@ class DatabaseManager:
                     'updated_at': datetime.now(),
                     'username': username
                 })
-                print(f"Updated stats for user {user_id}")
+                log.debug("user stats updated", user_id=user_id)
                 
             else:
                 # Create new user stats
@@ -102,8 +178,8 @@ class DatabaseManager:
                     'username': username,
                     'guild_id': guild_id,
                     'stats': {
-                        'total_messages': 1 if not violation and not false_positive else 0,
-                        'flagged_messages': 1 if flagged else 0,
+                        'total_messages': message_count if not violation and not false_positive else 0,
+                        'flagged_messages': message_count if flagged else 0,
                         'false_positives': 1 if false_positive else 0,
                         'violation_count': 1 if violation else 0,
                         'last_violation': datetime.now() if violation else None,
@@ -114,23 +190,25 @@ class DatabaseManager:
                 }
                 
                 doc_ref.set(new_stats)
-                print(f"Created new stats for user {user_id}")
+                log.debug("user stats created", user_id=user_id)
                 
         except Exception as e:
-            print(f"Error updating user stats: {e}")
+            log.error("error updating user stats", error=str(e))
+            metrics.error('user_stats_write')
     
     async def log_moderation_action(self, action_data: Dict):
         try:
             action_data['timestamp'] = datetime.now()
             doc_ref = self.db.collection('moderation_actions').add(action_data)
-            print(f"Logged moderation action with ID: {doc_ref[1].id}")
+            log.info("moderation action logged", doc_id=doc_ref[1].id)
             return doc_ref[1].id
             
         except Exception as e:
-            print(f"Error logging moderation action: {e}")
+            log.error("error logging moderation action", error=str(e))
             return None
     
     # Might want to use user stats in decision-making
+    @metrics.timed('user_stats_read')
     async def get_user_stats(self, user_id: str, guild_id: str) -> Optional[Dict]:
         try:
             doc_id = f"{user_id}_{guild_id}"
@@ -139,14 +217,16 @@ class DatabaseManager:
             if doc.exists:
                 return doc.to_dict()
             else:
-                print(f"No stats found for user {user_id}")
+                log.debug("no user stats", user_id=user_id)
                 return None
                 
         except Exception as e:
-            print(f"Error getting user stats: {e}")
+            log.error("error getting user stats", error=str(e))
+            metrics.error('user_stats_read')
             return None
     
     async def get_flagged_messages(self, limit: int = 50) -> List[Dict]:
+        from google.cloud import firestore
         try:
             docs = (self.db.collection('flagged_messages')
                    .order_by('flagged_at', direction=firestore.Query.DESCENDING)
@@ -159,13 +239,71 @@ class DatabaseManager:
                 data['doc_id'] = doc.id
                 messages.append(data)
             
-            print(f"Retrieved {len(messages)} flagged messages")
+            log.debug("flagged messages retrieved", count=len(messages))
             return messages
             
         except Exception as e:
-            print(f"Error getting flagged messages: {e}")
+            log.error("error getting flagged messages", error=str(e))
             return []
     
+    async def get_flag_outcomes(self, limit: int = 5000) -> List[Dict]:
+        """Score and moderation status of recent flags, for the dashboard's threshold simulator"""
+        from google.cloud import firestore
+        try:
+            docs = (self.db.collection('flagged_messages')
+                   .select(['ai_scores.combined_score', 'moderation_status'])
+                   .order_by('flagged_at', direction=firestore.Query.DESCENDING)
+                   .limit(limit)
+                   .stream())
+            return [doc.to_dict() for doc in docs]
+            
+        except Exception as e:
+            log.error("error getting flag outcomes", error=str(e))
+            return []
+    
+    async def get_archivable_records(self, collection: str, date_field: str, cutoff: datetime,
+                                     limit: int = 500, statuses: List[str] = None) -> List[Dict]:
+        """Get records older than cutoff, optionally only those in a resolved status"""
+        try:
+            # A full batch is a slow read; keep it off the event loop
+            return await asyncio.to_thread(self._fetch_archivable_records, collection, date_field,
+                                           cutoff, limit, statuses)
+            
+        except Exception as e:
+            log.error("error getting archivable records", collection=collection, error=str(e))
+            return []
+    
+    def _fetch_archivable_records(self, collection: str, date_field: str, cutoff: datetime,
+                                  limit: int, statuses: List[str]) -> List[Dict]:
+        query = self.db.collection(collection).where(date_field, '<', cutoff)
+        if statuses:
+            query = query.where('moderation_status', 'in', statuses)
+        
+        records = []
+        for doc in query.limit(limit).stream():
+            data = doc.to_dict()
+            data['doc_id'] = doc.id
+            records.append(data)
+        return records
+    
+    async def delete_documents(self, collection: str, doc_ids: List[str]) -> bool:
+        """Delete documents in batches (Firestore allows 500 writes per batch). Returns False on failure."""
+        try:
+            await asyncio.to_thread(self._delete_batches, collection, doc_ids)
+            log.info("documents deleted", collection=collection, count=len(doc_ids))
+            return True
+            
+        except Exception as e:
+            log.error("error deleting documents", collection=collection, error=str(e))
+            return False
+    
+    def _delete_batches(self, collection: str, doc_ids: List[str]):
+        for start in range(0, len(doc_ids), 500):
+            batch = self.db.batch()
+            for doc_id in doc_ids[start:start + 500]:
+                batch.delete(self.db.collection(collection).document(doc_id))
+            batch.commit()
+    
     async def update_system_metrics(self, date: str, metrics: Dict):
         try:
             doc_ref = self.db.collection('system_metrics').document(date)
@@ -188,10 +326,10 @@ class DatabaseManager:
                     'created_at': datetime.now()
                 })
             
-            print(f"Updated system metrics for {date}")
+            log.info("system metrics updated", date=date)
             
         except Exception as e:
-            print(f"Error updating system metrics: {e}")
+            log.error("error updating system metrics", error=str(e))
             
     # Dashboard-related functions
     async def get_pending_flagged_messages(self):
@@ -212,15 +350,9 @@ class DatabaseManager:
     async def get_custom_rules(self):
         """Get all custom regex rules"""
         try:
-            docs = self.db.collection('custom_rules').stream()
-            rules = []
-            for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                rules.append(data)
-            return rules
+            return self.cassette.call('firestore', ('custom_rules',), self._fetch_custom_rules, refresh=True)['rules']
         except Exception as e:
-            print(f"Error getting custom rules: {e}")
+            log.error("error getting custom rules", error=str(e))
             return []
 
     async def save_custom_rule(self, pattern, weight, description):
@@ -233,35 +365,48 @@ class DatabaseManager:
                 'created_at': datetime.now()
             }
             doc_ref = self.db.collection('custom_rules').add(rule_data)
-            print(f"Saved custom rule: {pattern}")
+            log.info("custom rule saved", pattern=pattern)
             return doc_ref[1].id
         except Exception as e:
-            print(f"Error saving custom rule: {e}")
+            log.error("error saving custom rule", error=str(e))
             return None
 
     async def delete_custom_rule(self, rule_id):
         """Delete a custom regex rule"""
         try:
             self.db.collection('custom_rules').document(rule_id).delete()
-            print(f"Deleted custom rule: {rule_id}")
+            log.info("custom rule deleted", rule_id=rule_id)
         except Exception as e:
-            print(f"Error deleting custom rule: {e}")
+            log.error("error deleting custom rule", error=str(e))
             
+    @metrics.timed('threshold_read')
     async def get_guild_thresholds(self):
         """Get current AI thresholds"""
         try:
-            doc = self.db.collection('system_config').document('ai_thresholds').get()
-            if doc.exists:
-                return doc.to_dict()
-            else:
-                return {
-                    'violation_threshold': 50,
-                    'high_confidence_threshold': 85
-                }
+            return self.cassette.call('firestore', ('ai_thresholds',), self._fetch_thresholds, refresh=True)
         except Exception as e:
-            print(f"Error getting thresholds: {e}")
+            log.error("error getting thresholds", error=str(e))
+            metrics.error('threshold_read')
             return {'violation_threshold': 50, 'high_confidence_threshold': 85}
 
+    def _fetch_custom_rules(self) -> Dict:
+        rules = []
+        for doc in self.db.collection('custom_rules').stream():
+            data = doc.to_dict()
+            data['id'] = doc.id
+            rules.append(data)
+        return {'rules': rules}
+
+    def _fetch_thresholds(self) -> Dict:
+        doc = self.db.collection('system_config').document('ai_thresholds').get()
+        if doc.exists:
+            return doc.to_dict()
+        else:
+            return {
+                'violation_threshold': 50,
+                'high_confidence_threshold': 85
+            }
+
     async def save_guild_thresholds(self, violation_threshold, high_confidence_threshold):
         """Save AI thresholds"""
         try:
@@ -271,9 +416,9 @@ class DatabaseManager:
                 'updated_at': datetime.now()
             }
             self.db.collection('system_config').document('ai_thresholds').set(threshold_data)
-            print(f"Updated thresholds: violation={violation_threshold}, confidence={high_confidence_threshold}")
+            log.info("thresholds updated", violation=violation_threshold, high_confidence=high_confidence_threshold)
         except Exception as e:
-            print(f"Error saving thresholds: {e}")
+            log.error("error saving thresholds", error=str(e))
 
 # Create sample data for testing
 async def create_sample_data():
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class DecisionStore:
+    """Moderator decision state, keyed by mod-channel message ID.
+
+    Entries are written through to a local sqlite file so reactions still
+    work after a restart. Only the most recently used entries are kept in
+    memory (LRU, max_entries) and every entry expires after ttl_hours.
+    Cache misses are loaded lazily from disk.
+
+    Values are returned as copies, so use update() to change a stored entry
+    instead of mutating what get() returned.
+
+    With shared=True several processes (one per shard group) use the same
+    file. Reads then always go to disk, so an entry written by another
+    process is never served stale from this process's cache.
+    """
+
+    PURGE_EVERY = 500  # writes between sweeps of expired rows on disk
+
+    def __init__(self, path: str = '../data/decisions.sqlite',
+                 max_entries: int = 1000, ttl_hours: float = 72, shared: bool = False):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.ttl_seconds = ttl_hours * 3600
+        self._cache = OrderedDict()  # key -> (expires_at, data)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10)
+        # WAL keeps writes cheap and lets other processes read while we write
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS decisions (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def get(self, key: str, default=None) -> Optional[Dict]:
+        key = str(key)
+        now = time.time()
+
+        entry = None if self.shared else self._cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            del self._cache[key]
+
+        self.misses += 1
+        row = self._db.execute(
+            "SELECT data, expires_at FROM decisions WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            return default
+
+        data = json.loads(row[0])
+        self._remember(key, row[1], data)
+        return dict(data)
+
+    def __getitem__(self, key: str) -> Dict:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __setitem__(self, key: str, data: Dict):
+        key = str(key)
+        expires_at = time.time() + self.ttl_seconds
+        self._db.execute(
+            "INSERT OR REPLACE INTO decisions (key, data, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(data), expires_at)
+        )
+        self._db.commit()
+        self._remember(key, expires_at, dict(data))
+
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def update(self, key: str, **fields) -> bool:
+        """Merge fields into an existing entry. Returns False if there is none."""
+        data = self.get(key)
+        if data is None:
+            return False
+        data.update(fields)
+        self[key] = data
+        return True
+
+    def pop(self, key: str, default=None) -> Optional[Dict]:
+        value = self.get(key, default)
+        key = str(key)
+        self._cache.pop(key, None)
+        self._db.execute("DELETE FROM decisions WHERE key = ?", (key,))
+        self._db.commit()
+        return value
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """All live entries, read from disk"""
+        rows = self._db.execute(
+            "SELECT key, data FROM decisions WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+        for key, data in rows:
+            yield key, json.loads(data)
+
+    def __len__(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM decisions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def cached_count(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'cached': len(self._cache),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        for key in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[key]
+        deleted = self._db.execute("DELETE FROM decisions WHERE expires_at <= ?", (now,)).rowcount
+        self._db.commit()
+        return deleted
+
+    def _remember(self, key: str, expires_at: float, data: Dict):
+        self._cache[key] = (expires_at, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
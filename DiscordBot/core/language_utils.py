@@ -1,20 +1,27 @@
-from googletrans import Translator, LANGUAGES
 from typing import Dict
+from metrics import metrics
+from provider_cassette import ProviderCassette, cassette as default_cassette
 
 class LanguageHandler:
-    def __init__(self):
-        self.translator = Translator()
+    def __init__(self, cassette: ProviderCassette = None):
+        self.cassette = cassette or default_cassette
+        if self.cassette.offline:
+            self.translator = None
+        else:
+            # googletrans pulls in its HTTP stack, so load it only when a handler is needed
+            from googletrans import Translator
+            self.translator = Translator()
     
     def detect_language(self, text: str) -> Dict:
         try:
-            detection = self.translator.detect(text)
-            language_name = LANGUAGES.get(detection.lang, 'Unknown')
+            with metrics.timer('translate_detect'):
+                detection = self.cassette.call('translate_detect', (text,), lambda: self._fetch_detection(text))
             
             return {
-                'language_code': detection.lang,
-                'language_name': language_name,
-                'confidence': detection.confidence,
-                'is_english': detection.lang == 'en'
+                'language_code': detection['lang'],
+                'language_name': detection['language_name'],
+                'confidence': detection['confidence'],
+                'is_english': detection['lang'] == 'en'
             }
         except Exception as e:
             return {
@@ -26,15 +33,14 @@ class LanguageHandler:
     
     def translate_to_english(self, text: str, source_lang: str = None) -> Dict:
         try:
-            if source_lang:
-                translation = self.translator.translate(text, src=source_lang, dest='en')
-            else:
-                translation = self.translator.translate(text, dest='en')
+            with metrics.timer('translate'):
+                translation = self.cassette.call('translate', (text, source_lang),
+                                                 lambda: self._fetch_translation(text, source_lang))
             
             return {
                 'original_text': text,
-                'translated_text': translation.text,
-                'source_language': translation.src,
+                'translated_text': translation['text'],
+                'source_language': translation['src'],
                 'success': True
             }
         except Exception as e:
@@ -45,6 +51,19 @@ class LanguageHandler:
                 'success': False
             }
     
+    def _fetch_detection(self, text: str) -> Dict:
+        from googletrans import LANGUAGES
+        detection = self.translator.detect(text)
+        return {'lang': detection.lang, 'confidence': detection.confidence,
+                'language_name': LANGUAGES.get(detection.lang, 'Unknown')}
+    
+    def _fetch_translation(self, text: str, source_lang: str = None) -> Dict:
+        if source_lang:
+            translation = self.translator.translate(text, src=source_lang, dest='en')
+        else:
+            translation = self.translator.translate(text, dest='en')
+        return {'text': translation.text, 'src': translation.src}
+    
     def process_message(self, message: str) -> Dict:
         language_info = self.detect_language(message)
         
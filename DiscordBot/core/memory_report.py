@@ -0,0 +1,217 @@
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import types
+from collections import deque
+from typing import Callable, Dict, List
+
+from structured_logging import get_logger
+
+log = get_logger('memory')
+
+# Debug surface for memory growth: counts and approximate sizes of the bot's
+# long-lived structures, live instance counts for selected classes, and
+# tracemalloc snapshot diffs. Sizes are estimates (sys.getsizeof over a
+# sample of each container's contents), meant for spotting growth, not for
+# exact accounting.
+#
+#   BOT_MEMORY_LIMITS="reports=200,conversations=2000"   override entry limits
+#   BOT_TRACEMALLOC=1    trace allocations from startup (slows every allocation)
+
+# Entry counts above which a structure is reported as over its limit
+DEFAULT_LIMITS = {
+    'reports': 1000,
+    'pending_decisions': 1000,
+    'written_report_requests': 1000,
+    'regex_rules': 1000,
+    'conversations': 5000,
+    'open_bursts': 2000,
+    'classification_results': 5000,
+}
+
+SIZE_SAMPLE = 100  # items measured per container; the rest are extrapolated
+
+# Shared infrastructure reachable from almost anything; counted as a pointer, not followed
+_OPAQUE = (str, bytes, int, float, bool, type(None), type, types.ModuleType,
+           types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def approximate_size(obj, depth: int = 4, _seen=None) -> int:
+    """Rough deep size in bytes of obj and what it references, to a fixed depth"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if depth <= 0 or isinstance(obj, _OPAQUE):
+        return size
+
+    if isinstance(obj, dict):
+        items = list(obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(obj)
+    elif hasattr(obj, '__dict__'):
+        items = list(vars(obj).values())
+    elif hasattr(type(obj), '__slots__'):
+        items = [getattr(obj, slot, None) for slot in type(obj).__slots__]
+    else:
+        return size
+
+    sample = items[:SIZE_SAMPLE]
+    sampled = sum(approximate_size(item, depth - 1, seen) for item in sample)
+    if len(items) > len(sample):
+        sampled = sampled * len(items) // len(sample)
+    return size + sampled
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, limit = item.partition('=')
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+def resident_bytes() -> int:
+    """Current resident set size, where /proc is available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryMonitor:
+    def __init__(self, limits: Dict[str, int] = None, check_interval: float = 300, exclude=(),
+                 max_snapshots: int = 5):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.check_interval = check_interval
+        # Each snapshot holds every traced allocation, so only the newest few are kept
+        self.max_snapshots = max_snapshots
+        # Objects whose size isn't charged to a structure that references them (e.g. the bot)
+        self._exclude = list(exclude)
+        self._structures = {}  # name -> (get object, count function, limit)
+        self._classes = {}  # name -> (class, limit)
+        self._snapshots = {}  # label -> tracemalloc.Snapshot
+        self._task = None
+        self.last_report = {}
+        self.warnings = 0
+
+    def track(self, name: str, get: Callable, limit: int = None, count: Callable = len):
+        """Report a structure's size; get() returns it, count(obj) its number of entries"""
+        self._structures[name] = (get, count, self.limits.get(name) if limit is None else limit)
+
+    def track_instances(self, name: str, cls: type, limit: int = None):
+        """Report how many instances of cls are alive"""
+        self._classes[name] = (cls, self.limits.get(name) if limit is None else limit)
+
+    def report(self) -> Dict[str, Dict]:
+        report = {}
+        for name, (get, count, limit) in self._structures.items():
+            try:
+                obj = get()
+                entries = count(obj) if obj is not None else 0
+                seen = {id(excluded) for excluded in self._exclude}
+                size = approximate_size(obj, _seen=seen) if obj is not None else 0
+            except Exception as e:
+                log.error("memory accounting failed", structure=name, error=str(e))
+                continue
+            report[name] = {'count': entries, 'approx_bytes': size, 'limit': limit}
+
+        if self._classes:
+            # One pass over the GC-tracked objects for all watched classes
+            wanted = {cls: name for name, (cls, _) in self._classes.items()}
+            counts = dict.fromkeys(wanted.values(), 0)
+            for obj in gc.get_objects():
+                name = wanted.get(type(obj))
+                if name is not None:
+                    counts[name] += 1
+            for name, (_, limit) in self._classes.items():
+                report[name] = {'count': counts[name], 'approx_bytes': None, 'limit': limit}
+
+        report['process'] = {'count': None, 'approx_bytes': resident_bytes(), 'limit': None}
+        self.last_report = report
+        return report
+
+    def check(self) -> List[str]:
+        """Build a report and warn about every structure over its limit"""
+        over = []
+        for name, entry in self.report().items():
+            if entry['limit'] is not None and entry['count'] is not None and entry['count'] > entry['limit']:
+                over.append(name)
+                self.warnings += 1
+                log.warning("structure over memory limit", structure=name, count=entry['count'],
+                            limit=entry['limit'], approx_bytes=entry['approx_bytes'])
+        return over
+
+    def stats(self) -> Dict:
+        """Last report flattened to numbers, for the metrics endpoint (no measuring at scrape time)"""
+        stats = {'limit_warnings': self.warnings}
+        for name, entry in self.last_report.items():
+            if entry['count'] is not None:
+                stats[f"{name}_count"] = entry['count']
+            if entry['approx_bytes'] is not None:
+                stats[f"{name}_bytes"] = entry['approx_bytes']
+        return stats
+
+    def format_report(self) -> str:
+        lines = []
+        for name, entry in self.report().items():
+            count = '' if entry['count'] is None else f"{entry['count']:>7}"
+            size = '' if entry['approx_bytes'] is None else f"~{entry['approx_bytes'] / 1024:,.0f} KiB"
+            limit = f"/ {entry['limit']}" if entry['limit'] is not None else ''
+            flag = ' OVER LIMIT' if entry['limit'] is not None and (entry['count'] or 0) > entry['limit'] else ''
+            lines.append(f"{name:<24}{count} {limit:<8} {size}{flag}")
+        return '\n'.join(lines)
+
+    # tracemalloc: off unless started, since it slows every allocation
+
+    def start_tracemalloc(self, frames: int = 10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            log.info("tracemalloc started", frames=frames)
+
+    def snapshot(self, label: str = None) -> str:
+        self.start_tracemalloc()
+        label = label or time.strftime('%H:%M:%S')
+        self._snapshots.pop(label, None)  # a reused label counts as the newest snapshot
+        self._snapshots[label] = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        while len(self._snapshots) > self.max_snapshots:
+            del self._snapshots[next(iter(self._snapshots))]
+        return label
+
+    def diff(self, older: str = None, newer: str = None, top: int = 15) -> List[str]:
+        """Largest allocation changes between two snapshots (default: the last two taken)"""
+        labels = list(self._snapshots)
+        if (older is None) != (newer is None):
+            raise ValueError("give two snapshot labels, or none to compare the last two")
+        if older is None:
+            if len(labels) < 2:
+                return ["Need two snapshots to compare."]
+            older, newer = labels[-2], labels[-1]
+        stats = self._snapshots[newer].compare_to(self._snapshots[older], 'lineno')
+        return [f"{older} -> {newer}"] + [str(stat) for stat in stats[:top]]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+        return self._task
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                self.check()
+            except Exception:
+                log.exception("memory check failed")
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import functools
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from structured_logging import get_logger
+from tracing import tracer
+
+log = get_logger('metrics')
+
+# Per-stage latency histograms and counters for the moderation pipeline,
+# served in Prometheus text format by MetricsServer.
+#
+# Stage timings are labelled with the pipeline path that triggered them
+# ('eval_text' for channel messages, 'report' for user reports), taken from a
+# context variable so shared code (classifier, database) needn't pass it around.
+
+# Latency buckets in seconds, from a regex pass to a slow Gemini call
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_path = contextvars.ContextVar('pipeline_path', default='other')
+
+
+class Histogram:
+    """Cumulative bucket counts for Prometheus plus a window of recent samples for quantiles"""
+
+    __slots__ = ('counts', 'total', 'count', 'recent')
+
+    def __init__(self, window: int = 1024):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}  # (stage, path) -> Histogram
+        self._errors = {}  # (stage, path) -> count
+        self._counters = {}  # (name, sorted label items) -> value
+        self._collectors = {}  # component name -> callable returning a stats dict
+
+    @contextmanager
+    def path(self, name: str):
+        """Label stages timed inside this block (including awaited calls) with a pipeline path"""
+        token = _current_path.set(name)
+        try:
+            yield
+        finally:
+            _current_path.reset(token)
+
+    @staticmethod
+    def current_path() -> str:
+        return _current_path.get()
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time a stage (and trace it as a span); an exception counts as an error and is re-raised"""
+        start = time.perf_counter()
+        try:
+            with tracer.span(stage):
+                yield
+        except Exception:
+            self.error(stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage: str):
+        """Decorator form of timer() for async functions"""
+        def decorate(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, stage: str, seconds: float):
+        key = (stage, _current_path.get())
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, stage: str):
+        """Count a failed stage; for calls that catch their own errors and return a fallback"""
+        key = (stage, _current_path.get())
+        self._errors[key] = self._errors.get(key, 0) + 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def cache(self, name: str, hit: bool):
+        self.inc('cache_requests_total', cache=name, result='hit' if hit else 'miss')
+
+    def register_collector(self, component: str, stats: Callable[[], Dict]):
+        """Expose a component's stats() as gauges, read at scrape time"""
+        self._collectors[component] = stats
+
+    def snapshot(self) -> Dict:
+        """Quantiles and counts per stage, for logs and the load harness"""
+        return {
+            f"{path}/{stage}": {
+                'count': histogram.count,
+                'errors': self._errors.get((stage, path), 0),
+                **{f"p{int(q * 100)}": round(histogram.quantile(q), 4) for q in QUANTILES}
+            }
+            for (stage, path), histogram in sorted(self._histograms.items())
+        }
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            '# HELP modbot_stage_duration_seconds Time spent in each pipeline stage',
+            '# TYPE modbot_stage_duration_seconds histogram',
+        ]
+        for (stage, path), histogram in sorted(self._histograms.items()):
+            labels = f'stage="{stage}",path="{path}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'modbot_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'modbot_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'modbot_stage_duration_seconds_sum{{{labels}}} {histogram.total:.6f}')
+            lines.append(f'modbot_stage_duration_seconds_count{{{labels}}} {histogram.count}')
+
+        lines += [
+            '# HELP modbot_stage_latency_seconds Latency quantiles over recent samples',
+            '# TYPE modbot_stage_latency_seconds gauge',
+        ]
+        for (stage, path), histogram in sorted(self._histograms.items()):
+            for q in QUANTILES:
+                lines.append(f'modbot_stage_latency_seconds{{stage="{stage}",path="{path}",quantile="{q}"}} '
+                             f'{histogram.quantile(q):.6f}')
+
+        lines += [
+            '# HELP modbot_stage_errors_total Failed calls per pipeline stage',
+            '# TYPE modbot_stage_errors_total counter',
+        ]
+        for (stage, path), count in sorted(self._errors.items()):
+            lines.append(f'modbot_stage_errors_total{{stage="{stage}",path="{path}"}} {count}')
+
+        for name in sorted({name for name, _ in self._counters}):
+            lines.append(f'# TYPE modbot_{name} counter')
+            for (counter, labels), value in sorted(self._counters.items()):
+                if counter == name:
+                    label_text = ','.join(f'{label}="{label_value}"' for label, label_value in labels)
+                    lines.append(f'modbot_{name}{{{label_text}}} {value}')
+
+        for component, stats in sorted(self._collectors.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                log.error("metrics collector failed", component=component, error=str(e))
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f'# TYPE modbot_{component}_{key} gauge')
+                lines.append(f'modbot_{component}_{key} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every module in the process, like the logging registry
+metrics = MetricsRegistry()
+
+
+class MetricsServer:
+    """Minimal HTTP endpoint serving GET /metrics on localhost"""
+
+    def __init__(self, registry: MetricsRegistry = metrics, host: str = '127.0.0.1', port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            log.info("metrics endpoint listening", url=f"http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers; the request body is never needed
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/', '/metrics'):
+                status, body = '200 OK', self.registry.render().encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(f"HTTP/1.1 {status}\r\n"
+                         f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
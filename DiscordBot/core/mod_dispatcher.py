@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+from metrics import metrics
+from tracing import tracer
+from structured_logging import get_logger
+
+log = get_logger('mod_dispatcher')
+
+# Priorities, lower is sent first
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+
+class ModChannelDispatcher:
+    """Single outbound path for everything the bot posts in mod channels.
+
+    Each channel has its own priority queue drained by one sender task, so
+    sends to a channel never race each other for Discord's per-channel rate
+    limit bucket, and high-confidence flags jump ahead of routine chatter.
+    Reactions on a sent message are added concurrently, a few at a time per
+    channel; discord.py's HTTP client handles the bucket waits and 429 retries.
+
+    Every API call is counted, optionally per tag (a flag ID), so we can see
+    what each flag costs.
+    """
+
+    TRACKED_TAGS = 1000  # per-tag call counts kept for the most recent flags
+
+    def __init__(self, reaction_concurrency: int = 3):
+        self.reaction_concurrency = reaction_concurrency
+        self._queues = {}  # channel_id -> heap of pending sends
+        self._senders = {}  # channel_id -> sender task
+        self._reaction_limits = {}  # channel_id -> Semaphore
+        self._background = set()
+        self._order = itertools.count()
+
+        self.messages_sent = 0
+        self.reactions_added = 0
+        self.errors = 0
+        self._calls_by_tag = OrderedDict()
+
+    async def send(self, channel, content: str = None, *, embeds: List = None,
+                   reactions: Iterable[str] = (), priority: int = NORMAL, tag: str = None):
+        """Queue a message for a channel and return the sent discord.Message.
+
+        Reactions are added in the background after the message is sent.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(channel.id, [])
+        # Where the send came from, so the sender task can time and trace it under that pipeline
+        origin = (metrics.current_path(), tracer.capture(), time.perf_counter())
+        heapq.heappush(queue, (priority, next(self._order), channel, content, embeds, tuple(reactions), tag,
+                               origin, future))
+
+        if channel.id not in self._senders:
+            self._senders[channel.id] = asyncio.create_task(self._drain(channel.id))
+        return await future
+
+    async def _drain(self, channel_id):
+        queue = self._queues[channel_id]
+        while queue:
+            _, _, channel, content, embeds, reactions, tag, origin, future = heapq.heappop(queue)
+            path, (trace, parent_span), queued_at = origin
+            try:
+                # Timed under the pipeline that queued the send, not the one that started this task
+                with metrics.path(path), tracer.activate(trace, parent_span):
+                    if trace:
+                        trace.add_span('mod_queue_wait', queued_at, time.perf_counter())
+                    with metrics.timer('mod_send'):
+                        message = await channel.send(content=content, embeds=embeds or None)
+                self._count(tag)
+                self.messages_sent += 1
+            except Exception as e:
+                self.errors += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            if not future.done():
+                future.set_result(message)
+            if reactions:
+                with metrics.path(path), tracer.activate(trace, parent_span):
+                    task = asyncio.create_task(self._react(message, reactions, tag))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+        del self._senders[channel_id]
+        del self._queues[channel_id]
+
+    async def _react(self, message, reactions, tag):
+        limit = self._reaction_limits.get(message.channel.id)
+        if limit is None:
+            limit = self._reaction_limits[message.channel.id] = asyncio.Semaphore(self.reaction_concurrency)
+
+        async def add(emoji):
+            async with limit:
+                try:
+                    with metrics.timer('mod_reaction'):
+                        await message.add_reaction(emoji)
+                    self._count(tag)
+                    self.reactions_added += 1
+                except Exception as e:
+                    self.errors += 1
+                    log.error("error adding reaction", emoji=emoji, error=str(e))
+
+        await asyncio.gather(*(add(emoji) for emoji in reactions))
+
+    def _count(self, tag):
+        if tag is None:
+            return
+        self._calls_by_tag[tag] = self._calls_by_tag.get(tag, 0) + 1
+        self._calls_by_tag.move_to_end(tag)
+        while len(self._calls_by_tag) > self.TRACKED_TAGS:
+            self._calls_by_tag.popitem(last=False)
+
+    def calls_for(self, tag) -> int:
+        return self._calls_by_tag.get(tag, 0)
+
+    async def flush(self):
+        """Wait for queued sends and background reactions to finish"""
+        while self._senders or self._background:
+            await asyncio.gather(*self._senders.values(), *self._background, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        tagged = list(self._calls_by_tag.values())
+        return {
+            'api_calls': self.messages_sent + self.reactions_added,
+            'messages_sent': self.messages_sent,
+            'reactions_added': self.reactions_added,
+            'errors': self.errors,
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'flags_tracked': len(tagged),
+            'api_calls_per_flag': round(sum(tagged) / len(tagged), 2) if tagged else 0.0
+        }
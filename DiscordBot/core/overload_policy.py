@@ -0,0 +1,109 @@
+import random
+import time
+from typing import Dict
+
+# Processing modes returned by OverloadPolicy.admit
+FULL = 'full'      # translation + Gemini + Natural Language + regex
+LOCAL = 'local'    # local threat patterns + regex only, no provider calls
+
+
+class OverloadPolicy:
+    """Decides how much work a queued message gets when the bot is behind.
+
+    The load level comes from how long the oldest queued message has waited
+    against wait_budget, from the classification queue depth, and from recent
+    provider errors (quota / rate-limit responses). Wait time is the signal
+    that matters: with slow providers a few hundred queued messages are
+    minutes of backlog long before the queue is half full. High-risk users are
+    always fully classified. Low-risk users drop to the local-only path when
+    overloaded or critical; it makes no provider calls, so every admitted
+    message is still classified. Messages are only dropped when the queue
+    itself is full (FairWorkQueue rejects them, counted as shed_queue_full).
+
+    Provider errors stop counting after provider_error_window seconds without
+    a new one. While they do count, a probe_rate share of low-risk messages
+    still goes to the providers, so a recovery is noticed without waiting for
+    the window. That sample is the only low-risk traffic on the full path.
+
+    User reports from Report never go through the queue or this policy, so
+    they are always fully classified.
+    """
+
+    def __init__(self, queue, wait_budget: float = 10.0, critical_wait_factor: float = 3.0,
+                 high_watermark: float = 0.5, critical_watermark: float = 0.9,
+                 high_risk_threshold: float = 0.6, provider_error_limit: int = 5,
+                 provider_error_window: float = 60.0, probe_rate: float = 0.1):
+        self.queue = queue
+        # Seconds a message may wait in the queue before low-risk work is degraded;
+        # past critical_wait_factor times that, the load level is critical and no probes are sent
+        self.wait_budget = wait_budget
+        self.critical_wait_factor = critical_wait_factor
+        self.high_watermark = high_watermark
+        self.critical_watermark = critical_watermark
+        self.high_risk_threshold = high_risk_threshold
+        self.provider_error_limit = provider_error_limit
+        self.provider_error_window = provider_error_window
+        self.probe_rate = probe_rate
+        self.recent_provider_errors = 0
+        self._last_provider_error = 0.0
+
+        self.counts = {FULL: 0, LOCAL: 0, 'high_risk_protected': 0, 'provider_probes': 0}
+
+    def providers_failing(self) -> bool:
+        if self.recent_provider_errors < self.provider_error_limit:
+            return False
+        if time.monotonic() - self._last_provider_error > self.provider_error_window:
+            # No errors for a whole window; assume the quota or outage has passed
+            self.recent_provider_errors = 0
+            return False
+        return True
+
+    def load_level(self) -> str:
+        fill = len(self.queue) / max(self.queue.max_size, 1)
+        wait = self.queue.oldest_wait()
+        if fill >= self.critical_watermark or wait >= self.wait_budget * self.critical_wait_factor:
+            return 'critical'
+        if fill >= self.high_watermark or wait >= self.wait_budget or self.providers_failing():
+            return 'overloaded'
+        return 'normal'
+
+    def admit(self, user_risk_score: float) -> str:
+        """Return FULL or LOCAL for a message from a user with this risk score"""
+        level = self.load_level()
+
+        if level == 'normal':
+            mode = FULL
+        elif user_risk_score >= self.high_risk_threshold:
+            mode = FULL
+            self.counts['high_risk_protected'] += 1
+        else:
+            mode = LOCAL
+            # Half-open: with an otherwise healthy queue, let a few through to see if providers recovered
+            if level == 'overloaded' and self.providers_failing() \
+                    and len(self.queue) < self.queue.max_size * self.high_watermark \
+                    and self.queue.oldest_wait() < self.wait_budget and random.random() < self.probe_rate:
+                mode = FULL
+                self.counts['provider_probes'] += 1
+
+        self.counts[mode] += 1
+        return mode
+
+    def record_provider_result(self, ok: bool):
+        """Track consecutive provider failures (e.g. 429 quota errors) as a load signal"""
+        if ok:
+            self.recent_provider_errors = 0
+        else:
+            self.recent_provider_errors += 1
+            self._last_provider_error = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            'load_level': self.load_level(),
+            'wait_budget_seconds': self.wait_budget,
+            'processed_full': self.counts[FULL],
+            'processed_local_only': self.counts[LOCAL],
+            'shed_queue_full': self.queue.rejected,
+            'high_risk_protected': self.counts['high_risk_protected'],
+            'provider_probes': self.counts['provider_probes'],
+            'recent_provider_errors': self.recent_provider_errors
+        }
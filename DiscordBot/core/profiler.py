@@ -0,0 +1,152 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from structured_logging import get_logger
+
+log = get_logger('profiler')
+
+# Opt-in profiling for a live bot process. Both modes are off by default and
+# cost one attribute check per message when off.
+#
+# SamplingProfiler snapshots every thread's stack from a background thread for
+# a fixed number of seconds and writes collapsed stacks ("a;b;c 42" per line),
+# which flamegraph.pl, speedscope and inferno render as flame graphs.
+#
+# MessageProfiler runs cProfile around a random fraction of queued messages
+# and accumulates the results into one pstats file. cProfile sees the whole
+# event-loop thread, so other tasks interleaved at the message's awaits are
+# included in its sample.
+#
+#   BOT_PROFILE_SECONDS=30          sample the first 30 seconds after startup
+#   BOT_PROFILE_MESSAGE_RATE=0.01   cProfile 1% of messages
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir: str = '../data/profiles', interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, on_done=None) -> Optional[str]:
+        """Sample for the given number of seconds in a background thread.
+
+        Returns the output path, or None if a run is already in progress.
+        on_done(path) is called from the sampling thread once the file is written.
+        """
+        if self.running:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.collapsed")
+        self._thread = threading.Thread(target=self._run, args=(seconds, path, on_done),
+                                        name='sampling-profiler', daemon=True)
+        self._thread.start()
+        log.info("sampling profiler started", seconds=seconds, path=path)
+        return path
+
+    def _run(self, seconds, path, on_done):
+        stacks = Counter()
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        samples = 0
+
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            samples += 1
+            time.sleep(self.interval)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info("sampling profiler finished", samples=samples, stacks=len(stacks), path=path)
+        if on_done:
+            on_done(path)
+
+    @staticmethod
+    def _collapse(thread_name, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ';'.join(reversed(frames))
+
+
+class MessageProfiler:
+    def __init__(self, rate: float = 0.0, output_path: str = '../data/profiles/messages.pstats',
+                 dump_every: int = 20):
+        self.rate = rate
+        self.output_path = output_path
+        self.dump_every = dump_every
+        self.profiled = 0
+        self._stats = None
+        self._active = False
+
+    @contextmanager
+    def profile_message(self):
+        # Off (the default) or another message already being profiled: no overhead beyond this check
+        if not self.rate or self._active or random.random() >= self.rate:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        self._active = True
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) owns the hook
+            self._active = False
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._active = False
+            self._add(profile)
+
+    def _add(self, profile):
+        if self._stats is None:
+            self._stats = pstats.Stats(profile, stream=io.StringIO())
+        else:
+            self._stats.add(profile)
+        self.profiled += 1
+        if self.profiled % self.dump_every == 0:
+            self.dump()
+
+    def dump(self) -> Optional[str]:
+        """Write the accumulated profile; view with `python -m pstats` or snakeviz"""
+        if self._stats is None:
+            return None
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self._stats.dump_stats(self.output_path)
+        log.info("message profile written", messages=self.profiled, path=self.output_path)
+        return self.output_path
+
+    def top(self, limit: int = 15) -> str:
+        """The most expensive functions by cumulative time, as text"""
+        if self._stats is None:
+            return "No messages profiled yet."
+        stream = io.StringIO()
+        self._stats.stream = stream
+        self._stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,209 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger('cassette')
+
+# Record/replay layer for external provider calls (Gemini, Natural Language,
+# googletrans, and the Firestore reads evaluation depends on). Each call site
+# passes a provider name, the inputs that determine the response, and a fetch
+# function that makes the live call and returns plain JSON data.
+#
+#   off      live calls, nothing stored (the default)
+#   record   serve responses already on disk, fetch and append anything missing
+#   replay   serve responses from disk only; a missing one raises CassetteMiss,
+#            and no SDK clients or credentials are needed
+#
+# Independently of the mode, synthetic latency and errors can be injected per
+# provider for load tests. Latency is slept on the calling thread, like the
+# blocking SDK calls it stands in for. Live calls can also be rate limited per
+# provider; callers run them in worker threads, so a limit only delays the
+# thread that hit it.
+#
+#   BOT_CASSETTE=replay
+#   BOT_CASSETTE_PATH=../data/cassettes/providers.jsonl
+#   BOT_CASSETTE_LATENCY="gemini=0.8,nl=0.15"   median seconds per provider
+#   BOT_CASSETTE_ERRORS="gemini=0.05"           failure probability per provider
+#   BOT_CASSETTE_RATE="gemini=5,nl=20"          live calls per second per provider
+#   BOT_CASSETTE_SEED=1
+
+
+class CassetteMiss(LookupError):
+    """A replayed call has no recorded response"""
+
+
+class InjectedProviderError(RuntimeError):
+    """Synthetic provider failure"""
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, across threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ProviderCassette:
+    MODES = ('off', 'record', 'replay')
+
+    def __init__(self, mode: str = 'off', path: str = '../data/cassettes/providers.jsonl',
+                 latency: Dict[str, object] = None, latency_sigma: float = 0.5,
+                 error_rates: Dict[str, float] = None, rate_limits: Dict[str, float] = None,
+                 seed: int = None):
+        if mode not in self.MODES:
+            raise ValueError(f"cassette mode must be one of {', '.join(self.MODES)}, not {mode!r}")
+        self.mode = mode
+        self.path = path
+        # Provider -> median seconds (log-normally distributed) or a callable returning seconds
+        self.latency = latency or {}
+        self.latency_sigma = latency_sigma
+        self.error_rates = error_rates or {}
+        # One limiter per configured name, so 'nl' is shared by all three Natural Language calls
+        self._limiters = {name: RateLimiter(rate) for name, rate in (rate_limits or {}).items() if rate > 0}
+        self._random = random.Random(seed)
+        self._entries = {}  # key -> response
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self.injected_errors = 0
+        if mode != 'off':
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> 'ProviderCassette':
+        seed = os.environ.get('BOT_CASSETTE_SEED')
+        return cls(
+            mode=os.environ.get('BOT_CASSETTE', 'off'),
+            path=os.environ.get('BOT_CASSETTE_PATH', '../data/cassettes/providers.jsonl'),
+            latency={name: float(value) for name, value in _parse(os.environ.get('BOT_CASSETTE_LATENCY', '')).items()},
+            error_rates={name: float(value) for name, value in _parse(os.environ.get('BOT_CASSETTE_ERRORS', '')).items()},
+            rate_limits={name: float(value) for name, value in _parse(os.environ.get('BOT_CASSETTE_RATE', '')).items()},
+            seed=int(seed) if seed else None
+        )
+
+    @property
+    def offline(self) -> bool:
+        """Whether live clients are unnecessary because every response comes from disk"""
+        return self.mode == 'replay'
+
+    def call(self, provider: str, inputs: Tuple, fetch: Callable[[], Dict], refresh: bool = False) -> Dict:
+        """The response for these inputs: live, recorded, or replayed depending on the mode.
+
+        refresh is for reads of state that changes (rules, thresholds) rather than a
+        pure function of the inputs: in record mode they are always fetched live and
+        the recording overwritten, so a re-recorded run never sees an old copy.
+        """
+        self._inject(provider)
+        if self.mode == 'off':
+            return self._fetch(provider, fetch)
+        if self.mode == 'record' and refresh:
+            response = self._fetch(provider, fetch)
+            self._save(self.key(provider, inputs), provider, inputs, response)
+            return response
+
+        key = self.key(provider, inputs)
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self.hits += 1
+                return copy.deepcopy(response)
+            if self.mode == 'replay':
+                self.misses += 1
+        if self.mode == 'replay':
+            log.warning("no recorded response", provider=provider, key=key)
+            raise CassetteMiss(f"no recorded {provider} response for {key}")
+
+        response = self._fetch(provider, fetch)
+        self._save(key, provider, inputs, response)
+        return response
+
+    def _fetch(self, provider: str, fetch: Callable[[], Dict]) -> Dict:
+        limiter = self._lookup(self._limiters, provider)
+        if limiter:
+            limiter.wait()
+        return fetch()
+
+    @staticmethod
+    def key(provider: str, inputs: Tuple) -> str:
+        return hashlib.sha256(json.dumps([provider, *inputs], default=str).encode()).hexdigest()[:32]
+
+    def _inject(self, provider: str):
+        latency = self._lookup(self.latency, provider)
+        if latency:
+            delay = latency() if callable(latency) else self._random.lognormvariate(0, self.latency_sigma) * latency
+            time.sleep(delay)
+        error_rate = self._lookup(self.error_rates, provider)
+        if error_rate and self._random.random() < error_rate:
+            self.injected_errors += 1
+            raise InjectedProviderError(f"injected {provider} failure")
+
+    @staticmethod
+    def _lookup(settings: Dict, provider: str):
+        # Exact name, then its family ('nl' covers nl_sentiment), then '*'
+        for name in (provider, provider.split('_')[0], '*'):
+            if name in settings:
+                return settings[name]
+        return None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if self.offline:
+                log.warning("cassette file not found, every call will miss", path=self.path)
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['key']] = entry['response']
+        log.info("cassette loaded", mode=self.mode, responses=len(self._entries), path=self.path)
+
+    def _save(self, key: str, provider: str, inputs: Tuple, response: Dict):
+        # Stored through JSON so a replay returns exactly what later runs will see
+        line = json.dumps({'key': key, 'provider': provider, 'inputs': list(inputs), 'response': response},
+                          default=str)
+        with self._lock:
+            self._entries[key] = json.loads(line)['response']
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.recorded += 1
+
+    def stats(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'responses': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'recorded': self.recorded,
+            'injected_errors': self.injected_errors
+        }
+
+
+def _parse(spec: str) -> Dict[str, str]:
+    settings = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        settings[name.strip()] = value.strip()
+    return settings
+
+
+# Shared by every provider client in the process, configured from the environment
+cassette = ProviderCassette.from_env()
@@ -2,13 +2,34 @@ import re
 import asyncio
 from typing import Dict, List
 from database import DatabaseManager
+from metrics import metrics
+from structured_logging import get_logger
+
+log = get_logger('regex_check')
 
 class RegexCheck:
-    def __init__(self):
-        self.database = DatabaseManager()
+    def __init__(self, database: DatabaseManager = None):
+        # Share the bot's DatabaseManager when given one; otherwise connect on first use
+        self._database = database
         self._cached_rules = None
         self._cache_timestamp = None
     
+    @property
+    def database(self) -> DatabaseManager:
+        if self._database is None:
+            self._database = DatabaseManager()
+        return self._database
+    
+    @database.setter
+    def database(self, database: DatabaseManager):
+        self._database = database
+    
+    @property
+    def cached_rules(self) -> List[Dict]:
+        """Rules currently held in memory, if any"""
+        return self._cached_rules or []
+    
+    @metrics.timed('regex')
     async def apply_regex_rules(self, message: str) -> Dict:
         try:
             rules = await self._get_rules()
@@ -31,9 +52,9 @@ class RegexCheck:
                             'description': description,
                             'weight': weight
                         })
-                        print(f"  Regex match: {description or pattern} (+{weight*100:.1f}%)")
+                        log.debug("regex match", rule=description or pattern, weight=weight)
                 except re.error:
-                    print(f"Invalid regex pattern: {pattern}")
+                    log.warning("invalid regex pattern", pattern=pattern)
                     continue
             
             return {
@@ -43,7 +64,8 @@ class RegexCheck:
             }
             
         except Exception as e:
-            print(f"Error applying regex rules: {e}")
+            log.error("error applying regex rules", error=str(e))
+            metrics.error('regex')
             return {
                 'total_regex_score': 0.0, 
                 'patterns_matched': [],
@@ -55,18 +77,19 @@ class RegexCheck:
             import time
             current_time = time.time()
             
-            if (self._cached_rules is None or 
-                self._cache_timestamp is None or 
-                current_time - self._cache_timestamp > 60):
-                
+            stale = (self._cached_rules is None or 
+                     self._cache_timestamp is None or 
+                     current_time - self._cache_timestamp > 60)
+            metrics.cache('regex_rules', hit=not stale)
+            if stale:
                 self._cached_rules = await self.database.get_custom_rules()
                 self._cache_timestamp = current_time
-                print(f"Loaded {len(self._cached_rules)} regex rules from database")
+                log.debug("regex rules loaded", rules=len(self._cached_rules))
             
             return self._cached_rules
             
         except Exception as e:
-            print(f"Error loading regex rules: {e}")
+            log.error("error loading regex rules", error=str(e))
             return []
     
     def clear_cache(self):
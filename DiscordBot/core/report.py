@@ -1,6 +1,11 @@
 from enum import Enum, auto
 import discord
 import re
+from classification_result import ClassificationResult
+from mod_dispatcher import HIGH
+from structured_logging import get_logger
+
+log = get_logger('report')
 
 
 class State(Enum):
@@ -124,14 +129,20 @@ class Report:
         
         guild_id, channel_id, message_id = match.groups()
         
-        # Validate guild
+        # Validate guild; with multi-process sharding it may be on a shard this process doesn't run
         guild = self.client.get_guild(int(guild_id))
-        if not guild:
+        if not guild and not self.client.shared_mod_channels.channel_id(int(guild_id)):
             return ["I cannot accept reports of messages from guilds that I'm not in. "
                    "Please have the guild owner add me to the guild and try again."]
         
         # Validate channel
-        channel = guild.get_channel(int(channel_id))
+        if guild:
+            channel = guild.get_channel(int(channel_id))
+        else:
+            try:
+                channel = await self.client.fetch_channel(int(channel_id))
+            except (discord.errors.NotFound, discord.errors.Forbidden):
+                channel = None
         if not channel:
             return ["It seems this channel was deleted or never existed. "
                    "Please try again or say `cancel` to cancel."]
@@ -152,13 +163,24 @@ class Report:
     async def _evaluate_message_with_ai(self):
         if self.client.ai_classifier and self.reported_message:
             try:
-                print(f"Evaluating reported message with classifier")
-                self.ai_evaluation = await self.client.ai_classifier.classify_message(
-                    self.reported_message.content
-                )
-                print(f"AI evaluation complete. Score: {self.ai_evaluation.get('ai_scores', {}).get('combined_score', 'N/A')}%")
+                # Reuse the scores if this message was already flagged
+                existing = None
+                if self.client.database:
+                    existing = await self.client.database.get_flagged_message(
+                        str(self.reported_message.guild.id),
+                        str(self.reported_message.id)
+                    )
                 
-                # Log to database if flagged
+                if existing:
+                    log.info("reported message already flagged, reusing stored scores", doc_id=existing.get('doc_id'))
+                    self.ai_evaluation = ClassificationResult.from_flag_document(existing)
+                else:
+                    self.ai_evaluation = await self.client.ai_classifier.classify_message(
+                        self.reported_message.content
+                    )
+                log.info("reported message evaluated", score=self.ai_evaluation.get('ai_scores', {}).get('combined_score'))
+                
+                # Log to database if flagged; merges this report into an existing record
                 if self.ai_evaluation.get('is_violation', False) and self.client.database:
                     message_data = {
                         'message_id': str(self.reported_message.id),
@@ -169,17 +191,18 @@ class Report:
                         'content': self.reported_message.content,
                         'timestamp': self.reported_message.created_at,
                         'source': 'user_report',
-                        'ai_scores': self.ai_evaluation['ai_scores'],
-                        'final_classification': self.ai_evaluation['final_classification'],
                         'moderation_status': 'pending',
                         'reporter_id': str(self.message_object.author.id),
                         'reporter_username': self.message_object.author.name
                     }
+                    message_data.update(self.ai_evaluation.to_flag_document())
                     db_record_id = await self.client.database.log_flagged_message(message_data)
                     self.ai_evaluation['db_record_id'] = db_record_id
+                    if not existing:
+                        await self.client.database.log_flag_research(db_record_id, self.ai_evaluation.to_research_document())
                     
-            except Exception as e:
-                print(f"Error evaluating reported message with AI: {e}")
+            except Exception:
+                log.exception("error evaluating reported message")
                 self.ai_evaluation = None
     
     async def _show_message_and_types(self, message):
@@ -380,46 +403,47 @@ class Report:
     async def _send_to_mod_channel(self):
         """Send the completed report to moderators"""
         if not self.reported_message:
-            print("No message to report")
+            log.warning("no message to report")
             return
         
-        # Send to all mod channels
-        for guild in self.client.guilds:
-            mod_channel = self.client.mod_channels.get(guild.id)
-            if mod_channel:
-                try:
-                    summary = self._build_report_summary()
-                    mod_msg = await mod_channel.send(summary)
-                    
-                    # Add AI evaluation if available
-                    ai_msg = None
-                    if self.ai_evaluation:
-                        ai_summary = self._build_ai_evaluation_summary()
-                        ai_msg = await mod_channel.send(ai_summary)
-                    
-                    # Add reaction options
-                    reaction_target = ai_msg if ai_msg else mod_msg
-                    await reaction_target.add_reaction("🟢")
-                    await reaction_target.add_reaction("🔴")  
-                    await reaction_target.add_reaction("🟡")
-                    
-                    # Store decision tracking data for user reports
-                    if self.ai_evaluation and self.ai_evaluation.get('db_record_id'):
-                        self.client.pending_decisions[str(reaction_target.id)] = {
-                            'user_id': str(self.reported_message.author.id),
-                            'guild_id': str(self.reported_message.guild.id),
-                            'username': self.reported_message.author.name,
-                            'message_content': self.reported_message.content,
-                            'flagged_msg_id': self.ai_evaluation.get('db_record_id'),
-                            'source': 'user_report',
-                            'reporter_id': str(self.message_object.author.id)
-                        }
-                    
-                    print(f"Report sent to mod channel in guild {guild.name}")
-                    return
-                    
-                except Exception as e:
-                    print(f"Error sending report to mod channel: {e}")
+        # Send to the reported message's guild; it may be on a shard run by another process
+        guild_id = self.reported_message.guild.id
+        mod_channel = self.client.get_mod_channel(guild_id)
+        if not mod_channel:
+            log.warning("no mod channel known", guild_id=guild_id)
+            return
+        
+        try:
+            # Report summary and AI evaluation go out as one message with the reactions on it
+            embeds = [discord.Embed(description=self._build_report_summary()[:4096])]
+            if self.ai_evaluation:
+                embeds.append(discord.Embed(description=self._build_ai_evaluation_summary()[:4096]))
+            
+            # User reports always go ahead of routine mod channel output
+            reaction_target = await self.client.mod_dispatcher.send(
+                mod_channel,
+                embeds=embeds,
+                reactions=["🟢", "🔴", "🟡"],
+                priority=HIGH,
+                tag=str(self.reported_message.id)
+            )
+            
+            # Store decision tracking data for user reports
+            if self.ai_evaluation and self.ai_evaluation.get('db_record_id'):
+                self.client.pending_decisions[str(reaction_target.id)] = {
+                    'user_id': str(self.reported_message.author.id),
+                    'guild_id': str(guild_id),
+                    'username': self.reported_message.author.name,
+                    'message_content': self.reported_message.content,
+                    'flagged_msg_id': self.ai_evaluation.get('db_record_id'),
+                    'source': 'user_report',
+                    'reporter_id': str(self.message_object.author.id)
+                }
+            
+            log.info("report sent to mod channel", guild_id=guild_id)
+            
+        except Exception:
+            log.exception("error sending report to mod channel")
     
     def _build_report_summary(self):
         """Build the report summary for moderators"""
@@ -451,7 +475,10 @@ class Report:
         
         summary += f"\n**AI Scores:**\n"
         summary += f"-Gemini: {ai_scores.get('gemini_confidence', 'N/A')}% ({ai_scores.get('gemini_classification', 'N/A')})\n"
-        summary += f"-Natural Language: {ai_scores.get('natural_language_confidence', 'N/A'):.1f}%\n"
+        # Flags stored before the score was recorded, or rebuilt from a partial document, lack it
+        nl_confidence = ai_scores.get('natural_language_confidence')
+        nl_text = f"{nl_confidence:.1f}" if isinstance(nl_confidence, (int, float)) else 'N/A'
+        summary += f"-Natural Language: {nl_text}%\n"
         
         if details.get('gemini_risk_indicators'):
             summary += f"\n**Risk Indicators:**\n"
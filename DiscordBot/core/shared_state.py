@@ -0,0 +1,41 @@
+import os
+import sqlite3
+from typing import Dict, Optional
+
+
+class ModChannelRegistry:
+    """Guild -> mod channel map shared by every shard process on the host.
+
+    A process only sees the guilds on its own shards, but the report flow
+    (DMs always arrive on shard 0) has to post into any guild's mod channel.
+    Each process registers the mod channels it finds and looks up the rest here.
+    """
+
+    def __init__(self, path: str = '../data/shared_state.sqlite'):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS mod_channels (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER NOT NULL,
+                shard_id INTEGER
+            )""")
+        self._db.commit()
+
+    def register(self, guild_id: int, channel_id: int, shard_id: int = None):
+        self._db.execute(
+            "INSERT OR REPLACE INTO mod_channels (guild_id, channel_id, shard_id) VALUES (?, ?, ?)",
+            (guild_id, channel_id, shard_id)
+        )
+        self._db.commit()
+
+    def channel_id(self, guild_id: int) -> Optional[int]:
+        row = self._db.execute(
+            "SELECT channel_id FROM mod_channels WHERE guild_id = ?", (guild_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def all(self) -> Dict[int, int]:
+        return dict(self._db.execute("SELECT guild_id, channel_id FROM mod_channels").fetchall())
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+from typing import Dict
+
+# Logging for the bot process. Records are filtered (level, sampling,
+# redaction) on the calling thread, then handed to a queue; formatting and
+# all console/file I/O happen on the QueueListener's background thread, so
+# the event loop never blocks on a write.
+#
+# Per-module levels and content logging can be overridden with env vars:
+#   BOT_LOG_LEVELS="discord=DEBUG,ai_classifier=DEBUG"
+#   BOT_LOG_CONTENT=1    log message content instead of redacting it
+
+DEFAULT_LEVELS = {
+    '': 'INFO',
+    'discord': 'INFO',
+    'discord.gateway': 'WARNING',
+    'discord.http': 'WARNING',
+}
+
+# High-volume lines, keyed by log message: keep 1 in N
+DEFAULT_SAMPLE_RATES = {
+    'message received': 20,
+    'regex match': 20,
+    'classification complete': 10,
+}
+
+# Fields that carry user-written text
+REDACTED_FIELDS = ('content', 'message_content', 'text')
+
+_LOGGING_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger that takes structured fields as keyword arguments:
+
+        log.info("flag logged", doc_id=doc_id, source=source)
+    """
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs['extra'] = dict(kwargs.get('extra') or {}, fields=fields)
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name), {})
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in N records for each sampled message; warnings and errors always pass"""
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.seen = {}
+
+    def filter(self, record):
+        rate = self.rates.get(record.msg)
+        if not rate or rate <= 1 or record.levelno >= logging.WARNING:
+            return True
+        count = self.seen.get(record.msg, 0)
+        self.seen[record.msg] = count + 1
+        if count % rate:
+            return False
+        fields = getattr(record, 'fields', None)
+        record.fields = dict(fields or {}, sampled=f"1/{rate}")
+        return True
+
+
+class RedactionFilter(logging.Filter):
+    """Replaces user-written text in structured fields with its length"""
+
+    def __init__(self, log_content: bool = False):
+        super().__init__()
+        self.log_content = log_content
+
+    def filter(self, record):
+        fields = getattr(record, 'fields', None)
+        if fields and not self.log_content:
+            for key in REDACTED_FIELDS:
+                if isinstance(fields.get(key), str):
+                    fields[key] = f"<{len(fields[key])} chars>"
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: key=value text for the console, or JSON for files"""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        timestamp = datetime.fromtimestamp(record.created)
+        if self.json_lines:
+            entry = {'ts': timestamp.isoformat(timespec='milliseconds'), 'level': record.levelname,
+                     'logger': record.name, 'msg': record.getMessage()}
+            entry.update(fields)
+            if record.exc_text:
+                entry['exc'] = record.exc_text
+            return json.dumps(entry, default=str)
+
+        # QueueHandler has already folded any traceback into the message; keep fields on the first line
+        message, newline, traceback = record.getMessage().partition('\n')
+        line = f"{timestamp:%H:%M:%S} {record.levelname:<7} {record.name}: {message}"
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            traceback, newline = record.exc_text, '\n'
+        return line + newline + traceback
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.rpartition('=')
+        levels[name] = level.upper()
+    return levels
+
+
+def configure_logging(levels: Dict[str, str] = None, sample_rates: Dict[str, int] = None,
+                      log_file: str = 'discord.log', log_content: bool = None,
+                      console: bool = True) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread.
+
+    Returns the started QueueListener; it is stopped (and flushed) at exit.
+    """
+    levels = dict(DEFAULT_LEVELS, **(levels or {}))
+    levels.update(_parse_levels(os.environ.get('BOT_LOG_LEVELS', '')))
+    if log_content is None:
+        log_content = os.environ.get('BOT_LOG_CONTENT') == '1'
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(StructuredFormatter())
+        handlers.append(console_handler)
+    if log_file:
+        file_handler = logging.FileHandler(filename=log_file, encoding='utf-8', mode='w')
+        file_handler.setFormatter(StructuredFormatter(json_lines=True))
+        handlers.append(file_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates))
+    queue_handler.addFilter(RedactionFilter(log_content))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    for name, level in levels.items():
+        logging.getLogger(name or None).setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    # QueueListener.stop() fails if called twice, and callers may stop it themselves
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,144 @@
+import json
+import os
+from bisect import bisect_right
+from typing import Dict, Iterable, List
+
+from ai_classifier import AIClassifier
+from structured_logging import get_logger
+
+log = get_logger('threshold_simulator')
+
+# What-if numbers for the dashboard's threshold sliders. Scores with a known
+# outcome come from two places, kept apart:
+#
+#   labeled dataset    the feature records classifier_test.py writes, scored
+#                      the way eval_text scores a message with user context.
+#                      Projected precision and recall come from these alone.
+#   flagged_messages   combined_score plus the moderator's decision
+#                      (confirmed_violation / false_positive; pending has none).
+#                      Flags only exist above the threshold that was live when
+#                      they were made, so they say nothing about recall or lower
+#                      thresholds; they are reported as the precision moderators
+#                      observed above the current threshold.
+#
+# Scores are sorted once when the simulator is built; each query is then a
+# few binary searches, cheap enough to run on every slider movement.
+
+POSITIVE_STATUSES = ('confirmed_violation',)
+NEGATIVE_STATUSES = ('false_positive',)
+DEFAULT_LABELED_PATH = '../data/eval/feature_records.jsonl'
+
+
+class ScoreIndex:
+    """Sorted scores; counts above a threshold by binary search"""
+
+    def __init__(self, scores: Iterable[float]):
+        self.scores = sorted(scores)
+
+    def count_above(self, threshold: float) -> int:
+        # The classifier flags strictly above its threshold
+        return len(self.scores) - bisect_right(self.scores, threshold)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def labeled_score(record: Dict) -> float:
+    """The combined score eval_text gives a labeled message: user adjustment, then the regex score"""
+    score = AIClassifier.user_adjusted_score(record.get('base_score', 0), record.get('user_adjustment', 0))
+    return AIClassifier.regex_adjusted_score(score, record.get('regex_score', 0))
+
+
+class ThresholdSimulator:
+    def __init__(self, flagged: List[Dict] = (), labeled: List[Dict] = (), current_threshold: float = None):
+        confirmed, false_positives, flag_scores = [], [], []
+        for flag in flagged:
+            score = (flag.get('ai_scores') or {}).get('combined_score')
+            if score is None:
+                continue
+            flag_scores.append(score)
+            status = flag.get('moderation_status')
+            if status in POSITIVE_STATUSES:
+                confirmed.append(score)
+            elif status in NEGATIVE_STATUSES:
+                false_positives.append(score)
+        self.decided_flags = len(confirmed) + len(false_positives)
+        # The live violation threshold; stored flags are complete only above it
+        self.current_threshold = current_threshold
+
+        positives, negatives = [], []
+        for record in labeled:
+            if record.get('error'):
+                continue
+            (positives if record.get('true_label') else negatives).append(labeled_score(record))
+
+        self.positives = ScoreIndex(positives)
+        self.negatives = ScoreIndex(negatives)
+        self.labeled = ScoreIndex(positives + negatives)
+        self.confirmed = ScoreIndex(confirmed)
+        self.false_positives = ScoreIndex(false_positives)
+        self.flags = ScoreIndex(flag_scores)
+
+    @classmethod
+    def load_labeled(cls, path: str = DEFAULT_LABELED_PATH) -> List[Dict]:
+        """Feature records from the last evaluation run, if there is one.
+
+        Resumed runs append rows again (a retried failure, or a row re-run after
+        its message changed), so the last row for each index and message wins,
+        as it does when EvaluationRunner resumes.
+        """
+        records = {}
+        if not path or not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial last line of an interrupted run
+                key = (record['index'], record.get('message_hash')) if 'index' in record else number
+                records.pop(key, None)
+                records[key] = record
+        return list(records.values())
+
+    def simulate(self, violation_threshold: float, high_confidence_threshold: float) -> Dict:
+        """Projected flag volume, precision and recall at candidate thresholds"""
+        tp = self.positives.count_above(violation_threshold)
+        fp = self.negatives.count_above(violation_threshold)
+        high_tp = self.positives.count_above(high_confidence_threshold)
+        high_fp = self.negatives.count_above(high_confidence_threshold)
+        flagged = self.flags.count_above(violation_threshold)
+        labeled_flagged = self.labeled.count_above(violation_threshold)
+        return {
+            'violation_threshold': violation_threshold,
+            'high_confidence_threshold': high_confidence_threshold,
+            'current_threshold': self.current_threshold,
+            # Of the stored flags, how many these thresholds would still raise
+            'flags': flagged,
+            'flags_total': len(self.flags),
+            'high_confidence_flags': self.flags.count_above(high_confidence_threshold),
+            # Share of the labeled dataset that would be flagged
+            'flag_rate': _ratio(labeled_flagged, len(self.labeled)),
+            # Labeled dataset only
+            'precision': _ratio(tp, tp + fp),
+            'recall': _ratio(tp, len(self.positives)),
+            'high_confidence_precision': _ratio(high_tp, high_tp + high_fp),
+            'labeled_total': len(self.labeled),
+            # Moderator decisions on stored flags above the current threshold, and above the
+            # candidate when it is no lower (below it, the flags it would add don't exist)
+            'observed_precision': self._observed_precision(self.current_threshold),
+            'observed_precision_at_threshold': (
+                self._observed_precision(violation_threshold)
+                if self.current_threshold is not None and violation_threshold >= self.current_threshold else None),
+            'decided_flags': self.decided_flags,
+        }
+
+    def _observed_precision(self, threshold: float):
+        if threshold is None:
+            return None
+        confirmed = self.confirmed.count_above(threshold)
+        return _ratio(confirmed, confirmed + self.false_positives.count_above(threshold))
+
+
+def _ratio(numerator: int, denominator: int):
+    return round(numerator / denominator, 4) if denominator else None
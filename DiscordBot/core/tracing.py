@@ -0,0 +1,181 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from structured_logging import get_logger
+
+log = get_logger('tracing')
+
+# Per-message trace spans. A sampled message gets a Trace that travels with it
+# (on the MessageBurst, then in a context variable once a worker picks it up);
+# unsampled messages carry None and every span call is a single contextvar
+# read. Traces slower than slow_ms are appended to a Chrome trace-event file,
+# which chrome://tracing and ui.perfetto.dev open directly.
+#
+#   BOT_TRACE_SAMPLE_RATE=0.1   fraction of messages traced
+#   BOT_TRACE_SLOW_MS=2000      only traces at least this long are written
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+
+class Trace:
+    __slots__ = ('trace_id', 'name', 'attrs', 'start', 'wall_start', 'spans', 'marks')
+
+    def __init__(self, name: str, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans = []  # [name, start, end, parent index, attrs]
+        self.marks = {}  # name -> perf_counter timestamp, for measuring async gaps
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter()
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        """Record a span measured elsewhere, e.g. time spent waiting in a queue"""
+        self.spans.append([name, start, end, _current_span.get(), attrs])
+
+    @property
+    def duration(self) -> float:
+        end = max((span[2] for span in self.spans if span[2] is not None), default=self.start)
+        return end - self.start
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.1, slow_ms: float = 2000,
+                 path: str = '../data/traces.json', max_bytes: int = 20 * 1024 * 1024):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000
+        self.path = path
+        self.max_bytes = max_bytes
+        self.started = 0
+        self.exported = 0
+        self._thread_ids = 0
+
+    def start_trace(self, name: str, **attrs) -> Optional[Trace]:
+        """A new trace, or None if this message isn't sampled"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        self.started += 1
+        return Trace(name, **attrs)
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        return _current_trace.get()
+
+    @contextmanager
+    def activate(self, trace: Optional[Trace], parent_span: int = None):
+        """Make trace current for this block, including tasks it creates"""
+        if trace is None:
+            yield
+            return
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(parent_span)
+        try:
+            yield
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @staticmethod
+    def capture():
+        """Current trace and span, to resume with activate(*captured) in a long-lived task"""
+        return _current_trace.get(), _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        record = [name, time.perf_counter(), None, _current_span.get(), attrs]
+        trace.spans.append(record)
+        token = _current_span.set(len(trace.spans) - 1)
+        try:
+            yield
+        except Exception as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            record[2] = time.perf_counter()
+            _current_span.reset(token)
+
+    def traced(self, name: str):
+        """Decorator wrapping an async function in a span"""
+        def decorate(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def finish(self, trace: Optional[Trace]) -> bool:
+        """Write the trace out if it was slow; returns whether it was written"""
+        if trace is None or trace.duration < self.slow_seconds:
+            return False
+        try:
+            if not self._export(trace):
+                return False
+        except OSError as e:
+            log.error("could not write trace", trace_id=trace.trace_id, error=str(e))
+            return False
+        self.exported += 1
+        log.info("slow trace written", trace_id=trace.trace_id, name=trace.name,
+                 duration_ms=round(trace.duration * 1000), path=self.path)
+        return True
+
+    def _export(self, trace: Trace):
+        exists = os.path.exists(self.path)
+        if exists and os.path.getsize(self.path) > self.max_bytes:
+            return False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        # One row per trace in the viewer
+        self._thread_ids += 1
+        thread_id = self._thread_ids
+
+        def microseconds(timestamp):
+            return round((trace.wall_start + timestamp - trace.start) * 1e6)
+
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id,
+             'args': {'name': f"{trace.name} {trace.trace_id}"}},
+            {'name': trace.name, 'ph': 'X', 'pid': os.getpid(), 'tid': thread_id,
+             'ts': microseconds(trace.start), 'dur': round(trace.duration * 1e6),
+             'args': dict(trace.attrs, trace_id=trace.trace_id)},
+        ]
+        for name, start, end, parent, attrs in trace.spans:
+            events.append({
+                'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': thread_id,
+                'ts': microseconds(start), 'dur': round(((end or start) - start) * 1e6),
+                'args': dict(attrs, trace_id=trace.trace_id,
+                             parent=trace.spans[parent][0] if parent is not None else trace.name)
+            })
+
+        # Trace-event "JSON array" format: the viewers accept a trailing comma and no closing
+        # bracket, so traces can be appended without rewriting the file
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if not exists:
+                f.write('[\n')
+            for event in events:
+                f.write(json.dumps(event, default=str) + ',\n')
+        return True
+
+    def stats(self):
+        return {'traces_started': self.started, 'traces_exported': self.exported}
+
+
+tracer = Tracer(
+    sample_rate=float(os.environ.get('BOT_TRACE_SAMPLE_RATE', 0.1)),
+    slow_ms=float(os.environ.get('BOT_TRACE_SLOW_MS', 2000))
+)
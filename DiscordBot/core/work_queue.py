@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict
+from structured_logging import get_logger
+
+log = get_logger('work_queue')
+
+
+class QueueFull(Exception):
+    """Raised by put_nowait when the queue or the guild's share of it is full"""
+
+
+class FairWorkQueue:
+    """Bounded async work queue with per-guild fairness.
+
+    Each guild gets its own FIFO and workers take items round-robin across
+    guilds, so one busy server cannot starve the others. The total size and
+    each guild's share are bounded; put_nowait raises QueueFull instead of
+    letting work pile up.
+    """
+
+    WAIT_SAMPLES = 1000  # recent wait times kept for percentiles
+
+    def __init__(self, max_size: int = 500, max_per_guild: int = 200):
+        self.max_size = max_size
+        self.max_per_guild = max_per_guild
+        self._queues = OrderedDict()  # guild_id -> deque of (enqueued_at, item), round-robin order
+        self._size = 0
+        self._available = asyncio.Semaphore(0)  # one permit per queued item
+        self._workers = []
+
+        # Metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.max_depth_seen = 0
+        self._waits = deque(maxlen=self.WAIT_SAMPLES)
+
+    def __len__(self):
+        return self._size
+
+    def depth(self, guild_id=None) -> int:
+        if guild_id is None:
+            return self._size
+        return len(self._queues.get(guild_id, ()))
+
+    def oldest_wait(self) -> float:
+        """Seconds the longest-waiting item has been queued (each guild's FIFO head is its oldest)"""
+        if not self._size:
+            return 0.0
+        oldest = min(guild_queue[0][0] for guild_queue in self._queues.values() if guild_queue)
+        return time.monotonic() - oldest
+
+    def put_nowait(self, guild_id, item: Any):
+        """Enqueue an item without waiting. Raises QueueFull when over capacity."""
+        guild_queue = self._queues.get(guild_id)
+        if self._size >= self.max_size or (guild_queue and len(guild_queue) >= self.max_per_guild):
+            self.rejected += 1
+            raise QueueFull(f"work queue full (depth {self._size}, guild {guild_id})")
+
+        if guild_queue is None:
+            guild_queue = self._queues[guild_id] = deque()
+        guild_queue.append((time.monotonic(), item))
+        self._size += 1
+        self.enqueued += 1
+        self.max_depth_seen = max(self.max_depth_seen, self._size)
+        self._available.release()
+
+    async def get(self) -> Any:
+        """Take the next item, rotating across guilds"""
+        await self._available.acquire()
+
+        guild_id, guild_queue = next(iter(self._queues.items()))
+        enqueued_at, item = guild_queue.popleft()
+        self._size -= 1
+
+        # Move this guild to the back of the rotation, or drop it if drained
+        if guild_queue:
+            self._queues.move_to_end(guild_id)
+        else:
+            del self._queues[guild_id]
+
+        self._waits.append(time.monotonic() - enqueued_at)
+        return item
+
+    def start(self, handler: Callable[[Any], Awaitable], workers: int = 4):
+        """Start a pool of workers that call handler(item) for each queued item"""
+        if self._workers:
+            return
+        for number in range(workers):
+            self._workers.append(asyncio.create_task(self._worker(handler), name=f'classification-worker-{number}'))
+
+    async def _worker(self, handler):
+        while True:
+            item = await self.get()
+            try:
+                await handler(item)
+            except Exception:
+                self.failed += 1
+                log.exception("error processing queued message")
+            finally:
+                self.processed += 1
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> Dict:
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            'depth': self._size,
+            'oldest_wait_seconds': round(self.oldest_wait(), 3),
+            'max_depth_seen': self.max_depth_seen,
+            'guilds_waiting': len(self._queues),
+            'workers': len(self._workers),
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'wait_p50_seconds': round(percentile(0.50), 4),
+            'wait_p95_seconds': round(percentile(0.95), 4),
+            'wait_max_seconds': round(waits[-1], 4) if waits else 0.0
+        }
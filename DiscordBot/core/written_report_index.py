@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class WrittenReportIndex:
+    """Open written-report requests in the mod channels.
+
+    Each request is the ID of the bot message asking a moderator for a
+    written report. Requests are indexed by that message ID (for Discord
+    replies), by (channel, moderator) and by channel, so matching a mod
+    channel message is a dict lookup instead of a history fetch.
+
+    A plain (non-reply) message only answers a request made in the last
+    max_age seconds; older requests drop out of the moderator and channel
+    indexes and can then only be answered by replying to them. Without the
+    limit an abandoned request would claim the next message posted in its
+    channel, however much later. After reply_max_age (the decision store's
+    TTL, past which the request's state is gone anyway) it is forgotten.
+    """
+
+    def __init__(self, max_age: float = 900.0, reply_max_age: float = 72 * 3600):
+        self.max_age = max_age
+        self.reply_max_age = reply_max_age
+        self._requests = {}  # request_id -> (channel_id, moderator_id)
+        self._requested_at = {}  # request_id -> requested_at, oldest first
+        # Both hold request_id -> requested_at (wall clock), oldest first
+        self._by_moderator = {}  # (channel_id, moderator_id) -> OrderedDict of request_ids
+        self._by_channel = {}  # channel_id -> OrderedDict of request_ids
+
+    def add(self, request_id: str, channel_id: str, moderator_id: str, requested_at: float = None):
+        request_id, channel_id, moderator_id = str(request_id), str(channel_id), str(moderator_id)
+        now = time.time()
+        requested_at = now if requested_at is None else requested_at
+        self._forget_expired(now)
+        if now - requested_at >= self.reply_max_age:
+            return
+        self._requests[request_id] = (channel_id, moderator_id)
+        self._requested_at[request_id] = requested_at
+        if now - requested_at >= self.max_age:
+            return  # Already too old for anything but a reply
+        self._by_moderator.setdefault((channel_id, moderator_id), OrderedDict())[request_id] = requested_at
+        self._by_channel.setdefault(channel_id, OrderedDict())[request_id] = requested_at
+
+    def remove(self, request_id: str):
+        request_id = str(request_id)
+        location = self._requests.pop(request_id, None)
+        if location is None:
+            return
+        self._requested_at.pop(request_id, None)
+        channel_id, _ = location
+        for index, key in ((self._by_moderator, location), (self._by_channel, channel_id)):
+            open_requests = index.get(key)
+            if open_requests is not None:
+                open_requests.pop(request_id, None)
+                if not open_requests:
+                    del index[key]
+
+    def match(self, channel_id: str, author_id: str, reply_to_id: str = None) -> Optional[str]:
+        """Find the request a mod channel message answers, or None"""
+        channel_id, author_id = str(channel_id), str(author_id)
+
+        # A Discord reply to the request message is unambiguous
+        if reply_to_id is not None and str(reply_to_id) in self._requests:
+            return str(reply_to_id)
+
+        # Otherwise the oldest recent request this moderator opened in this channel
+        open_requests = self._recent(self._by_moderator, (channel_id, author_id))
+        if open_requests:
+            return next(iter(open_requests))
+
+        # Last resort: only if there is exactly one recent request in the channel
+        open_requests = self._recent(self._by_channel, channel_id)
+        if open_requests and len(open_requests) == 1:
+            return next(iter(open_requests))
+
+        return None
+
+    def _forget_expired(self, now: float):
+        cutoff = now - self.reply_max_age
+        while self._requested_at:
+            request_id, requested_at = next(iter(self._requested_at.items()))
+            if requested_at > cutoff:
+                break
+            self.remove(request_id)
+
+    def _recent(self, index, key) -> Optional[OrderedDict]:
+        """The open requests under key, after evicting those older than max_age"""
+        open_requests = index.get(key)
+        if not open_requests:
+            return None
+        cutoff = time.time() - self.max_age
+        # Insertion order is request order, so expired requests are at the front
+        while open_requests:
+            request_id, requested_at = next(iter(open_requests.items()))
+            if requested_at > cutoff:
+                break
+            del open_requests[request_id]
+        if not open_requests:
+            del index[key]
+            return None
+        return open_requests
+
+    def __len__(self):
+        return len(self._requests)
+
+    @classmethod
+    def from_decisions(cls, decisions, **limits) -> 'WrittenReportIndex':
+        """Rebuild the index from persisted decision state after a restart"""
+        index = cls(**limits)
+        open_requests = [(key, data) for key, data in decisions.items()
+                         if data.get('is_report_request') and data.get('awaiting_written_report')]
+        # Re-added oldest first, the order the age limits rely on. Requests persisted
+        # without requested_at are of unknown age, so they are only matched by reply.
+        unknown_age = time.time() - index.max_age
+        open_requests.sort(key=lambda item: item[1].get('requested_at', unknown_age))
+        for key, data in open_requests:
+            index.add(key, data.get('channel_id', ''), data.get('moderator_id', ''),
+                      requested_at=data.get('requested_at', unknown_age))
+        return index
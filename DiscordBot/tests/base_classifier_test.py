@@ -1,7 +1,8 @@
-import pandas as pd
 import asyncio
 from ai_classifier import AIClassifier
-from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
+from provider_cassette import cassette
+
+# BOT_CASSETTE=record records provider responses, BOT_CASSETTE=replay runs offline from them
 
 class ClassifierTest:
     def __init__(self):
@@ -11,6 +12,7 @@ class ClassifierTest:
         self.classifier = AIClassifier()
             
     def load_test_dataset(self, csv_path):        
+        import pandas as pd
         df = pd.read_csv(csv_path)
         
         df = df.sample(frac=1, random_state=42).reset_index(drop=True)
@@ -62,6 +64,8 @@ class ClassifierTest:
         return results
     
     def analyze_results(self, results):
+        # sklearn is slow to import and only needed once the API calls are done
+        from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
         print("Test Results")
         
         y_true = [r['true_label'] for r in results]
@@ -108,6 +112,9 @@ async def main():
     accuracy = tester.analyze_results(results)
     
     print(f"\nFinal accuracy: {accuracy*100:.1f}%")
+    
+    if cassette.mode != 'off':
+        print(f"Provider cassette: {cassette.stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
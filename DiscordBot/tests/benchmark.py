@@ -0,0 +1,118 @@
+import asyncio
+import json
+import os
+import platform
+import socket
+import time
+from datetime import datetime
+
+# Timing and baselines for the micro-benchmarks in test_benchmarks.py. Each
+# benchmark is timed over several rounds, each long enough to swamp timer
+# resolution, and the fastest round is kept: noise only ever adds time, so
+# the minimum is the most repeatable figure. Results are compared with a JSON
+# baseline per machine (timings from different hardware aren't comparable), so
+# baselines are not committed: on a machine without one the benchmarks skip
+# until it is recorded.
+#
+#   BENCH_UPDATE=1        record the current timings as the new baseline
+#   BENCH_TOLERANCE=0.3   fail when slower than baseline by more than this fraction
+#   BENCH_BASELINE=path   baseline file, default data/benchmarks/<host>.json (gitignored)
+
+DEFAULT_TOLERANCE = 0.3
+ROUNDS = 7
+ROUND_SECONDS = 0.05
+
+
+def baseline_path():
+    # Relative to this file, so the baseline is the same whichever directory pytest runs from
+    return os.environ.get('BENCH_BASELINE',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'benchmarks',
+                                       f"{socket.gethostname()}.json"))
+
+
+def measure(func, rounds=ROUNDS, round_seconds=ROUND_SECONDS):
+    """Fastest seconds per call of func() over several timed rounds"""
+    func()  # warm caches and lazy imports outside the timed rounds
+    calls = _calibrate(func, round_seconds)
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def measure_async(coroutine_func, rounds=ROUNDS, round_seconds=ROUND_SECONDS):
+    """measure() for a coroutine function, awaited in a loop inside one event loop"""
+    async def timed(calls):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await coroutine_func()
+        return time.perf_counter() - start
+
+    async def run():
+        await coroutine_func()
+        calls = 1
+        while await timed(calls) < round_seconds / 10:
+            calls *= 10
+        calls = max(1, int(calls * round_seconds / max(await timed(calls), 1e-9)))
+        return min([await timed(calls) for _ in range(rounds)]) / calls
+
+    return asyncio.run(run())
+
+
+def _calibrate(func, round_seconds):
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= round_seconds / 10:
+            return max(1, int(calls * round_seconds / elapsed))
+        calls *= 10
+
+
+class Baselines:
+    def __init__(self, path=None, tolerance=None, update=None):
+        self.path = path or baseline_path()
+        self.tolerance = (float(os.environ.get('BENCH_TOLERANCE', DEFAULT_TOLERANCE))
+                          if tolerance is None else tolerance)
+        self.update = os.environ.get('BENCH_UPDATE') == '1' if update is None else update
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('benchmarks', {})
+
+    def has(self, name):
+        return name in self.entries
+
+    def check(self, name, seconds, items=1):
+        """Compare a timing with its baseline; returns a failure message, or None when within tolerance.
+
+        When updating, the timing is recorded instead. Callers skip benchmarks that have
+        no baseline (see has()) rather than calling this, so a missing baseline never passes.
+        """
+        per_item = seconds / items
+        baseline = self.entries.get(name)
+        if self.update:
+            self.entries[name] = {'seconds_per_item': per_item, 'items': items,
+                                  'recorded_at': datetime.now().isoformat(timespec='seconds')}
+            self._save()
+            return None
+        if baseline is None:
+            raise KeyError(f"no baseline for {name} in {self.path}")
+        allowed = baseline['seconds_per_item'] * (1 + self.tolerance)
+        if per_item > allowed:
+            return (f"{name}: {per_item * 1e6:.2f} us per item, baseline {baseline['seconds_per_item'] * 1e6:.2f} us "
+                    f"(+{per_item / baseline['seconds_per_item'] - 1:.0%}, tolerance {self.tolerance:.0%})")
+        return None
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {'python': platform.python_version(), 'machine': platform.machine(), 'benchmarks': self.entries}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
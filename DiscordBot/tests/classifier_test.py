@@ -1,22 +1,48 @@
-import pandas as pd
 import asyncio
 import sys
 sys.path.append('../core')
 from ai_classifier import AIClassifier
 from database import DatabaseManager
-from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
+from regex_check import RegexCheck
+from provider_cassette import cassette
+from evaluation_runner import EvaluationRunner
+from classifier_weights import HIGH_VALUE_PATTERNS, MEDIUM_VALUE_PATTERNS
+import os
 import random
 from datetime import datetime, timedelta
 
+# Provider responses can be recorded once and replayed offline (see provider_cassette):
+#   BOT_CASSETTE=record python classifier_test.py
+#   BOT_CASSETTE=replay python classifier_test.py
+# Each message is classified once, concurrently, into a feature record saved
+# under ../data/eval; every variant below is then scored from those records
+# without further API calls. The records are also saved as a columnar
+# feature store (../data/eval/features.npz) for fusion_optimizer.py.
+#   EVAL_CONCURRENCY=16        rows in flight at once (default 8)
+#   EVAL_RESUME=1              continue an interrupted run instead of starting over
+#   EVAL_SAMPLE_SIZE=200       rows sampled from the dataset (default 50)
+
+# Variant name -> final score per row, from the feature records (a pandas DataFrame).
+# The adjustments mirror classify_message_with_regex and classify_message_with_user_context.
+VARIANTS = {
+    "Base Classifier": lambda f: f['base_score'],
+    "Classifier + Regex": lambda f: (f['base_score'] + f['regex_bonus']).clip(upper=100),
+    "Classifier + User Stats": lambda f: (f['base_score'] + f['user_adjustment']).clip(0, 100),
+    "Combined Classifier": lambda f: (f['base_score'] + f['regex_bonus'] + f['user_adjustment']).clip(upper=100),
+}
+
 class ClassifierTest:
-    def __init__(self):
+    def __init__(self, seed=42, concurrency=8, resume=False):
         self.classifier = None
         self.database = None
         self.current_thresholds = None
+        self.seed = seed
+        self.runner = EvaluationRunner(concurrency=concurrency, resume=resume)
         
     async def initialize(self):        
-        self.classifier = AIClassifier()
-        self.database = DatabaseManager()
+        # Rules and thresholds are recorded and replayed with the provider responses
+        self.database = DatabaseManager(cassette=cassette)
+        self.classifier = AIClassifier(regex_check=RegexCheck(self.database))
         
         # Get current thresholds from database
         self.current_thresholds = await self.database.get_guild_thresholds()
@@ -25,6 +51,7 @@ class ClassifierTest:
         print(f"  High confidence threshold: {self.current_thresholds['high_confidence_threshold']}%")
             
     def load_test_dataset(self, csv_path, sample_size=50):        
+        import pandas as pd
         df = pd.read_csv(csv_path)
         
         # Take random sample
@@ -39,188 +66,87 @@ class ClassifierTest:
         
         return df
     
-    def _apply_dynamic_threshold(self, score):
-        return 1 if score > self.current_thresholds['violation_threshold'] else 0
-    
-    def _get_final_classification(self, score):
-        if score > self.current_thresholds['high_confidence_threshold']:
-            return 'high_confidence_violation'
-        elif score > 75:
-            return 'likely_violation'
-        elif score > self.current_thresholds['violation_threshold']:
-            return 'possible_violation'
-        elif score > 30:
-            return 'low_risk'
-        else:
-            return 'safe'
-    
-    async def test_base_classifier(self, df):
-        print("\nTest 1: Base Classifier (with dynamic thresholds)")
-        results = []
-        
-        for index, row in df.iterrows():
-            message = row['Sample Message']
-            true_label = int(row['Label'])
-            
-            try:
-                result = await self.classifier.classify_message(message)
-                score = result['ai_scores']['combined_score']
-                
-                predicted_label = self._apply_dynamic_threshold(score)
-                
-                result['is_violation'] = predicted_label == 1
-                result['final_classification'] = self._get_final_classification(score)
-                result['threshold_used'] = self.current_thresholds['violation_threshold']
-                
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': predicted_label,
-                    'score': score,
-                    'correct': (true_label == predicted_label),
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
-                
-            except Exception as e:
-                print(f"Error on row {index}: {e}")
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': 0,
-                    'score': 0,
-                    'correct': False,
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
+    async def extract_features(self, index, row):
+        """One provider classification per message; every variant is scored from this record"""
+        message = row['Sample Message']
+        base_result = await self.classifier.classify_message(message)
+        # Local and cheap: regex rules are cached, user stats are synthetic
+        regex_result = await self.classifier.regex_check.apply_regex_rules(message)
+        user_stats = self._generate_test_user_stats(index)
+        user_risk_score = self.classifier._calculate_user_risk_score(user_stats)
+        # Raw Natural Language outputs, so the threat score can be recomputed with other weights
+        research = base_result['research_data']
+        sentiment = research['sentiment_analysis']
+        patterns = research['pattern_analysis'].get('threat_patterns', [])
         
-        return results
+        return {
+            'true_label': int(row['Label']),
+            'base_score': base_result['ai_scores']['combined_score'],
+            'gemini_confidence': base_result['ai_scores']['gemini_confidence'],
+            'nl_threat_score': base_result['ai_scores']['natural_language_threat_score'],
+            'sentiment_score': sentiment.get('score', 0),
+            'sentiment_magnitude': sentiment.get('magnitude', 0),
+            'sentiment_very_negative': sentiment.get('interpretation') == 'very_negative',
+            'sentiment_negative': sentiment.get('interpretation') == 'negative',
+            'has_money_entities': bool(research['entity_analysis'].get('has_money_entities', False)),
+            **{f'pattern_{pattern}': pattern in patterns for pattern in HIGH_VALUE_PATTERNS + MEDIUM_VALUE_PATTERNS},
+            'regex_score': regex_result['total_regex_score'],
+            'regex_bonus': self.classifier._regex_bonus(regex_result),
+            'user_risk_score': user_risk_score,
+            'user_adjustment': self.classifier._user_risk_adjustment(user_risk_score, user_stats),
+            # The live thresholds the bot flags with; fusion_optimizer.py fits the weights at these
+            'violation_threshold': self.current_thresholds['violation_threshold'],
+            'high_confidence_threshold': self.current_thresholds['high_confidence_threshold']
+        }
     
-    async def test_classifier_with_regex(self, df):
-        print("\nTest 2: Classifier + Regex (with dynamic thresholds)")
-        results = []
-        
-        for index, row in df.iterrows():
-            message = row['Sample Message']
-            true_label = int(row['Label'])
-            
-            try:
-                result = await self.classifier.classify_message_with_regex(message)
-                score = result['ai_scores']['combined_score']
-                
-                predicted_label = self._apply_dynamic_threshold(score)
-                
-                result['is_violation'] = predicted_label == 1
-                result['final_classification'] = self._get_final_classification(score)
-                result['threshold_used'] = self.current_thresholds['violation_threshold']
-                
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': predicted_label,
-                    'score': score,
-                    'correct': (true_label == predicted_label),
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
- 
-            except Exception as e:
-                print(f"Error on row {index}: {e}")
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': 0,
-                    'score': 0,
-                    'correct': False,
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
-        
-        return results
+    def _feature_error(self, index, row, error):
+        print(f"\nError on row {index}: {error}")
+        return {
+            'true_label': int(row['Label']),
+            'base_score': 0, 'gemini_confidence': 0, 'nl_threat_score': 0,
+            'sentiment_score': 0, 'sentiment_magnitude': 0, 'sentiment_very_negative': False,
+            'sentiment_negative': False, 'has_money_entities': False,
+            **{f'pattern_{pattern}': False for pattern in HIGH_VALUE_PATTERNS + MEDIUM_VALUE_PATTERNS},
+            'regex_score': 0, 'regex_bonus': 0, 'user_risk_score': 0, 'user_adjustment': 0,
+            'violation_threshold': self.current_thresholds['violation_threshold'],
+            'high_confidence_threshold': self.current_thresholds['high_confidence_threshold']
+        }
     
-    async def test_classifier_with_user_stats(self, df):
-        print("\nTest 3: Classifier + User Stats (with dynamic thresholds)")
-        results = []
-        
-        for index, row in df.iterrows():
-            message = row['Sample Message']
-            true_label = int(row['Label'])
-            
-            try:
-                user_stats = self._generate_test_user_stats()
-                result = await self.classifier.classify_message_with_user_context(message, user_stats)
-                score = result['ai_scores']['combined_score']
-                
-                predicted_label = self._apply_dynamic_threshold(score)
-                
-                result['is_violation'] = predicted_label == 1
-                result['final_classification'] = self._get_final_classification(score)
-                result['threshold_used'] = self.current_thresholds['violation_threshold']
-                
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': predicted_label,
-                    'score': score,
-                    'correct': (true_label == predicted_label),
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
-                
-            except Exception as e:
-                print(f"Error on row {index}: {e}")
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': 0,
-                    'score': 0,
-                    'correct': False,
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
-        
-        return results
+    async def collect_features(self, df):
+        print("\nClassifying each message once")
+        records = await self.runner.run("Feature Records", df, self.extract_features, self._feature_error)
+        import pandas as pd
+        from feature_store import FeatureStore
+        features = pd.DataFrame(records)
+        path = FeatureStore.from_frame(features).save(os.path.join(self.runner.results_dir, 'features.npz'))
+        print(f"Feature store written to {path}")
+        return features
     
-    async def test_classifier_combined(self, df):
-        print("\nTest 4: Classifier + Regex + User Stats (with dynamic thresholds)")
-        results = []
-        
-        for index, row in df.iterrows():
-            message = row['Sample Message']
-            true_label = int(row['Label'])
-            
-            try:
-                # Regex result
-                regex_result = await self.classifier.classify_message_with_regex(message)
-                
-                user_stats = self._generate_test_user_stats()
-                base_result = await self.classifier.classify_message(message)
-                
-                base_score = base_result['ai_scores']['combined_score']
-                regex_bonus = regex_result['ai_scores'].get('regex_bonus', 0)
-                
-                # Apply user context to the combined score
-                combined_result = await self.classifier.classify_message_with_user_context(message, user_stats)
-                user_adjustment = combined_result['ai_scores'].get('user_risk_adjustment', 0)
-                
-                final_score = min(100, base_score + regex_bonus + user_adjustment)
-                
-                # Use dynamic threshold instead of hardcoded
-                predicted_label = self._apply_dynamic_threshold(final_score)
-                
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': predicted_label,
-                    'score': final_score,
-                    'correct': (true_label == predicted_label),
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
-
-            except Exception as e:
-                print(f"Error on row {index}: {e}")
-                results.append({
-                    'true_label': true_label,
-                    'predicted_label': 0,
-                    'score': 0,
-                    'correct': False,
-                    'threshold_used': self.current_thresholds['violation_threshold']
-                })
+    def score_variants(self, features, variants=None):
+        """Per-row results for each variant, computed column-wise from the feature records"""
+        threshold = self.current_thresholds['violation_threshold']
         
+        results = {}
+        for name, variant in (variants or VARIANTS).items():
+            scores = variant(features)
+            if 'error' in features:
+                # Rows whose classification failed count as predicted safe with score 0, as before
+                scores = scores.where(features['error'].isna(), 0)
+            predicted = (scores > threshold).astype(int)
+            results[name] = [
+                {'true_label': int(true_label), 'predicted_label': int(predicted_label), 'score': float(score),
+                 'correct': bool(true_label == predicted_label), 'threshold_used': threshold}
+                for true_label, predicted_label, score in zip(features['true_label'], predicted, scores)
+            ]
         return results
     
-    def _generate_test_user_stats(self):
-        total_messages = random.randint(10, 1000)
-        flagged_rate = random.uniform(0.01, 0.15)
+    def _generate_test_user_stats(self, index):
+        # Seeded per row, so stats don't depend on the order concurrent rows finish in
+        rng = random.Random(self.seed * 1000003 + index)
+        total_messages = rng.randint(10, 1000)
+        flagged_rate = rng.uniform(0.01, 0.15)
         flagged_messages = int(total_messages * flagged_rate)
-        violation_rate = random.uniform(0.3, 0.8)
+        violation_rate = rng.uniform(0.3, 0.8)
         violation_count = int(flagged_messages * violation_rate)
         false_positives = flagged_messages - violation_count
         
@@ -230,12 +156,14 @@ class ClassifierTest:
                 'flagged_messages': flagged_messages,
                 'violation_count': violation_count,
                 'false_positives': false_positives,
-                'last_violation': datetime.now() - timedelta(days=random.randint(1, 30)),
-                'risk_score': random.uniform(0.1, 0.7)
+                'last_violation': datetime.now() - timedelta(days=rng.randint(1, 30)),
+                'risk_score': rng.uniform(0.1, 0.7)
             }
         }
     
     def analyze_results(self, results, test_name):
+        # sklearn is slow to import and only needed once the API calls are done
+        from sklearn.metrics import confusion_matrix, accuracy_score, precision_score, recall_score, f1_score
         print(f"\n{test_name} Results:")
         
         # Show threshold used
@@ -275,6 +203,7 @@ class ClassifierTest:
         return accuracy, precision, recall, f1
     
     def compare_all_results(self, results_dict):
+        from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
         print("Comparison Summary")
         
         if results_dict:
@@ -312,31 +241,26 @@ class ClassifierTest:
 async def main():
     print("Classifier Test")
     
-    tester = ClassifierTest()
+    tester = ClassifierTest(concurrency=int(os.environ.get('EVAL_CONCURRENCY', 8)),
+                            resume=os.environ.get('EVAL_RESUME') == '1')
     await tester.initialize()
-    df = tester.load_test_dataset("../data/M3_Dataset - Full Sorted .csv", sample_size=50)
+    df = tester.load_test_dataset("../data/M3_Dataset - Full Sorted .csv",
+                                  sample_size=int(os.environ.get('EVAL_SAMPLE_SIZE', 50)))
     
-    # Run all 4 tests
-    base_results = await tester.test_base_classifier(df)
-    regex_results = await tester.test_classifier_with_regex(df)
-    user_results = await tester.test_classifier_with_user_stats(df)
-    combined_results = await tester.test_classifier_combined(df)
+    # One classification per message, then every variant from the stored features
+    features = await tester.collect_features(df)
+    all_results = tester.score_variants(features)
     
-    # Analyze each test
-    tester.analyze_results(base_results, "Base Classifier")
-    tester.analyze_results(regex_results, "Classifier + Regex")
-    tester.analyze_results(user_results, "Classifier + User Stats")
-    tester.analyze_results(combined_results, "Combined Classifier")
+    # Analyze each variant
+    for name, results in all_results.items():
+        tester.analyze_results(results, name)
     
     # Compare all results
-    all_results = {
-        "Base Classifier": base_results,
-        "Classifier + Regex": regex_results,
-        "Classifier + User Stats": user_results,
-        "Combined Classifier": combined_results
-    }
-    
     tester.compare_all_results(all_results)
+    tester.runner.close()
+    
+    if cassette.mode != 'off':
+        print(f"\nProvider cassette: {cassette.stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
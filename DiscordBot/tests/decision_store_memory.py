@@ -0,0 +1,68 @@
+import sys
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+sys.path.append('../core')
+from decision_store import DecisionStore
+
+# Simulated day of traffic: every flag creates a decision entry, and most
+# flags get one or two follow-up entries (written report request, second review)
+FLAGS_PER_DAY = 5000
+SECONDS_PER_DAY = 24 * 3600
+
+
+def simulate(store, clock):
+    for i in range(FLAGS_PER_DAY):
+        clock[0] = i * SECONDS_PER_DAY / FLAGS_PER_DAY
+        key = str(10**17 + i * 3)
+        store[key] = {
+            'user_id': str(random.randint(10**17, 10**18)),
+            'guild_id': '987654321098765432',
+            'username': f'user{i % 300}',
+            'message_content': 'x' * random.randint(20, 400),
+            'flagged_msg_id': f'987654321098765432_{10**17 + i}'
+        }
+        for follow_up in range(random.choice([1, 1, 2])):
+            store[str(int(key) + follow_up + 1)] = {
+                'awaiting_written_report': True,
+                'original_decision_id': key,
+                'user_id': '1', 'guild_id': '2', 'username': 'u', 'flagged_msg_id': 'f'
+            }
+
+
+def measure(name, make_store, clock):
+    random.seed(152)
+    tracemalloc.start()
+    store = make_store()
+    start = time.perf_counter()
+    simulate(store, clock)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} entries in memory: {getattr(store, 'cached_count', lambda: len(store))():>6}  "
+          f"current: {current / 1024:8.1f} KiB  peak: {peak / 1024:8.1f} KiB  time: {elapsed:.2f}s")
+
+
+def main():
+    print(f"Simulating {FLAGS_PER_DAY} flags over one day")
+
+    # Drive the store's TTL with a simulated clock
+    clock = [0.0]
+    real_time = time.time
+    time.time = lambda: 1_700_000_000 + clock[0]
+
+    try:
+        measure("plain dict (before)", dict, clock)
+        with tempfile.TemporaryDirectory() as folder:
+            measure("DecisionStore 1000 / 72h",
+                    lambda: DecisionStore(os.path.join(folder, 'a.sqlite')), clock)
+            measure("DecisionStore 1000 / 6h",
+                    lambda: DecisionStore(os.path.join(folder, 'b.sqlite'), ttl_hours=6), clock)
+    finally:
+        time.time = real_time
+
+
+if __name__ == "__main__":
+    main()
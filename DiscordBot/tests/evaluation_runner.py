@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Runs an evaluation over a dataset with bounded concurrency. Each row's result
+# is appended to <results_dir>/<name>.jsonl as soon as it is ready, and that
+# file doubles as the checkpoint: with resume=True, rows already there (same
+# index and same message) are skipped, so an interrupted run picks up where it
+# stopped. Rows that failed are retried on resume.
+#
+# Provider calls run in worker threads (see ai_classifier), so wall time
+# scales with the concurrency allowed; per-provider rate limits are set with
+# BOT_CASSETTE_RATE.
+
+
+def _plain(index):
+    # numpy integers aren't JSON serializable, and must match the ints read back on resume
+    return index.item() if hasattr(index, 'item') else index
+
+
+def _message_hash(message):
+    return hashlib.sha256(str(message).encode()).hexdigest()[:16]
+
+
+class EvaluationRunner:
+    def __init__(self, concurrency=8, results_dir='../data/eval', resume=False):
+        self.concurrency = concurrency
+        self.results_dir = results_dir
+        self.resume = resume
+        self._executor = None
+
+    def results_path(self, name):
+        slug = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+        return os.path.join(self.results_dir, f"{slug}.jsonl")
+
+    async def run(self, name, df, evaluate, on_error, message_column='Sample Message'):
+        """Results for every row of df, in df's order.
+
+        evaluate(index, row) is awaited for each row still to do and returns a
+        JSON-serializable dict; if it raises, on_error(index, row, exception)
+        builds the row's result instead.
+        """
+        if self._executor is None:
+            # Enough threads for every concurrent row to have a provider call in flight
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='eval')
+            asyncio.get_running_loop().set_default_executor(self._executor)
+
+        path = self.results_path(name)
+        os.makedirs(self.results_dir, exist_ok=True)
+        done = self._load(path) if self.resume else {}
+        if not self.resume and os.path.exists(path):
+            os.remove(path)
+
+        rows = [(_plain(index), row) for index, row in df.iterrows()]
+        hashes = {index: _message_hash(row[message_column]) for index, row in rows}
+        todo = [(index, row) for index, row in rows
+                if index not in done or done[index].get('message_hash') != hashes[index]
+                or 'error' in done[index]]
+        results = {index: result for index, result in done.items() if index in hashes}
+
+        progress = _Progress(name, total=len(df), already_done=len(df) - len(todo))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        with open(path, 'a', encoding='utf-8') as out:
+            async def run_row(index, row):
+                async with semaphore:
+                    try:
+                        result = await evaluate(index, row)
+                    except Exception as e:
+                        result = on_error(index, row, e)
+                        result['error'] = str(e)
+                result['index'] = index
+                result['message_hash'] = hashes[index]
+                results[index] = result
+                out.write(json.dumps(result, default=str) + '\n')
+                out.flush()
+                progress.update(failed='error' in result)
+
+            await asyncio.gather(*(run_row(index, row) for index, row in todo))
+        progress.finish()
+
+        return [results[index] for index in hashes]
+
+    @staticmethod
+    def _load(path):
+        done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # the last line of an interrupted run may be partial
+                    done[result['index']] = result
+        return done
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class _Progress:
+    """One status line on stderr, redrawn at most a few times per second"""
+
+    def __init__(self, name, total, already_done):
+        self.name = name
+        self.total = total
+        self.done = already_done
+        self.skipped = already_done
+        self.failed = 0
+        self.start = time.monotonic()
+        self._drawn_at = 0.0
+        self._draw(force=True)
+
+    def update(self, failed=False):
+        self.done += 1
+        self.failed += failed
+        self._draw()
+
+    def finish(self):
+        self._draw(force=True)
+        sys.stderr.write('\n')
+
+    def _draw(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._drawn_at < 0.25:
+            return
+        self._drawn_at = now
+        elapsed = now - self.start
+        processed = self.done - self.skipped
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        resumed = f", {self.skipped} from checkpoint" if self.skipped else ""
+        sys.stderr.write(f"\r{self.name}: {self.done}/{self.total} ({self.done / max(self.total, 1):.0%}) "
+                         f"{rate:.1f} rows/s, ETA {eta:.0f}s, {self.failed} failed{resumed}   ")
+        sys.stderr.flush()
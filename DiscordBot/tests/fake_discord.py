@@ -0,0 +1,208 @@
+import asyncio
+import itertools
+import time
+from datetime import datetime
+
+# Minimal stand-ins for the discord.py objects ModBot touches, so the bot's
+# event handlers can be driven without a gateway connection.
+
+_ids = itertools.count(1)
+
+
+def snowflake(shard_hint=0):
+    """Unique, Discord-shaped ID (timestamp in the high bits, like real snowflakes)"""
+    return ((int(time.time() * 1000) - 1420070400000) << 22) + (shard_hint << 17) + next(_ids) % 131072
+
+
+def guild_id_for_shard(shard_id, shard_count, start=10**17):
+    """A guild ID that Discord would route to shard_id: (guild_id >> 22) % shard_count"""
+    guild_id = start
+    while (guild_id >> 22) % shard_count != shard_id:
+        guild_id += 1 << 22
+    return guild_id
+
+
+def shard_for_guild(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count if guild_id else 0
+
+
+class FakeUser:
+    def __init__(self, user_id, name, bot=False):
+        self.id = user_id
+        self.name = name
+        self.bot = bot
+        self.mention = f'<@{user_id}>'
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name='Test Guild', shard_id=0):
+        self.id = guild_id
+        self.name = name
+        self.shard_id = shard_id
+        self.text_channels = []
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.text_channels if c.id == channel_id), None)
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content='', embeds=None, message_id=None, reference=None):
+        self.id = message_id or snowflake()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.embeds = embeds or []
+        self.reference = reference
+        self.created_at = datetime.now()
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        await self.channel.api_call('add_reaction', message_id=self.id, emoji=str(emoji))
+        self.reactions.append(str(emoji))
+
+
+class FakeChannel:
+    """Text channel that records every API call made against it.
+
+    latency is an optional zero-argument callable returning seconds to sleep
+    per API call, to mimic Discord round trips and rate-limit waits.
+    """
+
+    def __init__(self, channel_id, name, guild=None, bot_user=None, recorder=None, latency=None):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.bot_user = bot_user
+        self.recorder = recorder
+        self.latency = latency
+        self.sent = []
+        self.api_calls = 0
+        if guild is not None:
+            guild.text_channels.append(self)
+
+    async def api_call(self, kind, **details):
+        self.api_calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency())
+        if self.recorder:
+            self.recorder(kind, channel_id=self.id, **details)
+
+    async def send(self, content=None, *, embeds=None, embed=None, **kwargs):
+        embeds = embeds or ([embed] if embed else [])
+        message = FakeMessage(self, self.bot_user, content or '', embeds)
+        await self.api_call('send', message_id=message.id, content=content,
+                            embeds=[e.to_dict() if hasattr(e, 'to_dict') else str(e) for e in embeds])
+        self.sent.append(message)
+        return message
+
+    async def fetch_message(self, message_id):
+        return next(m for m in self.sent if m.id == message_id)
+
+
+class FakeReference:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class FakeReaction:
+    """Shape of discord.Reaction used by on_reaction_add (a reaction on a cached message)"""
+
+    def __init__(self, message, emoji):
+        self.message = message
+        self.emoji = emoji
+        self.count = 1
+
+
+class FakeRawReaction:
+    """Shape of discord.RawReactionActionEvent used by on_raw_reaction_add"""
+
+    def __init__(self, guild_id, channel_id, message_id, member, emoji):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.user_id = member.id
+        self.member = member
+        self.emoji = emoji
+
+
+class FakeDatabase:
+    """In-memory stand-in for DatabaseManager; records writes via recorder.
+
+    latency works as for FakeChannel, slept once per call to mimic Firestore round trips.
+    """
+
+    def __init__(self, recorder=None, latency=None, custom_rules=None):
+        self.recorder = recorder or (lambda kind, **details: None)
+        self.latency = latency
+        self.calls = 0
+        self.flagged_messages = {}
+        self.user_statistics = {}
+        self.moderation_actions = []
+        self.custom_rules = list(custom_rules or [])
+        self.thresholds = {'violation_threshold': 50, 'high_confidence_threshold': 85}
+
+    async def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency())
+
+    @staticmethod
+    def flagged_message_doc_id(guild_id, message_id):
+        return f"{guild_id}_{message_id}"
+
+    async def get_guild_thresholds(self):
+        await self._round_trip()
+        return dict(self.thresholds)
+
+    async def get_custom_rules(self):
+        await self._round_trip()
+        return [dict(rule) for rule in self.custom_rules]
+
+    async def get_user_stats(self, user_id, guild_id):
+        await self._round_trip()
+        return self.user_statistics.get(f"{user_id}_{guild_id}")
+
+    async def update_user_stats(self, user_id, guild_id, username="", flagged=False,
+                                violation=False, false_positive=False, message_count=1):
+        await self._round_trip()
+        stats = self.user_statistics.setdefault(f"{user_id}_{guild_id}", {'stats': {}})['stats']
+        if not violation and not false_positive:
+            stats['total_messages'] = stats.get('total_messages', 0) + message_count
+        if flagged:
+            stats['flagged_messages'] = stats.get('flagged_messages', 0) + message_count
+        if violation:
+            stats['violation_count'] = stats.get('violation_count', 0) + 1
+        if false_positive:
+            stats['false_positives'] = stats.get('false_positives', 0) + 1
+        self.recorder('update_user_stats', user_id=user_id, violation=violation, false_positive=false_positive)
+
+    async def log_flagged_message(self, message_data):
+        await self._round_trip()
+        doc_id = self.flagged_message_doc_id(message_data['guild_id'], message_data['message_id'])
+        self.flagged_messages.setdefault(doc_id, dict(message_data))
+        self.recorder('log_flagged_message', doc_id=doc_id)
+        return doc_id
+
+    async def get_flagged_message(self, guild_id, message_id):
+        await self._round_trip()
+        data = self.flagged_messages.get(self.flagged_message_doc_id(guild_id, message_id))
+        return dict(data, doc_id=self.flagged_message_doc_id(guild_id, message_id)) if data else None
+
+    async def log_flag_research(self, doc_id, research_data):
+        pass
+
+    async def update_flagged_message_status(self, doc_id, status, moderator):
+        await self._round_trip()
+        self.flagged_messages.setdefault(doc_id, {})['moderation_status'] = status
+        self.recorder('update_flagged_message_status', doc_id=doc_id, status=status, moderator=moderator)
+
+    async def update_flagged_message_notes(self, doc_id, notes):
+        await self._round_trip()
+        self.flagged_messages.setdefault(doc_id, {})['moderator_notes'] = notes
+        self.recorder('update_flagged_message_notes', doc_id=doc_id)
+
+    async def log_moderation_action(self, action_data):
+        await self._round_trip()
+        self.moderation_actions.append(action_data)
+        self.recorder('log_moderation_action', action_type=action_data.get('action_type'))
@@ -0,0 +1,46 @@
+import numpy as np
+
+# Columnar store of per-message provider outputs from an evaluation run: one
+# NumPy array per feature, saved together as a compressed .npz. Refitting
+# weights (fusion_optimizer.py) then reads a few arrays instead of calling
+# the providers again.
+
+DEFAULT_PATH = '../data/eval/features.npz'
+
+
+class FeatureStore:
+    def __init__(self, columns):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"feature columns have different lengths: {sorted(lengths)}")
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Numeric and boolean columns of a DataFrame of feature records; failed rows are flagged"""
+        columns = {name: frame[name].to_numpy() for name in frame.columns
+                   if frame[name].dtype.kind in 'biuf'}
+        columns['failed'] = frame['error'].notna().to_numpy() if 'error' in frame else np.zeros(len(frame), bool)
+        return cls(columns)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path=DEFAULT_PATH):
+        np.savez_compressed(path, **self.columns)
+        return path
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def select(self, mask):
+        """Rows where mask is true, e.g. store.select(~store['failed'])"""
+        return FeatureStore({name: values[mask] for name, values in self.columns.items()})
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append('../core')
+from classifier_weights import DEFAULT_WEIGHTS, HIGH_VALUE_PATTERNS, MEDIUM_VALUE_PATTERNS, load_weights
+from feature_store import FeatureStore, DEFAULT_PATH
+
+# Refits AIClassifier's fusion and threat-score weights against labels, from
+# the feature store classifier_test.py writes. Scores are recomputed with NumPy
+# for every candidate at once: a (weights x thresholds x rows) grid per
+# evaluation, so a full search takes milliseconds and no provider is called.
+# The result is written in classifier_weights' format, which AIClassifier
+# loads at startup.
+#
+# The bot flags with the guild thresholds set from the dashboard, so the
+# weights are fitted at the live violation threshold (recorded in the feature
+# store by classifier_test.py). The best threshold for the fitted weights is
+# only reported, as a suggestion to set from the dashboard.
+#
+#   python classifier_test.py          # once, or BOT_CASSETTE=replay
+#   python fusion_optimizer.py --beta 2 --refine-threat
+
+THREAT_FEATURES = tuple(DEFAULT_WEIGHTS['threat'])
+GEMINI_WEIGHTS = np.round(np.arange(0, 1.0001, 0.05), 2)
+THRESHOLDS = np.arange(0, 100, 1.0)
+THREAT_CANDIDATES = np.round(np.arange(0, 0.301, 0.05), 2)
+
+
+def threat_indicators(store):
+    """Rows x THREAT_FEATURES matrix of 0/1 indicators, mirroring _calculate_enhanced_threat_score"""
+    patterns = {pattern: store[f'pattern_{pattern}'].astype(bool)
+                for pattern in HIGH_VALUE_PATTERNS + MEDIUM_VALUE_PATTERNS}
+    pattern_count = sum(patterns.values())
+    high_value_count = sum(patterns[pattern] for pattern in HIGH_VALUE_PATTERNS)
+    columns = {
+        'sentiment_very_negative': store['sentiment_very_negative'].astype(bool),
+        'sentiment_negative': store['sentiment_negative'].astype(bool),
+        'money_with_patterns': store['has_money_entities'].astype(bool) & (pattern_count > 0),
+        **patterns,
+        'multiple_high_value': high_value_count >= 2,
+        'high_value_with_others': (high_value_count == 1) & (pattern_count >= 3),
+    }
+    return np.column_stack([columns[name] for name in THREAT_FEATURES]).astype(float)
+
+
+def fused_scores(store, indicators, gemini_weights, threat_weights, include_regex=True):
+    """Combined score for each Gemini weight (rows) and message (columns), as _combine_classifications computes it"""
+    nl_confidence = np.minimum(indicators @ threat_weights, 1.0) * 100
+    scores = np.round(gemini_weights[:, None] * store['gemini_confidence']
+                      + (1 - gemini_weights[:, None]) * nl_confidence, 2)
+    if include_regex:
+        scores = np.minimum(100, scores + store['regex_bonus'])
+    return scores
+
+
+def confusion(scores, labels, thresholds):
+    """True positive, false positive and false negative counts per (score row, threshold)"""
+    predicted = scores[:, None, :] > thresholds[None, :, None]
+    tp = (predicted & labels).sum(-1)
+    fp = (predicted & ~labels).sum(-1)
+    fn = (~predicted & labels).sum(-1)
+    return tp, fp, fn
+
+
+def f_beta(tp, fp, fn, beta):
+    b2 = beta ** 2
+    denominator = (1 + b2) * tp + b2 * fn + fp
+    return np.where(denominator > 0, (1 + b2) * tp / np.maximum(denominator, 1), 0.0)
+
+
+class Fit:
+    def __init__(self, objective, gemini_weight, threshold, threat_weights):
+        self.objective = objective
+        self.gemini_weight = gemini_weight
+        self.threshold = threshold
+        self.threat_weights = threat_weights
+
+
+class FusionOptimizer:
+    def __init__(self, store, weights=None, beta=1.0, include_regex=True, min_precision=0.0,
+                 violation_threshold=None):
+        self.store = store
+        self.weights = weights or load_weights(None)
+        # The threshold the weights are fitted at: the live one the bot flags with
+        self.violation_threshold = float(self.weights['thresholds']['violation']
+                                         if violation_threshold is None else violation_threshold)
+        self.beta = beta
+        # Candidates flagging with lower precision are ruled out (moderator workload)
+        self.min_precision = min_precision
+        self.include_regex = include_regex
+        self.labels = store['true_label'].astype(bool)
+        self.indicators = threat_indicators(store)
+
+    def current(self):
+        return Fit(None, self.weights['fusion']['gemini'], self.violation_threshold,
+                   np.array([self.weights['threat'][name] for name in THREAT_FEATURES]))
+
+    def score(self, fit, rows=None):
+        """Objective, precision and recall of a fit, optionally on a subset of rows"""
+        rows = slice(None) if rows is None else rows
+        scores = fused_scores(self.store, self.indicators, np.array([fit.gemini_weight]),
+                              fit.threat_weights, self.include_regex)[:, rows]
+        tp, fp, fn = (count[0, 0] for count in confusion(scores, self.labels[rows], np.array([fit.threshold])))
+        return {
+            'f_beta': round(float(f_beta(tp, fp, fn, self.beta)), 4),
+            'precision': round(tp / (tp + fp), 4) if tp + fp else 0.0,
+            'recall': round(tp / (tp + fn), 4) if tp + fn else 0.0,
+            'flagged': int(tp + fp)
+        }
+
+    def search(self, threat_weights, rows, thresholds=None):
+        """Best Gemini weight (and threshold, if given candidates) for fixed threat weights.
+
+        Without candidates the threshold stays at the live violation threshold.
+        Ties go to the current values.
+        """
+        thresholds = np.array([self.violation_threshold]) if thresholds is None else thresholds
+        scores = fused_scores(self.store, self.indicators, GEMINI_WEIGHTS, threat_weights, self.include_regex)
+        tp, fp, fn = confusion(scores[:, rows], self.labels[rows], thresholds)
+        objective = f_beta(tp, fp, fn, self.beta)
+        if self.min_precision:
+            objective = np.where(tp >= self.min_precision * np.maximum(tp + fp, 1), objective, -1.0)
+        current = self.current()
+        best = np.argwhere(objective >= objective.max() - 1e-12)
+        distance = (np.abs(GEMINI_WEIGHTS[best[:, 0]] - current.gemini_weight)
+                    + np.abs(thresholds[best[:, 1]] - current.threshold) / 100)
+        g, t = best[np.argmin(distance)]
+        return Fit(float(objective[g, t]), float(GEMINI_WEIGHTS[g]), float(thresholds[t]), threat_weights)
+
+    def suggest_threshold(self, fit, rows):
+        """Best violation threshold for the fitted weights, reported for the dashboard but not written"""
+        scores = fused_scores(self.store, self.indicators, np.array([fit.gemini_weight]),
+                              fit.threat_weights, self.include_regex)[:, rows]
+        tp, fp, fn = confusion(scores, self.labels[rows], THRESHOLDS)
+        objective = f_beta(tp, fp, fn, self.beta)[0]
+        if self.min_precision:
+            objective = np.where(tp[0] >= self.min_precision * np.maximum(tp[0] + fp[0], 1), objective, -1.0)
+        best = np.flatnonzero(objective >= objective.max() - 1e-12)
+        t = best[np.argmin(np.abs(THRESHOLDS[best] - fit.threshold))]
+        return Fit(float(objective[t]), fit.gemini_weight, float(THRESHOLDS[t]), fit.threat_weights)
+
+    def fit(self, rows, refine_threat=False, sweeps=2):
+        best = self.search(self.current().threat_weights, rows)
+        if not refine_threat:
+            return best
+        # Coordinate descent over the threat weights; a change must strictly improve the objective
+        for _ in range(sweeps):
+            improved = False
+            for i in range(len(THREAT_FEATURES)):
+                for value in sorted(THREAT_CANDIDATES, key=lambda v: abs(v - best.threat_weights[i])):
+                    trial = best.threat_weights.copy()
+                    trial[i] = value
+                    candidate = self.search(trial, rows)
+                    if candidate.objective > best.objective + 1e-9:
+                        best, improved = candidate, True
+            if not improved:
+                break
+        return best
+
+    def high_confidence_threshold(self, fit, rows, target_precision=0.95, min_flags=5):
+        """Lowest threshold above the violation threshold whose flags reach the target precision (a suggestion)"""
+        scores = fused_scores(self.store, self.indicators, np.array([fit.gemini_weight]),
+                              fit.threat_weights, self.include_regex)[:, rows]
+        candidates = THRESHOLDS[THRESHOLDS >= fit.threshold]
+        tp, fp, _ = confusion(scores, self.labels[rows], candidates)
+        flagged = tp[0] + fp[0]
+        precision = np.where(flagged > 0, tp[0] / np.maximum(flagged, 1), 0.0)
+        reached = np.flatnonzero((precision >= target_precision) & (flagged >= min_flags))
+        if not len(reached):
+            return float(self.weights['thresholds']['high_confidence'])
+        return float(candidates[reached[0]])
+
+    def to_config(self, fit, high_confidence, report):
+        # The thresholds written are the live ones the weights were fitted at
+        return {
+            'fusion': {'gemini': fit.gemini_weight, 'natural_language': round(1 - fit.gemini_weight, 2)},
+            'threat': {name: round(float(weight), 4) for name, weight in zip(THREAT_FEATURES, fit.threat_weights)},
+            'thresholds': {'violation': fit.threshold, 'high_confidence': high_confidence},
+            'fitted_at': datetime.now().isoformat(timespec='seconds'),
+            'fit': report
+        }
+
+
+def holdout_split(labels, fraction, seed=42):
+    """Stratified train/holdout row masks"""
+    rng = np.random.default_rng(seed)
+    holdout = np.zeros(len(labels), bool)
+    for label in (False, True):
+        rows = np.flatnonzero(labels == label)
+        holdout[rng.choice(rows, int(round(len(rows) * fraction)), replace=False)] = True
+    return ~holdout, holdout
+
+
+def live_thresholds(store, args):
+    """The violation and high-confidence thresholds the evaluation ran with, or the command line's"""
+    thresholds = []
+    for column, override in (('violation_threshold', args.violation_threshold),
+                             ('high_confidence_threshold', args.high_confidence_threshold)):
+        if override is not None:
+            thresholds.append(override)
+        elif column in store and len(np.unique(store[column])) == 1:
+            thresholds.append(float(store[column][0]))
+        else:
+            raise SystemExit(f"{args.features} doesn't record a single {column}; "
+                             f"pass --{column.replace('_', '-')} with the dashboard's value")
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refit classifier fusion weights offline at the live thresholds")
+    parser.add_argument('--features', default=DEFAULT_PATH, help="feature store written by classifier_test.py")
+    parser.add_argument('--output', default='../config/classifier_weights.json')
+    parser.add_argument('--beta', type=float, default=1.0, help="F-beta objective; above 1 favours recall")
+    parser.add_argument('--min-precision', type=float, default=0.0,
+                        help="only consider settings whose flags are at least this precise")
+    parser.add_argument('--holdout', type=float, default=0.3, help="fraction of rows kept out of fitting")
+    parser.add_argument('--refine-threat', action='store_true', help="also refit the threat-score weights")
+    parser.add_argument('--no-regex', action='store_true', help="fit the fused score without the regex bonus")
+    parser.add_argument('--violation-threshold', type=float,
+                        help="live violation threshold (default: the one recorded in the feature store)")
+    parser.add_argument('--high-confidence-threshold', type=float,
+                        help="live high-confidence threshold (default: the one recorded in the feature store)")
+    parser.add_argument('--dry-run', action='store_true', help="report only, don't write the config")
+    args = parser.parse_args()
+
+    store = FeatureStore.load(args.features)
+    store = store.select(~store['failed'])
+    if not len(store):
+        print(f"No successfully classified rows in {args.features}")
+        return
+    violation_threshold, live_high_confidence = live_thresholds(store, args)
+    optimizer = FusionOptimizer(store, load_weights(args.output), beta=args.beta,
+                                include_regex=not args.no_regex, min_precision=args.min_precision,
+                                violation_threshold=violation_threshold)
+    train, holdout = holdout_split(optimizer.labels, args.holdout)
+    print(f"{len(store)} rows ({int(train.sum())} fit, {int(holdout.sum())} holdout), "
+          f"{int(optimizer.labels.sum())} violations")
+
+    start = time.perf_counter()
+    fit = optimizer.fit(train, refine_threat=args.refine_threat)
+    suggested = optimizer.suggest_threshold(fit, train)
+    suggested_high_confidence = optimizer.high_confidence_threshold(suggested, train)
+    elapsed = time.perf_counter() - start
+
+    current = optimizer.current()
+    report = {
+        'rows': len(store), 'beta': args.beta, 'include_regex': not args.no_regex,
+        'current': {'fit': optimizer.score(current, train), 'holdout': optimizer.score(current, holdout)},
+        'fitted': {'fit': optimizer.score(fit, train), 'holdout': optimizer.score(fit, holdout)},
+        'suggested_thresholds': {'violation': suggested.threshold, 'high_confidence': suggested_high_confidence,
+                                 'holdout': optimizer.score(suggested, holdout)},
+    }
+    print(f"Search took {elapsed * 1000:.1f} ms")
+    for name in ('current', 'fitted'):
+        for split in ('fit', 'holdout'):
+            result = report[name][split]
+            print(f"  {name:<8} {split:<8} F{args.beta:g}={result['f_beta']:.3f} precision={result['precision']:.3f} "
+                  f"recall={result['recall']:.3f} flagged={result['flagged']}")
+
+    config = optimizer.to_config(fit, live_high_confidence, report)
+    print(f"Fusion: gemini={config['fusion']['gemini']} natural_language={config['fusion']['natural_language']}, "
+          f"fitted at violation threshold {fit.threshold:g}")
+    if suggested.threshold != fit.threshold:
+        holdout_score = report['suggested_thresholds']['holdout']
+        print(f"Suggested dashboard thresholds: violation={suggested.threshold:g} "
+              f"high_confidence={suggested_high_confidence:g} (holdout F{args.beta:g}={holdout_score['f_beta']:.3f}); "
+              "refit after changing them")
+    if args.refine_threat:
+        changed = {name: weight for name, weight in config['threat'].items()
+                   if weight != optimizer.weights['threat'][name]}
+        print(f"Threat weights changed: {changed or 'none'}")
+
+    if report['fitted']['holdout']['f_beta'] < report['current']['holdout']['f_beta']:
+        print("Fitted weights do worse than the current ones on the holdout rows; not writing them.")
+        return
+    if not args.dry_run:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2)
+        print(f"Wrote {args.output}; AIClassifier loads it at startup")
+
+
+if __name__ == "__main__":
+    main()
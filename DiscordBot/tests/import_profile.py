@@ -0,0 +1,85 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# Startup profile: imports each entry point in a fresh interpreter with
+# `python -X importtime` and breaks the time down by top-level package.
+#
+#   python import_profile.py                 # bot core modules and the dashboard
+#   python import_profile.py bot database    # just these modules from DiscordBot/core
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORE_DIR = os.path.join(HERE, '..', 'core')
+DASHBOARD_DIR = os.path.join(HERE, '..', '..', 'dashboard')
+
+# (label, module, working directory)
+DEFAULT_TARGETS = [
+    ('bot', 'bot', CORE_DIR),
+    ('ai_classifier', 'ai_classifier', CORE_DIR),
+    ('database', 'database', CORE_DIR),
+    ('regex_check', 'regex_check', CORE_DIR),
+    ('archiver', 'archiver', CORE_DIR),
+    ('dashboard', 'app', DASHBOARD_DIR),
+]
+
+LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def profile_import(module, cwd):
+    """Import module in a fresh interpreter; returns (total_us, [(self_us, cumulative_us, depth, name)])"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([CORE_DIR, os.environ.get('PYTHONPATH', '')]))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), (len(indent) - 1) // 2, name))
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown error'
+        raise RuntimeError(f"import {module} failed: {error}")
+    total_us = sum(entry[1] for entry in entries if entry[2] == 0)
+    return total_us, entries
+
+
+def by_package(entries):
+    """Self time summed per top-level package, so nested imports are attributed to their owner"""
+    totals = defaultdict(int)
+    for self_us, _, _, name in entries:
+        totals[name.split('.')[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def report(label, module, cwd, top=10):
+    try:
+        total_us, entries = profile_import(module, cwd)
+    except RuntimeError as e:
+        print(f"\n{label}: {e}")
+        return None
+
+    print(f"\n{label}: {total_us / 1000:.1f} ms, {len(entries)} modules")
+    for package, self_us in by_package(entries)[:top]:
+        share = self_us / total_us * 100 if total_us else 0
+        print(f"  {package:<28} {self_us / 1000:8.1f} ms  {share:5.1f}%")
+    return total_us
+
+
+def main():
+    names = sys.argv[1:]
+    targets = [(name, name, CORE_DIR) for name in names] if names else DEFAULT_TARGETS
+
+    print("Import-time profile (self time per top-level package)")
+    totals = {label: report(label, module, cwd) for label, module, cwd in targets}
+
+    print("\nSummary")
+    for label, total_us in totals.items():
+        print(f"  {label:<16} {'failed' if total_us is None else f'{total_us / 1000:.1f} ms'}")
+
+
+if __name__ == "__main__":
+    main()
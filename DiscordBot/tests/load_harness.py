@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import csv
+import json
+import random
+import sys
+import tempfile
+import time
+sys.path.append('../core')
+from fake_discord import FakeUser, FakeGuild, FakeChannel, FakeMessage, FakeReaction, FakeDatabase
+from provider_cassette import ProviderCassette
+from metrics import metrics
+from structured_logging import configure_logging
+
+# End-to-end load test of ModBot without Discord or Firestore. A fake gateway
+# replays M3 dataset messages into on_message at a target rate, across a few
+# guilds and a pool of authors; the bot runs its real pipeline (burst
+# coalescing, the classification queue and workers, overload policy, mod
+# channel dispatcher) against:
+#
+#   FakeDatabase     in-memory flagged_messages / user_statistics, with latency
+#   FakeChannel      mod channels that count every API call, with latency
+#   StubProviders    provider responses synthesized from the dataset labels (or
+#                    replayed from a recorded cassette), with the cassette's
+#                    latency and error injection
+#
+# A simulated moderator reacts to each flag through on_reaction_add after a
+# review delay, agreeing with the dataset label. Reported: throughput,
+# end-to-end latency from gateway event to the flag being posted (or the
+# message being cleared), queue depth over time, mod channel API calls, and
+# the per-stage quantiles from metrics.snapshot().
+#
+#   python load_harness.py --rate 20 --messages 1000 --latency "gemini=0.8,nl=0.15"
+#   python load_harness.py --rate 50 --duration 60 --errors "gemini=0.05" --json ../data/load.json
+
+DATASET = '../data/M3_Dataset - Full Sorted .csv'
+BOT_USER_ID = 1000
+MODERATOR = (2000, 'moderator')
+SAMPLE_INTERVAL = 0.05
+
+
+def parse_settings(spec):
+    """'gemini=0.8,nl=0.15' -> {'gemini': 0.8, 'nl': 0.15}"""
+    settings = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        settings[name.strip()] = float(value)
+    return settings
+
+
+def lognormal(median, sigma, rng):
+    """Zero-argument sampler of seconds, or None for no latency"""
+    if not median:
+        return None
+    return lambda: rng.lognormvariate(0, sigma) * median
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def load_dataset(path=DATASET):
+    with open(path, encoding='utf-8') as f:
+        return [(row['Sample Message'], int(row['Label'])) for row in csv.DictReader(f) if row['Sample Message']]
+
+
+class Labels:
+    """Ground truth for a message or a coalesced burst (positive if any of its messages is)"""
+
+    def __init__(self, dataset):
+        self.labels = dict(dataset)
+        self.positives = [message for message, label in dataset if label]
+
+    def __call__(self, text):
+        label = self.labels.get(text)
+        if label is None:
+            label = int(any(message in text for message in self.positives))
+        return label
+
+
+class StubProviders(ProviderCassette):
+    """Provider responses without providers.
+
+    Recorded responses from a cassette file are served where there are any;
+    everything else is synthesized from the message's dataset label, in the
+    shape each fetch function returns. Latency and errors are injected per
+    provider exactly as for a real cassette.
+    """
+
+    def __init__(self, labels, path=None, seed=None, **kwargs):
+        super().__init__(mode='replay', path=path, seed=seed, **kwargs)
+        self.labels = labels
+        self.synthesized = 0
+
+    def _load(self):
+        if self.path:
+            super()._load()
+
+    def call(self, provider, inputs, fetch, refresh=False):
+        # Nothing is ever fetched live here, so refresh (re-read changing state) has nothing to do
+        self._inject(provider)
+        with self._lock:
+            response = self._entries.get(self.key(provider, inputs))
+            if response is not None:
+                self.hits += 1
+                return json.loads(json.dumps(response))
+            self.synthesized += 1
+        return self._synthesize(provider, inputs)
+
+    def _synthesize(self, provider, inputs):
+        if provider == 'gemini':
+            text = inputs[2]
+            label = self.labels(text)
+            confidence = max(0, min(100, round(self._random.gauss(80 if label else 15, 12))))
+            return {'text': json.dumps({
+                'is_sexual_extortion': bool(label),
+                'confidence_score': confidence,
+                'classification': 'sextortion' if label else 'safe',
+                'reasoning': 'synthetic response',
+                'risk_indicators': ['synthetic risk indicator'] if label else []
+            })}
+        text = inputs[0]
+        if provider == 'nl_sentiment':
+            label = self.labels(text)
+            return {'score': -0.7 if label else 0.1, 'magnitude': 1.2 if label else 0.3}
+        if provider == 'nl_entities':
+            return {'entities': [{'name': word, 'type': 'PRICE', 'salience': 0.1}
+                                 for word in text.split() if '$' in word]}
+        if provider == 'nl_syntax':
+            return {'token_count': len(text.split())}
+        if provider == 'translate_detect':
+            return {'lang': 'en', 'confidence': 1.0, 'language_name': 'english'}
+        if provider == 'translate':
+            return {'text': text, 'src': inputs[1] or 'en'}
+        raise ValueError(f"no stub response for {provider}")
+
+    def stats(self):
+        return dict(super().stats(), synthesized=self.synthesized)
+
+
+class LoadHarness:
+    def __init__(self, bot, dataset, labels, guilds=3, users=200, rate=10.0, messages=500, duration=None,
+                 arrival='poisson', review_delay=5.0, discord_latency=None, seed=1):
+        self.bot = bot
+        self.dataset = dataset
+        self.labels = labels
+        self.rate = rate
+        self.messages = messages
+        self.duration = duration
+        self.arrival = arrival
+        self.review_delay = review_delay
+        self.discord_latency = discord_latency
+        self.rng = random.Random(seed)
+
+        self.bot_user = FakeUser(BOT_USER_ID, 'Group 20 Bot', bot=True)
+        self.moderator = FakeUser(*MODERATOR)
+        self.authors = [FakeUser(5000 + i, f'user{i}') for i in range(users)]
+        self.channels = []
+        self.mod_channels = []
+        for i in range(guilds):
+            guild = FakeGuild(10**17 + i, name=f'Load Guild {i}')
+            self.channels.append(FakeChannel(guild.id + 1, 'group-20', guild, self.bot_user, self._record))
+            self.mod_channels.append(FakeChannel(guild.id + 2, 'group-20-mod', guild, self.bot_user,
+                                                 self._record, latency=discord_latency))
+
+        self.arrivals = {}  # message ID -> perf_counter at the gateway event
+        self.latencies = []
+        self.in_flight = 0
+        self.sent = 0
+        self.api_calls = {}
+        self.flags = 0
+        self.reviews = []
+        self.queue_depths = []
+        self.mod_queue_depths = []
+
+    def attach(self):
+        """Wire the fakes into the bot, as on_ready would with real guilds"""
+        bot = self.bot
+        bot._connection.user = self.bot_user
+        bot.group_num = '20'
+        for channel in self.mod_channels:
+            bot.mod_channels[channel.guild.id] = channel
+            bot.shared_mod_channels.register(channel.guild.id, channel.id, 0)
+        bot.mod_channel_ids = {channel.id for channel in self.mod_channels}
+
+        # Completion time of every message, including ones the classifier shed or cleared
+        handle_channel_message = bot.handle_channel_message
+
+        async def timed(message):
+            self.in_flight += 1
+            try:
+                await handle_channel_message(message)
+            finally:
+                self.in_flight -= 1
+                now = time.perf_counter()
+                for constituent in getattr(message, 'messages', [message]):
+                    arrived = self.arrivals.pop(constituent.id, None)
+                    if arrived is not None:
+                        self.latencies.append(now - arrived)
+        bot.handle_channel_message = timed
+
+        bot.message_queue.start(bot._process_queued, workers=bot.classification_workers)
+        bot.ready = True
+
+    def _record(self, kind, channel_id, **details):
+        self.api_calls[kind] = self.api_calls.get(kind, 0) + 1
+        if kind == 'send' and any(str(embed.get('title', '')).startswith('Flagged')
+                                  for embed in details.get('embeds', []) if isinstance(embed, dict)):
+            self.flags += 1
+            channel = next(c for c in self.mod_channels if c.id == channel_id)
+            self.reviews.append(asyncio.create_task(self._review(channel, details['message_id'])))
+
+    async def _review(self, channel, message_id):
+        """A moderator reacting to a flag; agrees with the dataset label"""
+        await asyncio.sleep(self.rng.expovariate(1 / self.review_delay) if self.review_delay else 0)
+        # The decision is stored once the send returns to handle_channel_message
+        for _ in range(100):
+            decision = self.bot.pending_decisions.get(str(message_id))
+            if decision:
+                break
+            await asyncio.sleep(0.01)
+        else:
+            return
+        message = await channel.fetch_message(message_id)
+        emoji = '🟢' if self.labels(decision['message_content']) else '🔴'
+        await self.bot.on_reaction_add(FakeReaction(message, emoji), self.moderator)
+
+    async def _feed(self):
+        """Gateway events at the target rate, until the message count or duration is reached"""
+        traffic = list(self.dataset)
+        start = time.perf_counter()
+        next_at = start
+        while True:
+            elapsed = time.perf_counter() - start
+            if (self.duration and elapsed >= self.duration) or (not self.duration and self.sent >= self.messages):
+                break
+            if self.sent % len(traffic) == 0:
+                self.rng.shuffle(traffic)
+            content, _ = traffic[self.sent % len(traffic)]
+            message = FakeMessage(self.rng.choice(self.channels), self.rng.choice(self.authors), content)
+            self.arrivals[message.id] = time.perf_counter()
+            self.sent += 1
+            await self.bot.on_message(message)
+
+            next_at += self.rng.expovariate(self.rate) if self.arrival == 'poisson' else 1 / self.rate
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return start
+
+    async def _sample(self):
+        while True:
+            self.queue_depths.append(self.bot.message_queue.stats()['depth'])
+            self.mod_queue_depths.append(self.bot.mod_dispatcher.stats()['queued'])
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def _idle(self):
+        return (not self.in_flight and self.bot.message_queue.stats()['depth'] == 0
+                and self.bot.burst_coalescer.stats()['open_bursts'] == 0)
+
+    async def run(self, drain_timeout=120.0):
+        sampler = asyncio.create_task(self._sample())
+        start = await self._feed()
+        fed_at = time.perf_counter()
+
+        # Let open bursts flush and the workers catch up
+        deadline = fed_at + drain_timeout
+        while (self.arrivals and not self._idle()) or self.bot.burst_coalescer.stats()['open_bursts']:
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(SAMPLE_INTERVAL)
+        drained_at = time.perf_counter()
+
+        await asyncio.gather(*self.reviews, return_exceptions=True)
+        await self.bot.mod_dispatcher.flush()
+        sampler.cancel()
+        return self.report(start, fed_at, drained_at)
+
+    def report(self, start, fed_at, drained_at):
+        completed = len(self.latencies)
+        processing_seconds = drained_at - start
+        mod_api_calls = sum(channel.api_calls for channel in self.mod_channels)
+        return {
+            'messages': {
+                'sent': self.sent,
+                'completed': completed,
+                # Bursts the queue refused, or still unfinished at the drain timeout
+                'dropped': len(self.arrivals),
+                'flags': self.flags,
+                'reviews': len(self.reviews),
+            },
+            'offered_rate': round(self.sent / max(fed_at - start, 1e-9), 2),
+            'throughput': round(completed / max(processing_seconds, 1e-9), 2),
+            'latency_seconds': {
+                'p50': round(percentile(self.latencies, 0.50), 4),
+                'p95': round(percentile(self.latencies, 0.95), 4),
+                'p99': round(percentile(self.latencies, 0.99), 4),
+                'max': round(max(self.latencies, default=0.0), 4),
+            },
+            'queue_depth': {
+                'mean': round(sum(self.queue_depths) / max(len(self.queue_depths), 1), 2),
+                'p99': percentile(self.queue_depths, 0.99),
+                'max': max(self.queue_depths, default=0),
+                'mod_channel_max': max(self.mod_queue_depths, default=0),
+            },
+            'mod_channel_api_calls': {
+                'total': mod_api_calls,
+                'by_kind': dict(sorted(self.api_calls.items())),
+                'per_flag': round(mod_api_calls / self.flags, 2) if self.flags else 0.0,
+            },
+            'database_calls': self.bot.database.calls,
+            'providers': self.bot.ai_classifier.cassette.stats(),
+            'components': {
+                'queue': self.bot.message_queue.stats(),
+                'overload': self.bot.overload_policy.stats(),
+                'bursts': self.bot.burst_coalescer.stats(),
+                'dispatcher': self.bot.mod_dispatcher.stats(),
+            },
+            'stages': metrics.snapshot(),
+        }
+
+
+def print_report(report):
+    messages = report['messages']
+    latency = report['latency_seconds']
+    depth = report['queue_depth']
+    calls = report['mod_channel_api_calls']
+    print(f"\nMessages: {messages['sent']} sent, {messages['completed']} completed, {messages['dropped']} dropped, "
+          f"{messages['flags']} flagged, {messages['reviews']} reviewed")
+    print(f"Offered {report['offered_rate']} msg/s, throughput {report['throughput']} msg/s")
+    print(f"End-to-end latency: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+          f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s")
+    print(f"Queue depth: mean {depth['mean']}  p99 {depth['p99']}  max {depth['max']}  "
+          f"(mod channel backlog max {depth['mod_channel_max']})")
+    by_kind = ', '.join(f"{kind}={count}" for kind, count in calls['by_kind'].items())
+    print(f"Mod channel API calls: {calls['total']} ({by_kind}), {calls['per_flag']} per flag")
+    print(f"Database calls: {report['database_calls']}")
+    print(f"Providers: {report['providers']}")
+    print(f"Overload: {report['components']['overload']}")
+    print("\nStages (seconds):")
+    for stage, values in report['stages'].items():
+        print(f"  {stage:<32} n={values['count']:<6} p50={values['p50']:.4f} p95={values['p95']:.4f} "
+              f"p99={values['p99']:.4f} errors={values['errors']}")
+
+
+async def run(args):
+    from bot import ModBot
+    from ai_classifier import AIClassifier
+    from regex_check import RegexCheck
+
+    rng = random.Random(args.seed)
+    dataset = load_dataset(args.dataset)
+    labels = Labels(dataset)
+    stub = StubProviders(labels, path=args.cassette, seed=args.seed, latency_sigma=args.sigma,
+                         latency=parse_settings(args.latency), error_rates=parse_settings(args.errors))
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        bot = ModBot(classification_workers=args.workers, queue_size=args.queue_size,
+                     shard_ids=[0], shard_count=1, state_dir=state_dir, metrics_port=0)
+        custom_rules = [{'pattern': r"\$\d+", 'weight': 0.05, 'description': "Money amounts"},
+                        {'pattern': r"i have.*photo", 'weight': 0.08, 'description': "Photo possession claims"}]
+        bot.database = FakeDatabase(latency=lognormal(args.db_latency, args.sigma, rng), custom_rules=custom_rules)
+        bot.ai_classifier = AIClassifier(regex_check=RegexCheck(bot.database), cassette=stub)
+        await bot.ai_classifier.warm_up()
+
+        harness = LoadHarness(bot, dataset, labels, guilds=args.guilds, users=args.users, rate=args.rate,
+                              messages=args.messages, duration=args.duration, arrival=args.arrival,
+                              review_delay=args.review_delay,
+                              discord_latency=lognormal(args.discord_latency, args.sigma, rng), seed=args.seed)
+        harness.attach()
+        target = f"{args.duration}s" if args.duration else f"{args.messages} messages"
+        print(f"Replaying {target} at {args.rate} msg/s ({args.arrival}) over {args.guilds} guilds, "
+              f"{args.users} authors, {args.workers} workers")
+        report = await harness.run(drain_timeout=args.drain_timeout)
+        await bot.message_queue.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nReport written to {args.json}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test of ModBot")
+    parser.add_argument('--rate', type=float, default=10.0, help="messages per second offered")
+    parser.add_argument('--messages', type=int, default=500, help="messages to send (ignored with --duration)")
+    parser.add_argument('--duration', type=float, help="seconds of traffic to send")
+    parser.add_argument('--arrival', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--guilds', type=int, default=3)
+    parser.add_argument('--users', type=int, default=200, help="distinct authors (fewer means more bursts)")
+    parser.add_argument('--workers', type=int, default=4, help="classification workers")
+    parser.add_argument('--queue-size', type=int, default=500)
+    parser.add_argument('--latency', default='gemini=0.8,nl=0.15,translate=0.1',
+                        help="median provider latency in seconds, per provider")
+    parser.add_argument('--errors', default='', help="provider failure probabilities, e.g. gemini=0.05")
+    parser.add_argument('--sigma', type=float, default=0.5, help="log-normal spread of every latency")
+    parser.add_argument('--discord-latency', type=float, default=0.1, help="median seconds per mod channel API call")
+    parser.add_argument('--db-latency', type=float, default=0.02, help="median seconds per database call")
+    parser.add_argument('--review-delay', type=float, default=5.0, help="mean seconds before a moderator reacts")
+    parser.add_argument('--cassette', help="recorded provider responses to serve where available")
+    parser.add_argument('--dataset', default=DATASET)
+    parser.add_argument('--drain-timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the full report here")
+    args = parser.parse_args()
+
+    configure_logging(log_file=None)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys
+import io
+import logging
+import os
+import tempfile
+import time
+sys.path.append('../core')
+from structured_logging import configure_logging, get_logger
+
+# Per-message cost, on the event loop thread, of the logging a classified
+# message used to produce (five prints plus DEBUG gateway lines written
+# synchronously to discord.log) versus the queue-backed structured logger.
+#
+#   python logging_overhead.py [messages]
+
+GATEWAY_LINES_PER_MESSAGE = 3  # MESSAGE_CREATE dispatch, heartbeat/ack chatter at DEBUG
+CONTENT = "hey, are you coming to the study session tonight? bring the notes from lecture 12"
+
+
+def print_style(messages, out_path, log_path):
+    """The old path: print() to a line-buffered stream plus a synchronous FileHandler"""
+    logger = logging.getLogger('discord.bench')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = logging.FileHandler(filename=log_path, encoding='utf-8', mode='w')
+    handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
+    logger.addHandler(handler)
+
+    with open(out_path, 'w', buffering=1) as out:
+        start = time.perf_counter()
+        for i in range(messages):
+            for _ in range(GATEWAY_LINES_PER_MESSAGE):
+                logger.debug("For Shard ID %s: WebSocket Event: %s", 0, {'t': 'MESSAGE_CREATE', 's': i})
+            print(f"Message from user{i % 50}: {CONTENT} (Guild: Test Guild)", file=out)
+            print(f"Analyzing message: '{CONTENT[:50]}...'", file=out)
+            print("  Regex match: Money amounts (+5.0%)", file=out)
+            print("Analysis complete. Combined score: 12.5%", file=out)
+            print(f"Updated stats for user {i % 50}", file=out)
+        elapsed = time.perf_counter() - start
+
+    logger.removeHandler(handler)
+    handler.close()
+    return elapsed
+
+
+def structured_style(messages, log_path):
+    """The new path: level and sampling checks on the caller, I/O on the listener thread"""
+    console = io.StringIO()
+    listener = configure_logging(log_file=log_path, console=True)
+    listener.handlers[0].setStream(console)
+
+    bot_log, classifier_log = get_logger('bot'), get_logger('ai_classifier')
+    regex_log, database_log = get_logger('regex_check'), get_logger('database')
+    gateway_log = logging.getLogger('discord.gateway')
+
+    start = time.perf_counter()
+    for i in range(messages):
+        for _ in range(GATEWAY_LINES_PER_MESSAGE):
+            gateway_log.debug("For Shard ID %s: WebSocket Event: %s", 0, {'t': 'MESSAGE_CREATE', 's': i})
+        bot_log.debug("message received", message_id=i, author_id=i % 50, guild_id=1, content=CONTENT)
+        classifier_log.debug("analyzing message", content=CONTENT)
+        regex_log.debug("regex match", rule="Money amounts", weight=0.05)
+        classifier_log.info("classification complete", score=12.5)
+        database_log.debug("user stats updated", user_id=i % 50)
+    elapsed = time.perf_counter() - start
+
+    listener.stop()
+    return elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        old = print_style(messages, os.path.join(tmp, 'stdout.txt'), os.path.join(tmp, 'old.log'))
+        new = structured_style(messages, os.path.join(tmp, 'new.log'))
+        with open(os.path.join(tmp, 'new.log')) as f:
+            new_lines = sum(1 for _ in f)
+
+    print(f"{messages} messages")
+    print(f"print + DEBUG file handler: {old / messages * 1e6:7.1f} us/message on the event loop")
+    print(f"structured, queue-backed:   {new / messages * 1e6:7.1f} us/message on the event loop "
+          f"({new_lines} lines written, sampled)")
+    print(f"saved {(old - new) / messages * 1e6:.1f} us/message ({(1 - new / old) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import sys
+import asyncio
+import multiprocessing
+import tempfile
+sys.path.append('../core')
+from fake_discord import (FakeUser, FakeGuild, FakeChannel, FakeMessage, FakeRawReaction,
+                          FakeDatabase, guild_id_for_shard, shard_for_guild)
+
+# Starts one ModBot process per shard against a fake gateway and checks that
+# decision state is shared: shard 0 (which receives all DMs, so runs the
+# report flow) posts a report into a guild owned by shard 1, and shard 1
+# handles the moderator's reaction to that message.
+
+SHARD_COUNT = 2
+BOT_USER_ID = 1000
+MODERATOR = (2000, 'moderator')
+
+
+def shard_process(shard_id, state_dir, guild_ids, commands, results):
+    asyncio.run(_run_shard(shard_id, state_dir, guild_ids, commands, results))
+
+
+async def _run_shard(shard_id, state_dir, guild_ids, commands, results):
+    from bot import ModBot
+    from report import Report, State
+    from classification_result import ClassificationResult
+
+    def record(kind, **details):
+        results.put((shard_id, kind, details))
+
+    bot = ModBot(shard_ids=[shard_id], shard_count=SHARD_COUNT, state_dir=state_dir)
+    bot_user = FakeUser(BOT_USER_ID, 'Group 20 Bot', bot=True)
+    bot._connection.user = bot_user
+    bot.group_num = '20'
+    bot.database = FakeDatabase(record)
+    bot.ready = True
+
+    # The fake gateway only gives this process the guilds on its shard
+    channels = {}
+    for guild_id in guild_ids:
+        if shard_for_guild(guild_id, SHARD_COUNT) != shard_id:
+            continue
+        guild = FakeGuild(guild_id, shard_id=shard_id)
+        FakeChannel(guild_id + 1, 'group-20', guild, bot_user, record)
+        mod_channel = FakeChannel(guild_id + 2, 'group-20-mod', guild, bot_user, record)
+        bot.mod_channels[guild_id] = mod_channel
+        bot.shared_mod_channels.register(guild_id, mod_channel.id, shard_id)
+        channels[mod_channel.id] = mod_channel
+    bot.mod_channel_ids = set(channels)
+
+    # Fake REST: channels on other shards are reachable by ID, like PartialMessageable
+    def get_partial_messageable(channel_id, guild_id=None):
+        if channel_id not in channels:
+            channels[channel_id] = FakeChannel(channel_id, 'group-20-mod', FakeGuild(guild_id), bot_user, record)
+        return channels[channel_id]
+    bot.get_partial_messageable = get_partial_messageable
+
+    results.put((shard_id, 'ready', {}))
+    loop = asyncio.get_running_loop()
+
+    while True:
+        command, args = await loop.run_in_executor(None, commands.get)
+        if command == 'stop':
+            break
+
+        if command == 'report':
+            # Last step of the DM report flow, as if the reporter had answered every prompt
+            guild = FakeGuild(args['guild_id'])
+            channel = FakeChannel(args['guild_id'] + 1, 'group-20', guild)
+            reported = FakeMessage(channel, FakeUser(3000, 'suspect'), "I have your pics, pay me or I post them")
+            reporter_dm = FakeMessage(FakeChannel(4000, 'dm'), FakeUser(4001, 'reporter'), 'yes')
+
+            report = Report(bot)
+            report.reported_message = reported
+            report.message_object = reporter_dm
+            report.selected_type = Report.REPORT_TYPES["1"]
+            # Shaped like a stored flag, the way Report rebuilds an already-flagged message
+            report.ai_evaluation = ClassificationResult.from_flag_document({
+                'doc_id': f"{args['guild_id']}_{reported.id}",
+                'content': reported.content,
+                'final_classification': 'high_confidence_violation',
+                'confidence_level': 'very_high',
+                'ai_scores': {'combined_score': 91.0, 'gemini_confidence': 95,
+                              'gemini_classification': 'sextortion', 'natural_language_confidence': 84.5},
+            })
+            report.state = State.AWAITING_BLOCK_DECISION
+            await report._send_to_mod_channel()
+            await bot.mod_dispatcher.flush()
+
+        elif command == 'reaction':
+            payload = FakeRawReaction(args['guild_id'], args['channel_id'], args['message_id'],
+                                      FakeUser(*MODERATOR), args['emoji'])
+            await bot.on_raw_reaction_add(payload)
+            await bot.mod_dispatcher.flush()
+
+        results.put((shard_id, 'done', {'command': command}))
+
+
+def _wait_for(results, kind, count=1, timeout=30):
+    seen = []
+    while len([r for r in seen if r[1] == kind]) < count:
+        seen.append(results.get(timeout=timeout))
+    return seen
+
+
+def main():
+    guild_on_shard_1 = guild_id_for_shard(1, SHARD_COUNT)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    commands = [context.Queue() for _ in range(SHARD_COUNT)]
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        processes = [
+            context.Process(target=shard_process,
+                            args=(shard_id, state_dir, [guild_on_shard_1], commands[shard_id], results))
+            for shard_id in range(SHARD_COUNT)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            _wait_for(results, 'ready', SHARD_COUNT)
+            print(f"{SHARD_COUNT} shards ready, guild {guild_on_shard_1} is on shard 1")
+
+            # DMs always arrive on shard 0, so shard 0 posts the report
+            commands[0].put(('report', {'guild_id': guild_on_shard_1}))
+            events = _wait_for(results, 'done')
+            sends = [e for e in events if e[1] == 'send']
+            assert sends and sends[0][0] == 0, f"expected shard 0 to post the report, got {sends}"
+            report_message_id, mod_channel_id = sends[0][2]['message_id'], sends[0][2]['channel_id']
+            print(f"shard 0 posted report {report_message_id} to mod channel {mod_channel_id}")
+
+            # The moderator's reaction arrives on the guild's shard, which never saw the message
+            gateway_shard = shard_for_guild(guild_on_shard_1, SHARD_COUNT)
+            commands[gateway_shard].put(('reaction', {
+                'guild_id': guild_on_shard_1, 'channel_id': mod_channel_id,
+                'message_id': report_message_id, 'emoji': '🔴'
+            }))
+            events = _wait_for(results, 'done')
+            updates = [e for e in events if e[1] == 'update_flagged_message_status']
+            assert updates, f"shard {gateway_shard} did not act on the reaction: {events}"
+            shard_id, _, details = updates[0]
+            assert shard_id == gateway_shard and details['status'] == 'false_positive'
+            print(f"shard {shard_id} handled the reaction: {details['doc_id']} -> {details['status']}")
+            print("PASS")
+
+        finally:
+            for command_queue in commands:
+                command_queue.put(('stop', None))
+            for process in processes:
+                process.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from archiver import FlagArchiver
+
+#   cd tests && python -m pytest -q test_archiver.py
+
+
+class FakeDatabase:
+    """The two Database calls FlagArchiver makes, over in-memory collections"""
+
+    def __init__(self):
+        self.collections = {'flagged_messages': {}, 'moderation_actions': {}}
+        self.fail_deletes = 0
+
+    def add_flag(self, doc_id, message_id, user_id, age_days, status='confirmed_violation'):
+        self.collections['flagged_messages'][doc_id] = {
+            'doc_id': doc_id, 'message_id': message_id, 'user_id': user_id, 'status': status,
+            'flagged_at': datetime.now() - timedelta(days=age_days)
+        }
+
+    async def get_archivable_records(self, collection, date_field, cutoff, limit, statuses=None):
+        records = [dict(r) for r in self.collections[collection].values()
+                   if r[date_field] < cutoff and (statuses is None or r.get('status') in statuses)]
+        return records[:limit]
+
+    async def delete_documents(self, collection, doc_ids):
+        if self.fail_deletes:
+            self.fail_deletes -= 1
+            return False
+        for doc_id in doc_ids:
+            self.collections[collection].pop(doc_id, None)
+        return True
+
+
+@pytest.fixture
+def database():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def archiver(database, tmp_path):
+    return FlagArchiver(database, archive_dir=str(tmp_path), max_age_days=30, batch_size=2)
+
+
+def segment_lines(archiver, collection='flagged_messages'):
+    folder = os.path.join(archiver.archive_dir, collection)
+    lines = []
+    for name in sorted(os.listdir(folder)):
+        with gzip.open(os.path.join(folder, name), 'rt') as f:
+            lines.extend(f.read().splitlines())
+    return lines
+
+
+def test_only_old_resolved_flags_are_archived(archiver, database):
+    database.add_flag('f1', 'm1', 'u1', age_days=40)
+    database.add_flag('f2', 'm2', 'u1', age_days=40, status='pending')
+    database.add_flag('f3', 'm3', 'u2', age_days=5)
+
+    counts = asyncio.run(archiver.run_once())
+    assert counts == {'flagged_messages': 1, 'moderation_actions': 0}
+    assert set(database.collections['flagged_messages']) == {'f2', 'f3'}
+
+
+def test_failed_delete_is_not_archived_twice(archiver, database):
+    database.add_flag('f1', 'm1', 'u1', age_days=40)
+    database.fail_deletes = 1
+    assert asyncio.run(archiver.run_once())['flagged_messages'] == 0
+    assert 'f1' in database.collections['flagged_messages']
+
+    # Next run finds it already in the index and only deletes it
+    assert asyncio.run(archiver.run_once())['flagged_messages'] == 0
+    assert not database.collections['flagged_messages']
+    assert len(segment_lines(archiver)) == 1
+    assert [r['doc_id'] for r in archiver.lookup(message_id='m1')] == ['f1']
+
+
+def test_lookup_reads_across_batches_and_segments(archiver, database):
+    # batch_size=2, so five flags take three batches: several gzip members per segment
+    for n in range(5):
+        database.add_flag(f'f{n}', f'm{n}', 'u1' if n % 2 else 'u2', age_days=40 + n % 2)
+    asyncio.run(archiver.run_once())
+    assert not database.collections['flagged_messages']
+
+    by_user = archiver.lookup(user_id='u1')
+    assert sorted(r['doc_id'] for r in by_user) == ['f1', 'f3']
+    assert archiver.lookup(message_id='m4', user_id='u2')[0]['doc_id'] == 'f4'
+    assert archiver.lookup(message_id='m4', user_id='u1') == []
+    assert archiver.lookup(user_id='u2', collection='moderation_actions') == []
+    assert len(archiver.lookup(user_id='u2', limit=2)) == 2
+    # Dates come back as ISO strings
+    assert isinstance(by_user[0]['flagged_at'], str)
+
+
+def test_lookup_without_criteria_returns_nothing(archiver):
+    assert archiver.lookup() == []
@@ -0,0 +1,215 @@
+import csv
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from ai_classifier import AIClassifier
+from provider_cassette import ProviderCassette
+from regex_check import RegexCheck
+from benchmark import Baselines, measure, measure_async
+
+# Micro-benchmarks for the local, pure-Python hot paths of classification and
+# moderator output. Inputs are the M3 dataset plus a few synthetic long
+# messages; each benchmark processes the whole input set per call and is
+# compared per message against the machine's baseline (see benchmark.py).
+#
+#   cd tests && python -m pytest -q test_benchmarks.py
+#   BENCH_UPDATE=1 python -m pytest -q test_benchmarks.py   # first run on a machine, or after an intended change
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'M3_Dataset - Full Sorted .csv')
+LONG_MESSAGE_LENGTHS = (2_000, 8_000, 32_000)
+RULE_COUNTS = (10, 100, 1000)
+SENTIMENTS = ('very_negative', 'negative', 'neutral', 'positive')
+
+RULE_TEMPLATES = (
+    (r"\$\d+", "Money amounts"),
+    (r"pay.*bitcoin", "Bitcoin payment demands"),
+    (r"send.*money.*urgent", "Urgent payment requests"),
+    (r"i have.*photo", "Photo possession claims"),
+    (r"share.*pics.*online", "Online sharing threats"),
+)
+RULE_WORDS = ('nudes', 'video', 'expose', 'leak', 'account', 'venmo', 'cashapp', 'gift card',
+              'snap', 'followers', 'school', 'parents', 'deadline', 'screenshot', 'friends')
+
+
+@pytest.fixture(scope='module')
+def baselines():
+    return Baselines()
+
+
+@pytest.fixture(scope='module')
+def messages():
+    with open(DATASET, encoding='utf-8') as f:
+        dataset = [row['Sample Message'] for row in csv.DictReader(f) if row['Sample Message']]
+    rng = random.Random(42)
+    # Long messages: dataset messages run together, the shape of a pasted wall of text
+    long_messages = []
+    for length in LONG_MESSAGE_LENGTHS:
+        text = ''
+        while len(text) < length:
+            text += rng.choice(dataset) + ' '
+        long_messages.append(text[:length])
+    return dataset + long_messages
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    # Replay mode builds no SDK clients; the benchmarks never reach a provider
+    offline = ProviderCassette('replay', path=os.path.join(tempfile.gettempdir(), 'benchmark-cassette.jsonl'))
+    return AIClassifier(regex_check=RegexCheck(_Rules([])), cassette=offline, weights_path=None)
+
+
+@pytest.fixture(scope='module')
+def nl_results(classifier, messages):
+    """Natural Language analysis dicts as classify_message builds them, minus the provider calls"""
+    rng = random.Random(7)
+    results = []
+    for message in messages:
+        analysis = {
+            'sentiment': {'interpretation': rng.choice(SENTIMENTS)},
+            'entities': {'has_money_entities': '$' in message or 'money' in message.lower()},
+            'syntax': {'threat_patterns': classifier._analyze_threat_patterns(message)},
+        }
+        threat_score = classifier._calculate_enhanced_threat_score(analysis)
+        analysis['enhanced_threat_assessment'] = {'threat_score': threat_score,
+                                                  'threat_level': classifier._get_threat_level(threat_score)}
+        results.append(analysis)
+    return results
+
+
+@pytest.fixture(scope='module')
+def gemini_results(messages):
+    rng = random.Random(11)
+    return [{
+        'gemini_confidence': rng.randint(0, 100),
+        'gemini_classification': rng.choice(('sextortion', 'harassment', 'safe')),
+        'gemini_reasoning': 'benchmark input',
+        'gemini_risk_indicators': rng.sample(('payment demand', 'threat to share', 'urgency'), rng.randint(0, 3)),
+        'gemini_is_violation': False,
+    } for _ in messages]
+
+
+@pytest.fixture(scope='module')
+def user_stats(messages):
+    rng = random.Random(13)
+    stats = []
+    for _ in messages:
+        total = rng.randint(1, 500)
+        flagged = rng.randint(0, total // 5)
+        stats.append({'stats': {'total_messages': total, 'flagged_messages': flagged,
+                                'violation_count': rng.randint(0, flagged),
+                                'false_positives': rng.randint(0, flagged)}})
+    return stats
+
+
+@pytest.fixture(scope='module')
+def classification_results(classifier, messages, gemini_results, nl_results, user_stats):
+    """Results with user context and thresholds attached, as the bot posts them"""
+    results = []
+    for message, gemini, nl, stats in zip(messages, gemini_results, nl_results, user_stats):
+        result = classifier._combine_classifications(gemini, nl, message)
+        result = classifier._adjust_classification_with_user_context(
+            result, classifier._calculate_user_risk_score(stats), stats)
+        result['thresholds_used'] = {'violation_threshold': 50, 'high_confidence_threshold': 85}
+        results.append(result)
+    return results
+
+
+class _Rules:
+    """Rule source for RegexCheck, standing in for the custom_rules collection"""
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    async def get_custom_rules(self):
+        return self.rules
+
+
+def regex_rules(count):
+    rng = random.Random(count)
+    rules = [{'pattern': pattern, 'weight': 0.05, 'description': description}
+             for pattern, description in RULE_TEMPLATES]
+    while len(rules) < count:
+        first, second = rng.sample(RULE_WORDS, 2)
+        rules.append({'pattern': rf"\b{first}\b.*\b{second}", 'weight': round(rng.uniform(0.01, 0.1), 3),
+                      'description': f"{first} with {second}"})
+    return rules[:count]
+
+
+def assert_within_baseline(baselines, name, timer, items):
+    """Fail when timer() is slower than the baseline; a regression is re-measured once before failing"""
+    if not baselines.update and not baselines.has(name):
+        pytest.skip(f"no {name} baseline in {baselines.path}; record one with BENCH_UPDATE=1")
+    failure = baselines.check(name, timer(), items)
+    if failure:
+        failure = baselines.check(name, timer(), items)
+    if failure:
+        pytest.fail(failure)
+
+
+def test_analyze_threat_patterns(baselines, classifier, messages):
+    def run():
+        for message in messages:
+            classifier._analyze_threat_patterns(message)
+    assert_within_baseline(baselines, 'analyze_threat_patterns', lambda: measure(run), len(messages))
+
+
+def test_calculate_enhanced_threat_score(baselines, classifier, nl_results):
+    def run():
+        for analysis in nl_results:
+            classifier._calculate_enhanced_threat_score(analysis)
+    assert_within_baseline(baselines, 'calculate_enhanced_threat_score', lambda: measure(run), len(nl_results))
+
+
+def test_combine_classifications(baselines, classifier, messages, gemini_results, nl_results):
+    inputs = list(zip(gemini_results, nl_results, messages))
+    def run():
+        for gemini, nl, message in inputs:
+            classifier._combine_classifications(gemini, nl, message)
+    assert_within_baseline(baselines, 'combine_classifications', lambda: measure(run), len(inputs))
+
+
+@pytest.mark.parametrize('rule_count', RULE_COUNTS)
+def test_apply_regex_rules(baselines, messages, rule_count):
+    check = RegexCheck(_Rules(regex_rules(rule_count)))
+    async def run():
+        for message in messages:
+            await check.apply_regex_rules(message)
+    assert_within_baseline(baselines, f'apply_regex_rules[{rule_count}]', lambda: measure_async(run), len(messages))
+
+
+def test_calculate_user_risk_score(baselines, classifier, user_stats):
+    def run():
+        for stats in user_stats:
+            classifier._calculate_user_risk_score(stats)
+    assert_within_baseline(baselines, 'calculate_user_risk_score', lambda: measure(run), len(user_stats))
+
+
+def test_code_format(baselines, classification_results):
+    pytest.importorskip('discord')
+    from bot import ModBot
+    with tempfile.TemporaryDirectory() as state_dir:
+        bot = ModBot(shard_ids=[0], shard_count=1, state_dir=state_dir, metrics_port=0)
+        def run():
+            for result in classification_results:
+                bot.code_format(result)
+        assert_within_baseline(baselines, 'code_format', lambda: measure(run), len(classification_results))
+
+
+def test_build_ai_evaluation_summary(baselines, classification_results):
+    pytest.importorskip('discord')
+    from report import Report
+    reports = []
+    for result in classification_results:
+        report = Report(client=None)
+        report.selected_type = 'Sexual Coercion/Sextortion'
+        report.ai_evaluation = result
+        reports.append(report)
+    def run():
+        for report in reports:
+            report._build_ai_evaluation_summary()
+    assert_within_baseline(baselines, 'build_ai_evaluation_summary', lambda: measure(run), len(reports))
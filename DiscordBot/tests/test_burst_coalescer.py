@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from burst_coalescer import BurstCoalescer
+
+#   cd tests && python -m pytest -q test_burst_coalescer.py
+
+_ids = itertools.count(1)
+
+
+def message(content='hi', author=1, channel=10, guild=100):
+    return SimpleNamespace(id=next(_ids), content=content, author=SimpleNamespace(id=author),
+                           channel=SimpleNamespace(id=channel), guild=SimpleNamespace(id=guild))
+
+
+def contents(bursts):
+    return [burst.content for burst in bursts]
+
+
+def test_flushes_after_author_goes_quiet():
+    flushed = []
+
+    async def run():
+        coalescer = BurstCoalescer(flushed.append, idle_seconds=0.05, max_delay=1.0)
+        coalescer.add(message('one'))
+        coalescer.add(message('two'))
+        coalescer.add(message('elsewhere', channel=11))
+        await asyncio.sleep(0.01)
+        assert flushed == []
+        await asyncio.sleep(0.1)
+        return coalescer
+
+    coalescer = asyncio.run(run())
+    # One burst per author and channel
+    assert sorted(contents(flushed)) == ['elsewhere', 'one\ntwo']
+    assert coalescer.stats() == {'open_bursts': 0, 'messages_in': 3, 'bursts_out': 2, 'messages_per_burst': 1.5}
+
+
+def test_max_delay_caps_a_steady_stream():
+    flushed = []
+
+    async def run():
+        coalescer = BurstCoalescer(flushed.append, idle_seconds=0.05, max_delay=0.12)
+        # Each message arrives inside the idle window, so only max_delay can end the burst
+        for n in range(6):
+            coalescer.add(message(str(n)))
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert len(flushed) >= 2
+    assert ''.join(contents(flushed)).replace('\n', '') == '012345'
+
+
+def test_size_limits_flush_immediately():
+    flushed = []
+
+    async def run():
+        coalescer = BurstCoalescer(flushed.append, idle_seconds=10, max_messages=3, max_chars=10)
+        for _ in range(3):
+            coalescer.add(message('a'))
+        assert contents(flushed) == ['a\na\na']
+        coalescer.add(message('x' * 10))
+        assert contents(flushed)[-1] == 'x' * 10
+        assert not coalescer._timers
+
+    asyncio.run(run())
+
+
+def test_trace_starts_before_an_immediate_flush():
+    seen = []
+
+    def flush(burst):
+        seen.append(burst.trace)
+
+    async def run():
+        coalescer = BurstCoalescer(flush, max_messages=1, start_trace=lambda first: ('trace', first.id))
+        first = message()
+        coalescer.add(first)
+        return first
+
+    first = asyncio.run(run())
+    assert seen == [('trace', first.id)]
+
+
+def test_flush_all_drains_open_bursts():
+    flushed = []
+
+    async def run():
+        coalescer = BurstCoalescer(flushed.append, idle_seconds=10)
+        burst = coalescer.add(message('one'))
+        coalescer.add(message('two', author=2))
+        coalescer.flush_all()
+        return coalescer, burst
+
+    coalescer, burst = asyncio.run(run())
+    assert sorted(contents(flushed)) == ['one', 'two']
+    assert burst.message_ids == [str(burst.id)]
+    assert coalescer.stats()['open_bursts'] == 0
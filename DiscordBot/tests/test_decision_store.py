@@ -0,0 +1,111 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+import decision_store
+from decision_store import DecisionStore
+
+#   cd tests && python -m pytest -q test_decision_store.py
+
+
+class Clock:
+    """Stands in for time.time() in decision_store"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(decision_store.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'decisions.sqlite')
+
+
+def test_cache_keeps_only_most_recently_used(path):
+    store = DecisionStore(path, max_entries=2)
+    store['a'] = {'n': 1}
+    store['b'] = {'n': 2}
+    store.get('a')  # a is now more recent than b
+    store['c'] = {'n': 3}
+
+    assert store.cached_count() == 2
+    assert set(store._cache) == {'a', 'c'}
+    # Evicted from memory, not from disk
+    assert store['b'] == {'n': 2}
+    assert len(store) == 3
+
+
+def test_miss_is_loaded_from_disk_after_restart(path):
+    DecisionStore(path)['m1'] = {'user_id': '42'}
+    reopened = DecisionStore(path)
+    assert reopened.get('m1') == {'user_id': '42'}
+    assert reopened.stats()['cache_misses'] == 1
+    assert reopened.get('m1') == {'user_id': '42'}
+    assert reopened.stats()['cache_hits'] == 1
+
+
+def test_entries_expire_after_ttl(path, clock):
+    store = DecisionStore(path, ttl_hours=1)
+    store['m1'] = {'user_id': '42'}
+    clock.now += 3599
+    assert 'm1' in store
+
+    clock.now += 2
+    assert store.get('m1') is None
+    assert 'm1' not in store
+    assert len(store) == 0
+    assert dict(store.items()) == {}
+    assert store.purge_expired() == 1
+
+
+def test_get_returns_a_copy(path):
+    store = DecisionStore(path)
+    store['m1'] = {'flags': 1}
+    store.get('m1')['flags'] = 99
+    assert store['m1'] == {'flags': 1}
+
+    assert store.update('m1', flags=2)
+    assert store['m1'] == {'flags': 2}
+    assert not store.update('missing', flags=3)
+
+
+def test_pop_removes_from_cache_and_disk(path):
+    store = DecisionStore(path)
+    store['m1'] = {'flags': 1}
+    assert store.pop('m1') == {'flags': 1}
+    assert store.get('m1') is None
+    assert DecisionStore(path).get('m1') is None
+
+
+def test_shared_store_sees_writes_from_other_processes(path):
+    ours = DecisionStore(path, shared=True)
+    theirs = DecisionStore(path, shared=True)
+    ours['m1'] = {'resolved': False}
+    assert ours.get('m1') == {'resolved': False}
+
+    # The other shard resolves it; a cached copy here would still say unresolved
+    assert theirs.update('m1', resolved=True)
+    assert ours.get('m1') == {'resolved': True}
+    theirs.pop('m1')
+    assert ours.get('m1') is None
+    assert 'm1' not in ours
+
+
+def test_unshared_store_serves_from_its_cache(path):
+    ours = DecisionStore(path)
+    theirs = DecisionStore(path)
+    ours['m1'] = {'resolved': False}
+    theirs.update('m1', resolved=True)
+    # Single-process mode trusts its cache, which is why shards need shared=True
+    assert ours.get('m1') == {'resolved': False}
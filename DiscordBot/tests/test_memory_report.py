@@ -0,0 +1,73 @@
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from memory_report import MemoryMonitor, approximate_size, parse_limits
+
+#   cd tests && python -m pytest -q test_memory_report.py
+
+
+@pytest.fixture
+def tracing():
+    was_tracing = tracemalloc.is_tracing()
+    yield
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+def test_only_the_newest_snapshots_are_kept(tracing):
+    monitor = MemoryMonitor(max_snapshots=2)
+    for label in ('a', 'b', 'c'):
+        monitor.snapshot(label)
+    assert list(monitor._snapshots) == ['b', 'c']
+
+    # Retaking a label makes it the newest, so it is evicted last
+    monitor.snapshot('b')
+    monitor.snapshot('d')
+    assert list(monitor._snapshots) == ['b', 'd']
+    assert monitor.diff()[0] == 'b -> d'
+
+
+def test_diff_needs_both_labels_or_neither(tracing):
+    monitor = MemoryMonitor()
+    assert monitor.diff() == ["Need two snapshots to compare."]
+    monitor.snapshot('a')
+    with pytest.raises(ValueError):
+        monitor.diff(older='a')
+    with pytest.raises(ValueError):
+        monitor.diff(newer='a')
+
+
+def test_check_warns_about_structures_over_their_limit():
+    reports = {n: {'id': n} for n in range(3)}
+    monitor = MemoryMonitor(limits=parse_limits('reports=2'))
+    monitor.track('reports', lambda: reports)
+    monitor.track('open_bursts', lambda: None)
+
+    assert monitor.check() == ['reports']
+    assert monitor.warnings == 1
+    stats = monitor.stats()
+    assert stats['reports_count'] == 3
+    assert stats['open_bursts_count'] == 0
+    assert stats['limit_warnings'] == 1
+
+
+def test_instance_counts():
+    class Tracked:
+        pass
+
+    keep = [Tracked() for _ in range(4)]
+    monitor = MemoryMonitor()
+    monitor.track_instances('tracked', Tracked, limit=10)
+    assert monitor.report()['tracked']['count'] == len(keep)
+
+
+def test_excluded_objects_are_not_charged():
+    shared = list(range(10_000))
+    holder = {'shared': shared}
+    monitor = MemoryMonitor(exclude=[shared])
+    monitor.track('holder', lambda: holder)
+    assert monitor.report()['holder']['approx_bytes'] < approximate_size(holder)
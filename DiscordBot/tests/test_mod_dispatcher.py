@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+from mod_dispatcher import HIGH, LOW, NORMAL, ModChannelDispatcher
+
+#   cd tests && python -m pytest -q test_mod_dispatcher.py
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+        self.reactions = []
+
+    async def add_reaction(self, emoji):
+        await asyncio.sleep(0)
+        self.reactions.append(emoji)
+
+
+class FakeChannel:
+    def __init__(self, channel_id=1, fail_on=None):
+        self.id = channel_id
+        self.fail_on = fail_on
+        self.sent = []
+
+    async def send(self, content=None, embeds=None):
+        await asyncio.sleep(0)
+        if content == self.fail_on:
+            raise RuntimeError('forbidden')
+        self.sent.append(content)
+        return FakeMessage(self, content)
+
+
+def test_higher_priority_sends_first():
+    channel = FakeChannel()
+
+    async def run():
+        dispatcher = ModChannelDispatcher()
+        # All queued before the sender task runs, so the heap decides the order
+        sends = [asyncio.ensure_future(dispatcher.send(channel, content, priority=priority))
+                 for content, priority in (('low', LOW), ('normal-1', NORMAL), ('high', HIGH), ('normal-2', NORMAL))]
+        await asyncio.gather(*sends)
+        await dispatcher.flush()
+
+    asyncio.run(run())
+    # Same priority keeps queue order
+    assert channel.sent == ['high', 'normal-1', 'normal-2', 'low']
+
+
+def test_reactions_and_calls_are_counted_per_tag():
+    channel = FakeChannel()
+
+    async def run():
+        dispatcher = ModChannelDispatcher(reaction_concurrency=2)
+        message = await dispatcher.send(channel, 'flag', reactions=('1️⃣', '2️⃣', '3️⃣'), tag='flag-1')
+        await dispatcher.flush()
+        return dispatcher, message
+
+    dispatcher, message = asyncio.run(run())
+    assert sorted(message.reactions) == sorted(['1️⃣', '2️⃣', '3️⃣'])
+    assert dispatcher.calls_for('flag-1') == 4
+    assert dispatcher.stats()['api_calls'] == 4
+    assert dispatcher.stats()['api_calls_per_flag'] == 4.0
+
+
+def test_failed_send_reaches_its_caller_only():
+    channel = FakeChannel(fail_on='bad')
+
+    async def run():
+        dispatcher = ModChannelDispatcher()
+        results = await asyncio.gather(dispatcher.send(channel, 'bad'), dispatcher.send(channel, 'good'),
+                                       return_exceptions=True)
+        await dispatcher.flush()
+        return dispatcher, results
+
+    dispatcher, results = asyncio.run(run())
+    assert isinstance(results[0], RuntimeError)
+    assert results[1].content == 'good'
+    assert dispatcher.errors == 1
+    assert dispatcher.stats()['queued'] == 0
+
+
+def test_channels_drain_independently():
+    first, second = FakeChannel(1), FakeChannel(2)
+
+    async def run():
+        dispatcher = ModChannelDispatcher()
+        await asyncio.gather(dispatcher.send(first, 'a'), dispatcher.send(second, 'b'))
+        await dispatcher.flush()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert (first.sent, second.sent) == (['a'], ['b'])
+    assert not dispatcher._senders and not dispatcher._queues
+
+
+def test_tag_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(ModChannelDispatcher, 'TRACKED_TAGS', 2)
+    dispatcher = ModChannelDispatcher()
+    for tag in ('a', 'b', 'c'):
+        dispatcher._count(tag)
+    assert dispatcher.calls_for('a') == 0
+    assert dispatcher.stats()['flags_tracked'] == 2
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+import overload_policy
+from overload_policy import FULL, LOCAL, OverloadPolicy
+
+#   cd tests && python -m pytest -q test_overload_policy.py
+
+
+class FakeQueue:
+    def __init__(self, depth=0, wait=0.0, max_size=100):
+        self.depth = depth
+        self.wait = wait
+        self.max_size = max_size
+        self.rejected = 0
+
+    def __len__(self):
+        return self.depth
+
+    def oldest_wait(self):
+        return self.wait
+
+
+class Clock:
+    """Stands in for time.monotonic() in overload_policy"""
+
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(overload_policy.time, 'monotonic', clock)
+    return clock
+
+
+def test_normal_load_classifies_everything_fully():
+    policy = OverloadPolicy(FakeQueue())
+    assert policy.load_level() == 'normal'
+    assert policy.admit(0.0) == FULL
+
+
+def test_critical_load_keeps_low_risk_on_the_local_path(monkeypatch):
+    monkeypatch.setattr(overload_policy.random, 'random', lambda: 0.0)
+    policy = OverloadPolicy(FakeQueue(depth=95))
+    assert policy.load_level() == 'critical'
+    # Nothing is dropped here; only a full queue sheds messages
+    assert {policy.admit(0.1) for _ in range(50)} == {LOCAL}
+    assert policy.admit(0.9) == FULL
+    stats = policy.stats()
+    assert stats['processed_local_only'] == 50
+    assert stats['high_risk_protected'] == 1
+    assert 'shed' not in stats
+
+
+def test_wait_time_drives_the_load_level():
+    queue = FakeQueue(depth=1, wait=11)
+    policy = OverloadPolicy(queue, wait_budget=10)
+    assert policy.load_level() == 'overloaded'
+    queue.wait = 31
+    assert policy.load_level() == 'critical'
+
+
+def test_provider_errors_expire_after_the_window(clock):
+    policy = OverloadPolicy(FakeQueue(), provider_error_limit=2, provider_error_window=60)
+    policy.record_provider_result(False)
+    policy.record_provider_result(False)
+    assert policy.load_level() == 'overloaded'
+    clock.now += 61
+    assert policy.load_level() == 'normal'
+    assert policy.recent_provider_errors == 0
+
+
+def test_probes_only_while_providers_fail(monkeypatch, clock):
+    monkeypatch.setattr(overload_policy.random, 'random', lambda: 0.0)
+    queue = FakeQueue()
+    policy = OverloadPolicy(queue, provider_error_limit=1)
+    policy.record_provider_result(False)
+    assert policy.admit(0.1) == FULL
+    assert policy.counts['provider_probes'] == 1
+
+    # A backed-up queue is overloaded on its own; no probes are sent
+    queue.depth = 60
+    assert policy.admit(0.1) == LOCAL
+    assert policy.counts['provider_probes'] == 1
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+import work_queue
+from work_queue import FairWorkQueue, QueueFull
+
+#   cd tests && python -m pytest -q test_work_queue.py
+
+
+class Clock:
+    """Stands in for time.monotonic() in work_queue"""
+
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, 'monotonic', clock)
+    return clock
+
+
+def drain(queue):
+    async def take_all():
+        return [await queue.get() for _ in range(len(queue))]
+    return asyncio.run(take_all())
+
+
+def test_guilds_are_served_round_robin():
+    queue = FairWorkQueue()
+    for n in range(3):
+        queue.put_nowait('busy', f'busy-{n}')
+    queue.put_nowait('quiet-1', 'quiet-1')
+    queue.put_nowait('quiet-2', 'quiet-2')
+
+    # A burst from one guild does not hold back the others
+    assert drain(queue) == ['busy-0', 'quiet-1', 'quiet-2', 'busy-1', 'busy-2']
+    assert len(queue) == 0
+    assert queue.stats()['guilds_waiting'] == 0
+
+
+def test_guild_share_is_bounded():
+    queue = FairWorkQueue(max_size=10, max_per_guild=2)
+    queue.put_nowait('busy', 1)
+    queue.put_nowait('busy', 2)
+    with pytest.raises(QueueFull):
+        queue.put_nowait('busy', 3)
+    # Other guilds still get in
+    queue.put_nowait('quiet', 4)
+    assert queue.depth('busy') == 2
+    assert queue.depth() == 3
+    assert queue.rejected == 1
+
+
+def test_total_size_is_bounded():
+    queue = FairWorkQueue(max_size=2, max_per_guild=2)
+    queue.put_nowait('a', 1)
+    queue.put_nowait('b', 2)
+    with pytest.raises(QueueFull):
+        queue.put_nowait('c', 3)
+    assert queue.stats()['rejected'] == 1
+    assert queue.max_depth_seen == 2
+
+
+def test_oldest_wait_tracks_the_longest_queued_item(clock):
+    queue = FairWorkQueue()
+    assert queue.oldest_wait() == 0.0
+    queue.put_nowait('a', 1)
+    clock.now += 5
+    queue.put_nowait('b', 2)
+    clock.now += 2
+    assert queue.oldest_wait() == 7
+
+    drain(queue)
+    assert queue.oldest_wait() == 0.0
+    assert queue.stats()['wait_max_seconds'] == 7
+
+
+def test_workers_count_failures_and_keep_going():
+    handled = []
+
+    async def handler(item):
+        if item == 'bad':
+            raise RuntimeError('boom')
+        handled.append(item)
+
+    async def run():
+        queue = FairWorkQueue()
+        queue.start(handler, workers=2)
+        for item in ('ok-1', 'bad', 'ok-2'):
+            queue.put_nowait('guild', item)
+        while queue.processed < 3:
+            await asyncio.sleep(0)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+    assert sorted(handled) == ['ok-1', 'ok-2']
+    assert queue.failed == 1
+    assert queue.stats()['workers'] == 0
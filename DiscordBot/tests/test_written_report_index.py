@@ -0,0 +1,108 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'core'))
+import written_report_index
+from written_report_index import WrittenReportIndex
+
+#   cd tests && python -m pytest -q test_written_report_index.py
+
+CHANNEL = 'mod-channel'
+
+
+class Clock:
+    """Stands in for time.time() in written_report_index"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(written_report_index.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def index(clock):
+    return WrittenReportIndex(max_age=900, reply_max_age=3600)
+
+
+def test_reply_matches_its_request(index):
+    index.add('r1', CHANNEL, 'mod-a')
+    index.add('r2', CHANNEL, 'mod-b')
+    assert index.match(CHANNEL, 'mod-c', reply_to_id='r2') == 'r2'
+
+
+def test_oldest_request_of_the_same_moderator(index, clock):
+    index.add('r1', CHANNEL, 'mod-a')
+    clock.now += 1
+    index.add('r2', CHANNEL, 'mod-a')
+    index.add('r3', CHANNEL, 'mod-b')
+    assert index.match(CHANNEL, 'mod-a') == 'r1'
+    index.remove('r1')
+    assert index.match(CHANNEL, 'mod-a') == 'r2'
+
+
+def test_channel_fallback_only_when_unambiguous(index):
+    index.add('r1', CHANNEL, 'mod-a')
+    assert index.match(CHANNEL, 'mod-b') == 'r1'
+    index.add('r2', CHANNEL, 'mod-c')
+    assert index.match(CHANNEL, 'mod-b') is None
+    assert index.match('other-channel', 'mod-a') is None
+
+
+def test_stale_request_does_not_claim_later_messages(index, clock):
+    index.add('r1', CHANNEL, 'mod-a')
+    clock.now += 901
+    # Neither the channel fallback nor the moderator's own match survive max_age
+    assert index.match(CHANNEL, 'mod-b') is None
+    assert index.match(CHANNEL, 'mod-a') is None
+    assert not index._by_channel and not index._by_moderator
+    # A reply is still unambiguous
+    assert index.match(CHANNEL, 'mod-b', reply_to_id='r1') == 'r1'
+
+
+def test_request_is_forgotten_after_reply_max_age(index, clock):
+    index.add('r1', CHANNEL, 'mod-a')
+    clock.now += 3601
+    index.add('r2', 'other-channel', 'mod-a')  # adding sweeps expired requests
+    assert index.match(CHANNEL, 'mod-b', reply_to_id='r1') is None
+    assert len(index) == 1
+
+
+def test_remove_clears_every_index(index):
+    index.add('r1', CHANNEL, 'mod-a')
+    index.remove('r1')
+    index.remove('r1')  # removing twice is harmless
+    assert len(index) == 0
+    assert index.match(CHANNEL, 'mod-a') is None
+    assert not index._by_channel and not index._by_moderator
+
+
+def test_rebuilt_from_persisted_decisions(clock):
+    decisions = {
+        'r-old': {'is_report_request': True, 'awaiting_written_report': True, 'channel_id': CHANNEL,
+                  'moderator_id': 'mod-a', 'requested_at': clock.now - 60},
+        'r-new': {'is_report_request': True, 'awaiting_written_report': True, 'channel_id': CHANNEL,
+                  'moderator_id': 'mod-a', 'requested_at': clock.now - 10},
+        'r-unknown-age': {'is_report_request': True, 'awaiting_written_report': True, 'channel_id': CHANNEL,
+                          'moderator_id': 'mod-b'},
+        'r-answered': {'is_report_request': True, 'awaiting_written_report': False, 'channel_id': CHANNEL,
+                       'moderator_id': 'mod-a', 'requested_at': clock.now},
+        'decision': {'user_id': '42'},
+    }
+    # Dict order is not request order; the index must still prefer the oldest request
+    index = WrittenReportIndex.from_decisions(dict(reversed(list(decisions.items()))))
+    assert len(index) == 3
+    assert index.match(CHANNEL, 'mod-a') == 'r-old'
+    # Requests persisted without requested_at only match by reply, and the
+    # channel fallback sees two recent requests, so mod-b matches nothing
+    assert index.match(CHANNEL, 'mod-b') is None
+    assert index.match(CHANNEL, 'mod-c', reply_to_id='r-unknown-age') == 'r-unknown-age'
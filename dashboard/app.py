@@ -2,12 +2,16 @@ from flask import Flask, render_template, request, jsonify
 import asyncio
 import sys
 import os
-from functools import wraps
+from functools import wraps, lru_cache
 import re
+import time
 
 sys.path.append('../DiscordBot/core')
 from regex_check import RegexCheck
 from database import DatabaseManager
+from archiver import FlagArchiver
+from threshold_simulator import ThresholdSimulator
+from structured_logging import configure_logging
 
 regex_check = RegexCheck()
 app = Flask(__name__)
@@ -23,7 +27,27 @@ def async_route(f):
             loop.close()
     return wrapper
 
-db = DatabaseManager()
+@lru_cache(maxsize=None)
+def get_db():
+    """Firestore client, created on the first request that needs it so the server starts fast"""
+    return DatabaseManager()
+
+# Lookups only read the local index, so the archiver needs no database connection here
+archiver = FlagArchiver(None, archive_dir='../DiscordBot/data/archive')
+
+# Rebuilt from Firestore and the labeled dataset at most this often; slider queries only hit the index
+SIMULATOR_TTL = 300
+_simulator = {'built_at': 0.0, 'simulator': None}
+
+async def get_simulator(refresh=False):
+    if refresh or _simulator['simulator'] is None or time.monotonic() - _simulator['built_at'] > SIMULATOR_TTL:
+        flagged = await get_db().get_flag_outcomes()
+        thresholds = await get_db().get_guild_thresholds()
+        labeled = ThresholdSimulator.load_labeled('../DiscordBot/data/eval/feature_records.jsonl')
+        _simulator['simulator'] = ThresholdSimulator(flagged, labeled,
+                                                     current_threshold=thresholds['violation_threshold'])
+        _simulator['built_at'] = time.monotonic()
+    return _simulator['simulator']
 
 @app.route('/')
 def dashboard():
@@ -36,13 +60,23 @@ def rules():
 @app.route('/api/flagged-messages')
 @async_route
 async def get_flagged_messages():
-    messages = await db.get_flagged_messages(limit=10)
+    messages = await get_db().get_flagged_messages(limit=10)
     return jsonify(messages)
 
+@app.route('/api/archive')
+def lookup_archive():
+    message_id = request.args.get('message_id')
+    user_id = request.args.get('user_id')
+    
+    if not message_id and not user_id:
+        return jsonify({'error': 'message_id or user_id is required'}), 400
+    
+    return jsonify(archiver.lookup(message_id=message_id, user_id=user_id))
+
 @app.route('/api/custom-rules')
 @async_route
 async def get_custom_rules():
-    rules = await db.get_custom_rules()
+    rules = await get_db().get_custom_rules()
     return jsonify(rules)
 
 @app.route('/api/custom-rules', methods=['POST'])
@@ -60,7 +94,7 @@ async def add_custom_rule():
     if not validation['valid']:
         return jsonify({'error': f'Invalid regex: {validation["error"]}'}), 400
     
-    await db.save_custom_rule(pattern, weight, description)
+    await get_db().save_custom_rule(pattern, weight, description)
     
     regex_check.clear_cache()
     
@@ -69,13 +103,13 @@ async def add_custom_rule():
 @app.route('/api/custom-rules/<rule_id>', methods=['DELETE'])
 @async_route
 async def delete_custom_rule(rule_id):
-    await db.delete_custom_rule(rule_id)
+    await get_db().delete_custom_rule(rule_id)
     return jsonify({'success': True})
 
 @app.route('/api/thresholds')
 @async_route
 async def get_thresholds():
-    thresholds = await db.get_guild_thresholds()
+    thresholds = await get_db().get_guild_thresholds()
     return jsonify(thresholds)
 
 @app.route('/api/thresholds', methods=['POST'])
@@ -92,8 +126,24 @@ async def update_thresholds():
     if violation_threshold >= high_confidence_threshold:
         return jsonify({'error': 'Violation threshold must be less than high confidence threshold'}), 400
     
-    await db.save_guild_thresholds(violation_threshold, high_confidence_threshold)
+    await get_db().save_guild_thresholds(violation_threshold, high_confidence_threshold)
     return jsonify({'success': True})
 
+@app.route('/api/thresholds/simulate')
+@async_route
+async def simulate_thresholds():
+    try:
+        violation_threshold = float(request.args.get('violation_threshold', 50))
+        high_confidence_threshold = float(request.args.get('high_confidence_threshold', 85))
+    except ValueError:
+        return jsonify({'error': 'Thresholds must be numbers'}), 400
+    
+    if not (0 <= violation_threshold <= 100) or not (0 <= high_confidence_threshold <= 100):
+        return jsonify({'error': 'Thresholds must be between 0 and 100'}), 400
+    
+    simulator = await get_simulator(refresh=request.args.get('refresh') == '1')
+    return jsonify(simulator.simulate(violation_threshold, high_confidence_threshold))
+
 if __name__ == '__main__':
+    configure_logging(log_file=None)
     app.run(debug=True, port=5000)
\ No newline at end of file